@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks for the particle engines and the Wiener process generator.
+
+Times ParticleManager.update_particles and get_updated_particle_info across
+particle counts for each engine, and brown_randwalk across step counts,
+reporting throughput, per-step latency percentiles and peak memory. Also
+compares the event-driven engine with fixed steps of the array engine over the
+same stretch of time, in the systems in EVENT_CASES. Results are written as
+JSON, so runs can be compared across commits.
+
+Usage: python Benchmark.py --counts 10 100 1000 --output bench.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+from Brownian_Wiener import brown_randwalk
+from NeighborList import suggest_skin
+from ParticleManager import ParticleManager, MIN_POS, MAX_POS, MAX_SPEED, \
+    MIN_RADIUS, MAX_RADIUS, MIN_MASS, MAX_MASS
+from typing import Callable, Dict, List, Tuple
+
+# ParticleManager settings for every engine that can be benchmarked, and the
+# largest number of particles each one is benchmarked with. A neighbor_skin of
+# 'suggest' is chosen from the initial velocities with suggest_skin
+ENGINE_CONFIGS = {
+    'object': ({'engine': 'object', 'broad_phase': 'all_pairs'}, 300),
+    'object_grid': ({'engine': 'object'}, 1000),
+    'array_all_pairs': ({'engine': 'array', 'broad_phase': 'all_pairs'}, 5000),
+    'array_grid': ({'engine': 'array'}, 100000),
+    'array_neighbor': ({'engine': 'array', 'neighbor_skin': 'suggest'},
+                       100000),
+    'event': ({'engine': 'event'}, 1000),
+}
+
+DEFAULT_COUNTS = [10, 100, 1000, 10000, 100000]
+DEFAULT_WALK_STEPS = [1000, 10000, 100000]
+
+# Number of particles, packing fraction and frame length of the systems the
+# event-driven engine is compared with fixed steps in. Its cost only depends
+# on the number of events, not frames, so it wins in small dilute systems,
+# most of all with short frames, but each event costs microseconds of Python,
+# so it loses to a step of numpy as soon as there are more than a few hundred
+# events in a frame
+EVENT_CASES = [
+    (100, 0.01, 1.0),
+    (100, 0.01, 0.1),
+    (500, 0.05, 0.1),
+    (1000, 0.01, 1.0),
+]
+DEFAULT_EVENT_DURATION = 100.0
+
+# Largest fraction of the container the particles may cover, as the default
+# radii would have large systems entirely overlapping
+MAX_PACKING_FRACTION = 0.3
+
+PERCENTILES = (50, 90, 99)
+
+################################################################################
+
+def make_initial_conditions(n: int, seed: int) -> Tuple[np.ndarray, ...]:
+    """Return positions, velocities, radii and masses of n random particles,
+    drawn as in ParticleManager.simulate_n_particles from a generator seeded
+    with seed.
+
+    Radii are scaled down if needed, so the particles cover no more than
+    MAX_PACKING_FRACTION of the container, and velocities are scaled down by
+    the same factor so particles still move the same distance relative to
+    their size in each step.
+    """
+    rng = np.random.default_rng(seed)
+
+    vel = rng.uniform(-MAX_SPEED, MAX_SPEED, size=(n, 2))
+    pos = rng.uniform(MIN_POS, MAX_POS, size=(n, 2))
+    radii = rng.integers(MIN_RADIUS, MAX_RADIUS + 1, size=n).astype(float)
+    masses = rng.integers(MIN_MASS, MAX_MASS + 1, size=n).astype(float)
+
+    covered = np.pi * np.sum(radii ** 2) / (MAX_POS - MIN_POS) ** 2
+    if covered > MAX_PACKING_FRACTION:
+        scale = np.sqrt(MAX_PACKING_FRACTION / covered)
+        radii *= scale
+        vel *= scale
+
+    return pos, vel, radii, masses
+
+
+def time_calls(func: Callable, calls: int) -> np.ndarray:
+    """Call func calls times, returning the time each call took in seconds.
+    """
+    times = np.empty(calls)
+    for k in range(calls):
+        start = time.perf_counter()
+        func()
+        times[k] = time.perf_counter() - start
+
+    return times
+
+
+def peak_memory(func: Callable, calls: int) -> int:
+    """Return the peak memory in bytes allocated while calling func calls
+    times, as measured by tracemalloc.
+    """
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def summarize(times: np.ndarray, items: int) -> Dict[str, float]:
+    """Summarize per-call times, for calls each processing items items.
+    """
+    summary = {
+        'calls': len(times),
+        'mean_seconds': float(times.mean()),
+        'calls_per_second': float(len(times) / times.sum()),
+        'items_per_second': float(items * len(times) / times.sum()),
+    }
+    for q, value in zip(PERCENTILES, np.percentile(times, PERCENTILES)):
+        summary[f'p{q}_seconds'] = float(value)
+
+    return summary
+
+
+def bench_engine(name: str, n: int, steps: int, seed: int,
+                 warmup: int = 5) -> Dict[str, float]:
+    """Benchmark update_particles and get_updated_particle_info for the engine
+    called name in ENGINE_CONFIGS, simulating n particles for steps steps.
+    """
+    config, _ = ENGINE_CONFIGS[name]
+    initial = make_initial_conditions(n, seed)
+    if config.get('neighbor_skin') == 'suggest':
+        config = dict(config, neighbor_skin=suggest_skin(initial[1]))
+
+    manager = ParticleManager(**config)
+    manager.set_particles(*initial)
+    time_calls(manager.update_particles, warmup)
+    update = summarize(time_calls(manager.update_particles, steps), n)
+    info = summarize(time_calls(manager.get_updated_particle_info, steps), n)
+
+    # measure memory separately, as tracemalloc slows everything down
+    manager.set_particles(*initial)
+    memory = peak_memory(manager.update_particles, min(steps, 10))
+
+    return {
+        'benchmark': 'update_particles',
+        'engine': name,
+        'particles': n,
+        'update_particles': update,
+        'get_updated_particle_info': info,
+        'peak_memory_bytes': memory,
+    }
+
+
+def bench_randwalk(steps: int, repeats: int, seed: int) -> Dict[str, float]:
+    """Benchmark brown_randwalk generating walks of steps steps.
+    """
+    rng = np.random.default_rng(seed)
+    times = time_calls(lambda: brown_randwalk(steps, rng), repeats)
+
+    return {
+        'benchmark': 'brown_randwalk',
+        'steps': steps,
+        'brown_randwalk': summarize(times, steps),
+        'peak_memory_bytes': peak_memory(lambda: brown_randwalk(steps, rng),
+                                         1),
+    }
+
+
+def bench_event_engine(n: int, packing_fraction: float, dt: float,
+                       duration: float, seed: int) -> Dict[str, float]:
+    """Time the event-driven engine and fixed steps of the array engine,
+    simulating the same n particles covering packing_fraction of the
+    container for duration units of time, in frames dt units of time long.
+    """
+    steps = int(round(duration / dt))
+    seconds = {}
+    for engine in ('array', 'event'):
+        manager = ParticleManager(engine, rng=np.random.default_rng(seed),
+                                  max_particles=n)
+        manager.place_particles(n, packing_fraction)
+        seconds[engine] = float(time_calls(
+            lambda: manager.update_particles(dt), steps
+        ).sum())
+
+    return {
+        'benchmark': 'event_engine',
+        'particles': n,
+        'packing_fraction': packing_fraction,
+        'dt': dt,
+        'duration': duration,
+        'seconds': seconds,
+        'speedup': seconds['array'] / seconds['event'],
+    }
+
+
+def get_metadata() -> Dict[str, str]:
+    """Return information about the machine and code being benchmarked.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+def run_benchmarks(engines: List[str], counts: List[int], steps: int,
+                   walk_steps: List[int], walk_repeats: int, seed: int,
+                   event_duration: float = 0.0) -> Dict:
+    """Run every requested benchmark, printing a line per result, and return
+    all results along with metadata about the run.
+    """
+    results = []
+    for name in engines:
+        _, max_particles = ENGINE_CONFIGS[name]
+        for n in counts:
+            if n > max_particles:
+                continue
+
+            result = bench_engine(name, n, steps, seed)
+            results.append(result)
+
+            update = result['update_particles']
+            print(f"{name:>16} n={n:<7} {update['calls_per_second']:10.1f} "
+                  f"steps/s  p50={1000 * update['p50_seconds']:.3f} ms  "
+                  f"p99={1000 * update['p99_seconds']:.3f} ms  "
+                  f"peak={result['peak_memory_bytes'] / 2 ** 20:.1f} MiB")
+
+    for walk_step in walk_steps:
+        result = bench_randwalk(walk_step, walk_repeats, seed)
+        results.append(result)
+
+        walk = result['brown_randwalk']
+        print(f"{'brown_randwalk':>16} steps={walk_step:<9} "
+              f"{walk['items_per_second']:12.1f} steps/s  "
+              f"p50={1000 * walk['p50_seconds']:.3f} ms")
+
+    if event_duration > 0:
+        for n, packing_fraction, dt in EVENT_CASES:
+            result = bench_event_engine(n, packing_fraction, dt,
+                                        event_duration, seed)
+            results.append(result)
+
+            seconds = result['seconds']
+            print(f"{'event vs array':>16} n={n:<7} phi={packing_fraction:<5} "
+                  f"dt={dt:<4} array={seconds['array']:.3f} s  "
+                  f"event={seconds['event']:.3f} s  "
+                  f"speedup={result['speedup']:.2f}x")
+
+    return {'metadata': get_metadata(), 'results': results}
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmark the particle engines and the Wiener generator.'
+    )
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINE_CONFIGS),
+                        default=list(ENGINE_CONFIGS),
+                        help='engines to benchmark')
+    parser.add_argument('--counts', nargs='+', type=int,
+                        default=DEFAULT_COUNTS,
+                        help='particle counts to benchmark each engine with')
+    parser.add_argument('--steps', type=int, default=50,
+                        help='number of timed steps per benchmark')
+    parser.add_argument('--walk-steps', nargs='*', type=int,
+                        default=DEFAULT_WALK_STEPS,
+                        help='walk lengths to benchmark brown_randwalk with')
+    parser.add_argument('--walk-repeats', type=int, default=3,
+                        help='number of timed walks per walk length')
+    parser.add_argument('--event-duration', type=float,
+                        default=DEFAULT_EVENT_DURATION,
+                        help='units of time to compare the event-driven '
+                             'engine with fixed steps over, or 0 to skip')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the initial conditions')
+    parser.add_argument('--output', '-o', default=None,
+                        help='file to write the results to as JSON')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.engines, args.counts, args.steps,
+                            args.walk_steps, args.walk_repeats, args.seed,
+                            args.event_duration)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
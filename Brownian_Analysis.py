@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Mean-squared displacement (MSD) and diffusion analysis of Brownian motion,
+for both the Wiener walks from Brownian_Wiener and particle trajectories
+recorded from a ParticleManager.
+
+Trajectories are arrays of shape (steps, dims). Batches of trajectories are
+arrays of shape (walks, steps, dims), as returned by wiener_walks.
+"""
+import numpy as np
+from ParticleManager import ParticleManager
+from Simulation import Simulation
+from typing import Iterable, Tuple
+
+# Default number of steps read at a time when computing the MSD in blocks
+DEFAULT_BLOCK_SIZE = 2 ** 16
+
+################################################################################
+
+def msd(positions: np.ndarray, max_lag: int = None,
+        block_size: int = None) -> np.ndarray:
+    """Return the mean-squared displacement of a single trajectory, for every
+    lag time from 0 to max_lag steps, averaged over all time origins.
+
+    The autocorrelation part of the MSD is computed with FFTs, in
+    O(n log n) time rather than O(n^2) for looping over every lag.
+
+    If max_lag is None, the MSD is computed for every lag in one go. Otherwise
+    the trajectory is read block_size steps at a time, so memory use only
+    depends on block_size and max_lag, and positions may be a memory-mapped
+    array far larger than memory.
+    """
+    n = len(positions)
+    if max_lag is None:
+        return _msd_full(np.asarray(positions, dtype=float))
+
+    max_lag = min(max_lag, n - 1)
+    if block_size is None:
+        block_size = max(DEFAULT_BLOCK_SIZE, 4 * max_lag)
+    # FFTs are sized for a whole block, so don't make blocks longer than the
+    # trajectory
+    block_size = max(1, min(block_size, n))
+
+    return _msd_blocked(positions, max_lag, block_size)
+
+
+def _msd_full(positions: np.ndarray) -> np.ndarray:
+    n = len(positions)
+    x = positions - positions[0]  # shift to keep the squares small
+    lags = np.arange(n)
+
+    # sum over origins k of x(k) . x(k + m), for every lag m
+    nfft = 1 << (2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(x, nfft, axis=0)
+    autocorr = np.fft.irfft(spectrum * spectrum.conj(), nfft, axis=0)[:n]
+    autocorr = autocorr.sum(axis=1)
+
+    # sum over origins k of |x(k)|^2 + |x(k + m)|^2, for every lag m
+    sq = np.einsum('ij,ij->i', x, x)
+    prefix = np.concatenate([[0.0], np.cumsum(sq)])
+    sq_sums = prefix[n - lags] + (prefix[n] - prefix[lags])
+
+    return (sq_sums - 2 * autocorr) / (n - lags)
+
+
+def _msd_blocked(positions: np.ndarray, max_lag: int,
+                 block_size: int) -> np.ndarray:
+    n = len(positions)
+    origin = np.array(positions[0], dtype=float)
+    lags = np.arange(max_lag + 1)
+
+    autocorr = np.zeros(max_lag + 1)
+    nfft = 1 << (2 * block_size + max_lag - 1).bit_length()
+
+    # squared lengths of the first and last max_lag + 1 positions, and the
+    # total, are all that's needed of the squared terms
+    head = _squared_lengths(positions[:max_lag + 1], origin)
+    tail = _squared_lengths(positions[n - max_lag - 1:], origin)
+    total = 0.0
+
+    for start in range(0, n, block_size):
+        # origins in this block, and every position they reach within max_lag
+        block = np.asarray(positions[start:start + block_size],
+                           dtype=float) - origin
+        reach = np.asarray(positions[start:start + block_size + max_lag],
+                           dtype=float) - origin
+
+        block_spectrum = np.fft.rfft(block, nfft, axis=0)
+        reach_spectrum = np.fft.rfft(reach, nfft, axis=0)
+        corr = np.fft.irfft(block_spectrum.conj() * reach_spectrum, nfft,
+                            axis=0)
+        autocorr += corr[:max_lag + 1].sum(axis=1)
+
+        total += np.einsum('ij,ij->', block, block)
+
+    head_prefix = np.concatenate([[0.0], np.cumsum(head)])
+    tail_suffix = np.concatenate([np.cumsum(tail[::-1])[::-1], [0.0]])
+
+    # sum of |x(k)|^2 for k < n - m, and for k >= m
+    first = total - tail_suffix[len(tail) - lags]
+    second = total - head_prefix[lags]
+
+    return (first + second - 2 * autocorr) / (n - lags)
+
+
+def _squared_lengths(positions: np.ndarray, origin: np.ndarray) -> np.ndarray:
+    x = np.asarray(positions, dtype=float) - origin
+    return np.einsum('ij,ij->i', x, x)
+
+
+def ensemble_msd(trajectories: Iterable[np.ndarray], max_lag: int = None,
+                 block_size: int = None) -> np.ndarray:
+    """Return the MSD averaged over a batch of trajectories of the same
+    length, such as an array of shape (walks, steps, dims) from wiener_walks.
+
+    Trajectories are processed one at a time, so any iterable of them, e.g. a
+    generator, can be used to keep memory bounded.
+    """
+    total = None
+    count = 0
+    for positions in trajectories:
+        result = msd(positions, max_lag, block_size)
+        total = result if total is None else total + result
+        count += 1
+
+    if count == 0:
+        raise ValueError("no trajectories to average over")
+
+    return total / count
+
+
+def fit_diffusion(msd_values: np.ndarray, dims: int, dt: float = 1.0,
+                  lag_range: Tuple[int, int] = None) -> Tuple[float, float]:
+    """Fit MSD(t) = 2 * dims * D * t + c to an MSD curve by least squares, and
+    return the diffusion coefficient D and the offset c.
+
+    dt is the time between steps, e.g. 1 / steps for walks from wiener_walks,
+    and lag_range limits the fit to lags from lag_range[0] up to, but not
+    including, lag_range[1]. By default, lags from 1 up to a quarter of the
+    curve are used, as longer lags are averaged over few time origins.
+    """
+    if lag_range is None:
+        lag_range = (1, max(2, len(msd_values) // 4))
+
+    lags = np.arange(*lag_range)
+    slope, offset = np.polyfit(lags * dt, msd_values[lags], 1)
+
+    return slope / (2 * dims), offset
+
+
+def record_trajectories(manager: ParticleManager, steps: int) -> np.ndarray:
+    """Step the particles in manager steps times, and return the positions of
+    every particle at every step, including the starting positions, as an
+    array of shape (particles, steps + 1, 2).
+
+    The result can be passed straight to ensemble_msd, to average over all
+    particles.
+    """
+    simulation = Simulation(manager)
+    trajectories = np.empty((manager.get_num_particles(), steps + 1, 2))
+
+    trajectories[:, 0] = manager.get_positions()
+    for k in range(1, steps + 1):
+        simulation.step()
+        trajectories[:, k] = manager.get_positions()
+
+    return trajectories
@@ -5,9 +5,8 @@
 
 
 import numpy as np
-import matplotlib.pyplot as plt
 #SECTION 1: INTRODUCTION AND BROWNIAN MOTION GENERATION IMPLEMENTATION (WIWNER PROCESS)
-print('The purpose of this portion of the project is to implement the well studied Wiener process, a real-valued stochastic '
+INTRODUCTION = ('The purpose of this portion of the project is to implement the well studied Wiener process, a real-valued stochastic '
       'process considered to be synonymous with Brownian motion due to serving as the stochastic (probabilistic) model for '
       'the one-dimensional case of Brownian motion. Note that a random walk is inherently a binomial process but for large '
       'numbers of trials (steps), '
@@ -16,71 +15,392 @@ print('The purpose of this portion of the project is to implement the well studi
        'of the number of steps, the Wiener process can be generated from a random walk model to illustrate Brownian motion.'
        'The mathematical theorem facilitating this is known as the functional central limit theorem.')
 
-def brown_randwalk(step):
+#The kinds of increments a walk can be generated from: 'lattice' steps of -1, 0 or 1 along each axis with equal probability,
+#or 'gaussian' steps drawn from a standard normal distribution along each axis.
+INCREMENTS = ('lattice', 'gaussian')
+
+def draw_increments(size, increments='lattice', rng=None):
+    """
+    This custom function draws all the increments of one or more random walks in one shot.
+
+    size = Shape of the array of increments to draw.
+    increments = Kind of increments to draw, one of INCREMENTS.
+    rng = numpy Generator to draw the increments from. If None, numpy's global random state is used.
+
+    The function returns an array of increments with shape "size". Lattice increments are returned as small integers to
+    save memory.
+    """
+    if increments == 'lattice':
+        if rng is None:
+            return np.random.randint(-1, 2, size=size).astype(np.int8)
+        return rng.integers(-1, 2, size=size, dtype=np.int8)
+
+    if increments == 'gaussian':
+        if rng is None:
+            return np.random.standard_normal(size)
+        return rng.standard_normal(size)
+
+    raise ValueError(f"increments must be one of {INCREMENTS}, not {increments!r}")
+
+def wiener_walks(step, walks=1, dims=3, increments='lattice', rng=None, start=1.0):
+    """
+    This custom function generates Brownian motion for a batch of independent walks at once, drawing all of the
+    increments in one shot and summing them cumulatively, instead of looping over the steps.
+
+    step = Number of steps in each walk.
+    walks = Number of independent walks to generate.
+    dims = Number of dimensions each walk moves in.
+    increments = Kind of increments the walks are generated from, one of INCREMENTS.
+    rng = numpy Generator to draw the increments from. If None, numpy's global random state is used.
+    start = Position every walk starts from along each axis.
+
+    The function returns an array of shape (walks, step, dims) containing the positions of each walk. As in brown_randwalk,
+    each increment is scaled by 1/sqrt(step), so the walks approximate a Wiener process over a unit of time.
+    """
+    positions = np.empty((walks, step, dims))
+    positions[:, 0, :] = start
+    if step < 2:
+        return positions
+
+    # the cumulative sum is written straight into the output, so no second full-size array is needed
+    np.cumsum(draw_increments((walks, step - 1, dims), increments, rng), axis=1, dtype=float, out=positions[:, 1:, :])
+    positions[:, 1:, :] /= np.sqrt(step)
+    positions[:, 1:, :] += start
+
+    return positions
+
+def brown_randwalk(step, rng=None):
     """
-    This custom function generates Brownian motion from a random walk process implementation via numpy's random choice feature.
-        
+    This custom function generates Brownian motion from a lattice random walk process implementation via wiener_walks.
+
     step = Number of steps.
-            
+    rng = numpy Generator to draw the steps from. If None, numpy's global random state is used.
+
     The function returns an array containing Brownian motion data generated from random walk data with the "step" variable's
     number of steps.
     """
-    #initializing the arrays corresponding to the conventional basis set of cartesian space
-    x = np.ones(step)
-    y = np.ones(step)
-    z = np.ones(step)
- 
-
-    for i in range(1,step):
-        # This is the process of creating a lattice random walk where the particle can sometimes move in the increasing or 
-        #decreasing direction of the x,y and z unit vectors, or not move whatsoever. (This produces a three-dimensional
-        #random lattice walk.)
-        yi = np.random.choice([1,0,-1])
-        ji = np.random.choice([1,0,-1])
-        hi = np.random.choice([1,0,-1])
-        # Here, the weiner process is generated from the lattice random walk.
-        x[i] = x[i-1]+(yi/np.sqrt(step))
-        y[i] = y[i-1]+(ji/np.sqrt(step))
-        z[i] = z[i-1]+(hi/np.sqrt(step))
+    # This is a three-dimensional random lattice walk, where the particle can sometimes move in the increasing or
+    # decreasing direction of the x,y and z unit vectors, or not move whatsoever, with the weiner process generated from it.
+    walk = wiener_walks(step, walks=1, dims=3, increments='lattice', rng=rng)[0]
 
+    x, y, z = (np.ascontiguousarray(walk[:, axis]) for axis in range(3))
     return x,y,z
+
+def stream_walk(step, chunk=10**6, dims=3, increments='lattice', rng=None, start=1.0, stats=None, path=None):
+    """
+    This custom function generates a single walk of the same kind as wiener_walks, but in fixed-size chunks, so walks with
+    far more steps than fit in memory can be generated in constant memory.
+
+    step = Total number of steps in the walk.
+    chunk = Number of steps in each chunk.
+    dims, increments, rng, start = As in wiener_walks.
+    stats = Optional RunningStats, updated with every chunk before the chunk is yielded.
+    path = Optional path of a .npy file, which the whole walk is written to chunk by chunk through a memory map, so the
+    walk can be post-processed later without generating it again.
+
+    The function is a generator, yielding arrays of shape (chunk, dims) with the positions of consecutive steps (the last
+    chunk may be shorter). Each chunk carries on from the last position of the one before it.
+    """
+    out = None
+    if path is not None:
+        out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(step, dims))
+
+    scale = 1 / np.sqrt(step)
+    position = np.full(dims, start, dtype=float)
+    for first in range(0, step, chunk):
+        size = min(chunk, step - first)
+        positions = np.cumsum(draw_increments((size, dims), increments, rng), axis=0, dtype=float)
+        positions *= scale
+
+        if first == 0:
+            # the walk starts at "start", so the first increment is dropped, as in wiener_walks
+            positions -= positions[0]
+        positions += position
+        position = positions[-1].copy()
+
+        if stats is not None:
+            stats.update(positions)
+        if out is not None:
+            out[first:first + size] = positions
+
+        yield positions
+
+    if out is not None:
+        out.flush()
+        del out
+
+class RunningStats:
+    """
+    This custom class keeps statistics of a walk that is generated in chunks, updating them incrementally with each chunk so
+    the walk never has to be held in memory all at once.
+
+    start = Position the walk starts from along each axis.
+    thresholds = Distances from the start whose first-passage times are tracked.
+
+    After updating with every chunk, the attributes hold:
+    count = Number of positions seen so far.
+    mean, variance = Mean and variance of the positions along each axis.
+    max_excursion = Largest distance along each axis from the start.
+    max_distance = Largest Euclidean distance from the start.
+    first_passage = Dictionary from each threshold to the index of the first step at least that far from the start, or
+    None if the walk hasn't got that far yet.
+    """
+    def __init__(self, start=1.0, thresholds=()):
+        self.start = start
+        self.count = 0
+        self.mean = None
+        self._sum_sq = None  # sum of squared deviations from the mean, along each axis
+        self.max_excursion = None
+        self.max_distance = 0.0
+        self.first_passage = {threshold: None for threshold in thresholds}
+
+    @property
+    def variance(self):
+        if self.count == 0:
+            return None
+        return self._sum_sq / self.count
+
+    def update(self, positions):
+        """
+        This custom method updates the statistics with the next chunk of positions, an array of shape (chunk, dims).
+        """
+        size = len(positions)
+        if size == 0:
+            return
+
+        # combine the chunk's mean and variance with the running ones (Chan et al.'s parallel algorithm)
+        chunk_mean = positions.mean(axis=0)
+        chunk_sum_sq = ((positions - chunk_mean) ** 2).sum(axis=0)
+        if self.count == 0:
+            self.mean = chunk_mean
+            self._sum_sq = chunk_sum_sq
+        else:
+            total = self.count + size
+            delta = chunk_mean - self.mean
+            self.mean = self.mean + delta * size / total
+            self._sum_sq = self._sum_sq + chunk_sum_sq + delta ** 2 * self.count * size / total
+
+        displacement = positions - self.start
+        excursion = np.abs(displacement).max(axis=0)
+        distance = np.sqrt((displacement ** 2).sum(axis=1))
+
+        if self.max_excursion is None:
+            self.max_excursion = excursion
+        else:
+            self.max_excursion = np.maximum(self.max_excursion, excursion)
+
+        for threshold, passage in self.first_passage.items():
+            if passage is None:
+                hits = np.flatnonzero(distance >= threshold)
+                if len(hits) > 0:
+                    self.first_passage[threshold] = self.count + int(hits[0])
+
+        self.max_distance = max(self.max_distance, float(distance.max()))
+        self.count += size
+
 #SECTION 2: PLOTTING
 
-#One Dimensional Brownian Motion
-plt.figure(figsize=(20, 12))
-x,y,z= brown_randwalk(1000)
-plt.plot(x)
-plt.title('One-dimensional representation of a Brownian motion pattern with 1000 steps.')
-plt.xlabel('Number of steps')
-plt.ylabel('Position of the particle')
-plt.show()
+#Most points handed to matplotlib for a 1D or 2D plot of a walk, a few per pixel column of a wide figure. Walks with more
+#steps than this are decimated first.
+PLOT_POINTS = 4000
 
+#Number of boxes along each axis that 3D plots of long walks count the visited positions in.
+PLOT_BINS = 64
 
-#Two Dimensional Brownian Motion
-plt.figure(figsize=(20, 12))
-x,y,z = brown_randwalk(1000)
-plt.plot(x,y)
-plt.title('Two-dimensional representation of a Brownian motion pattern with 1000 steps.')
-plt.xlabel('Position of the particle in the x direction')
-plt.ylabel('Position of the particle in the y direction')
-plt.show()
-    
-#Three Dimensional Brownian Motion
-fig = plt.figure(figsize=(20, 12))
-x,y,z = brown_randwalk(1000)
-ax = fig.add_subplot(projection='3d')
+#Most steps of a walk read into memory at a time while decimating or binning it.
+PLOT_CHUNK = 10**6
 
-ax.scatter(x,y,z)
+DIMENSION_NAMES = ('One', 'Two', 'Three')
 
-ax.set_xlabel('Position of the particle in the x direction')
-ax.set_ylabel('Position of the particle in the y direction')
-ax.set_zlabel('Position of the particle in the z direction')
+def decimate_walk(positions, points=PLOT_POINTS, chunk=PLOT_CHUNK):
+    """
+    This custom function picks out the steps of a walk worth plotting, so a walk with millions of steps can be plotted with a
+    few thousand points that look the same. The steps are split into equal buckets, like the pixel columns of a plot, and
+    the steps where each coordinate is smallest and largest within a bucket are kept (min/max decimation).
 
-ax.set_title('Three-dimensional representation of a Brownian motion pattern with 1000 steps.')
+    positions = Array of shape (steps, dims) with the positions of the walk. This can be a memory-mapped array far larger
+    than memory, e.g. a file written by stream_walk opened with np.load(path, mmap_mode='r').
+    points = Most steps to keep.
+    chunk = Most steps read into memory at a time.
 
+    The function returns the indices of the kept steps in increasing order, and an array of shape (kept, dims) with their
+    positions. Walks of no more than "points" steps are returned whole.
+    """
+    steps, dims = positions.shape
+    if steps <= points:
+        return np.arange(steps), np.asarray(positions, dtype=float)
 
-# In[ ]:
+    buckets = max(1, points // (2 * dims))
+    size = -(-steps // buckets)  # steps per bucket, rounded up
+    per_read = max(1, chunk // size)  # whole buckets read at a time
+
+    kept = []
+    for first in range(0, buckets, per_read):
+        start = first * size
+        stop = min(steps, (first + per_read) * size)
+        if start >= stop:
+            break
+
+        if size > chunk:
+            # a single bucket doesn't fit in a chunk, so it's read in pieces
+            kept.append(_extreme_steps(positions, start, stop, chunk))
+            continue
+
+        block = np.asarray(positions[start:stop], dtype=float)
+        count = -(-len(block) // size)
+        padding = count * size - len(block)
+        if padding > 0:
+            # the last bucket is short, so it's filled up with copies of the last step, which are never further out
+            block = np.concatenate([block, np.repeat(block[-1:], padding, axis=0)])
+        block = block.reshape(count, size, dims)
+
+        indices = np.concatenate([block.argmin(axis=1), block.argmax(axis=1)], axis=1)
+        indices += start + size * np.arange(count)[:, None]
+        kept.append(np.minimum(indices, steps - 1).ravel())
+
+    indices = np.unique(np.concatenate(kept))
+    return indices, np.asarray(positions[indices], dtype=float)
+
+def _extreme_steps(positions, start, stop, chunk):
+    """
+    This custom function returns the indices of the steps from "start" up to "stop" where each coordinate of a walk is
+    smallest and largest, reading the steps "chunk" at a time.
+    """
+    lowest = highest = None
+    for first in range(start, stop, chunk):
+        block = np.asarray(positions[first:min(stop, first + chunk)], dtype=float)
+        axes = np.arange(block.shape[1])
+        low, high = block.argmin(axis=0), block.argmax(axis=0)
+
+        if lowest is None:
+            lowest, low_values = low + first, block[low, axes]
+            highest, high_values = high + first, block[high, axes]
+            continue
+
+        lower = block[low, axes] < low_values
+        lowest[lower], low_values[lower] = low[lower] + first, block[low, axes][lower]
+        higher = block[high, axes] > high_values
+        highest[higher], high_values[higher] = high[higher] + first, block[high, axes][higher]
+
+    return np.concatenate([lowest, highest])
+
+def bin_walk(positions, bins=PLOT_BINS, chunk=PLOT_CHUNK):
+    """
+    This custom function counts how many steps of a walk fall in each box of a grid spanning the walk, for plotting the
+    density of a walk too long to plot every step of.
+
+    positions = Array of shape (steps, dims) with the positions of the walk, which can be memory-mapped as in
+    decimate_walk.
+    bins = Number of boxes along each axis.
+    chunk = Most steps read into memory at a time.
+
+    The function returns an integer array of shape (bins,) * dims with the number of steps in each box, and a list with
+    the bins + 1 edges of the boxes along each axis. The walk is read twice, once to find its extent and once to count.
+    """
+    steps, dims = positions.shape
+    low = np.full(dims, np.inf)
+    high = np.full(dims, -np.inf)
+    for first in range(0, steps, chunk):
+        block = np.asarray(positions[first:first + chunk], dtype=float)
+        # a column at a time, which is several times faster than block.min(axis=0)
+        low = np.minimum(low, [block[:, axis].min() for axis in range(dims)])
+        high = np.maximum(high, [block[:, axis].max() for axis in range(dims)])
+    width = np.where(high > low, (high - low) / bins, 1.0)
+
+    # count with a single bincount over the flattened box numbers, which is much faster than np.histogramdd
+    counts = np.zeros(bins ** dims, dtype=np.int64)
+    for first in range(0, steps, chunk):
+        block = np.asarray(positions[first:first + chunk], dtype=float)
+        boxes = np.zeros(len(block), dtype=np.int64)
+        for axis in range(dims):
+            box = ((block[:, axis] - low[axis]) / width[axis]).astype(np.int64)
+            boxes = boxes * bins + np.minimum(box, bins - 1)
+        counts += np.bincount(boxes, minlength=len(counts))
 
+    edges = [low[axis] + width[axis] * np.arange(bins + 1) for axis in range(dims)]
+    return counts.reshape((bins,) * dims), edges
+
+def plot_walk(positions, title=None, points=PLOT_POINTS, bins=PLOT_BINS, chunk=PLOT_CHUNK):
+    """
+    This custom function plots a walk in one, two or three dimensions, as many as it has, in bounded time and memory
+    however many steps it has.
+
+    positions = Array of shape (steps, dims) with the positions of the walk, which can be memory-mapped as in
+    decimate_walk.
+    title = Title of the plot. If None, a title is made up from the number of dimensions and steps.
+    points, chunk = As in decimate_walk.
+    bins = As in bin_walk.
+
+    One- and two-dimensional walks are decimated with decimate_walk before plotting. Three-dimensional walks of more than
+    "points" steps are plotted as the boxes of bin_walk that they visit, colored by how many steps they spent there.
+    """
+    import matplotlib.pyplot as plt
+
+    steps, dims = positions.shape
+    if title is None:
+        title = f'{DIMENSION_NAMES[dims - 1]}-dimensional representation of a Brownian motion pattern with {steps} steps.'
+
+    fig = plt.figure(figsize=(20, 12))
+    if dims == 1:
+        indices, kept = decimate_walk(positions, points, chunk)
+        plt.plot(indices, kept[:, 0])
+        plt.xlabel('Number of steps')
+        plt.ylabel('Position of the particle')
+    elif dims == 2:
+        _, kept = decimate_walk(positions, points, chunk)
+        plt.plot(kept[:, 0], kept[:, 1])
+        plt.xlabel('Position of the particle in the x direction')
+        plt.ylabel('Position of the particle in the y direction')
+    else:
+        ax = fig.add_subplot(projection='3d')
+        if steps <= points:
+            ax.scatter(*np.asarray(positions, dtype=float).T)
+        else:
+            counts, edges = bin_walk(positions, bins, chunk)
+            visited = np.nonzero(counts)
+            centers = [(edges[axis][:-1] + edges[axis][1:]) / 2 for axis in range(3)]
+            ax.scatter(*(centers[axis][visited[axis]] for axis in range(3)), c=np.log10(counts[visited]), s=4)
+
+        ax.set_xlabel('Position of the particle in the x direction')
+        ax.set_ylabel('Position of the particle in the y direction')
+        ax.set_zlabel('Position of the particle in the z direction')
+
+    plt.title(title)
+    plt.show()
+
+def plot_walk_file(path, points=PLOT_POINTS, bins=PLOT_BINS, chunk=PLOT_CHUNK):
+    """
+    This custom function plots a walk saved to a .npy file, e.g. by stream_walk, in one, two and three dimensions, as many
+    as it has, reading the file through a memory map so it never has to fit in memory.
+
+    path = Path of the .npy file, holding an array of shape (steps, dims).
+    points, bins, chunk = As in plot_walk.
+    """
+    positions = np.load(path, mmap_mode='r')
+    for dims in range(1, min(3, positions.shape[1]) + 1):
+        plot_walk(positions[:, :dims], points=points, bins=bins, chunk=chunk)
+
+def plot_brownian_motion(step=1000):
+    """
+    This custom function plots Brownian motion with "step" steps in one, two and three dimensions.
+    """
+    for dims in (1, 2, 3):
+        x,y,z = brown_randwalk(step)
+        plot_walk(np.column_stack([x, y, z])[:, :dims])
+
+
+# In[ ]:
 
 
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Plot Brownian motion generated from a random walk.')
+    parser.add_argument('--steps', type=int, default=1000, help='number of steps of the walks to generate and plot')
+    parser.add_argument('--file', default=None, help='plot the walk saved to this .npy file instead, e.g. by stream_walk')
+    args = parser.parse_args()
 
+    print(INTRODUCTION)
+    if args.file is not None:
+        plot_walk_file(args.file)
+    else:
+        plot_brownian_motion(args.steps)
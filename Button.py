@@ -4,9 +4,15 @@
 # Credit to https://www.youtube.com/watch?v=4_9twnEduFA for inspiration in
 # making these button classes
 import pygame
-from typing import Tuple
+from typing import Dict, Tuple
+
+FONT_NAME = 'arial'
+FONT_SIZE = 30
 
 class Button:
+    # fonts shared by all buttons, as loading a font is slow
+    _fonts: Dict[Tuple[str, int], pygame.font.Font] = {}
+
     def __init__(self, x, y, width, height, text='', action = '', color=(0, 255, 0),
                  text_color = (255, 255, 255)):
         self.x = x
@@ -18,6 +24,32 @@ class Button:
         self.color = color
         self.text_color = text_color
 
+        # text rendered the last time the button was drawn, and the text and
+        # color it was rendered from
+        self._text_surface = None
+        self._rendered = None
+
+    @classmethod
+    def get_font(cls, name: str = FONT_NAME,
+                 size: int = FONT_SIZE) -> pygame.font.Font:
+        """Returns the font with the given name and size, only loading it the
+        first time it's asked for.
+        """
+        if (name, size) not in cls._fonts:
+            cls._fonts[(name, size)] = pygame.font.SysFont(name, size)
+
+        return cls._fonts[(name, size)]
+
+    def get_rect(self, outline: bool = False) -> pygame.Rect:
+        """Returns the area of the window covered by the button, including
+        its outline if outline is True.
+        """
+        if outline:
+            return pygame.Rect(self.x - 2, self.y - 2, self.width + 4,
+                               self.height + 4)
+
+        return pygame.Rect(self.x, self.y, self.width, self.height)
+
     def draw(self, window, outline: Tuple[int] = None) -> None:
         """Draws the button onto a specified window.
 
@@ -32,8 +64,13 @@ class Button:
                         (self.x, self.y, self.width, self.height), 0)
         
         if self.text != '':
-            font = pygame.font.SysFont('arial', 30)
-            text = font.render(self.text, 1, self.text_color)
+            # only re-render the text when it has changed
+            if self._rendered != (self.text, self.text_color):
+                self._text_surface = self.get_font().render(self.text, 1,
+                                                            self.text_color)
+                self._rendered = (self.text, self.text_color)
+
+            text = self._text_surface
             window.blit(text, (self.x + (self.width / 2 - text.get_width() / 2),
                      self.y + (self.height / 2 - text.get_height() / 2)))
     
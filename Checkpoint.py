@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Save the full state of a simulation to a single compact binary file, and
+restore it later, e.g. to start from particles that have already settled
+down, or to carry on with an interrupted run.
+
+A checkpoint file holds, in order:
+    MAGIC, 8 bytes
+    format version, as a little-endian uint16
+    length of the header in bytes, as a little-endian uint32
+    header, as UTF-8 JSON: engine settings, step count and simulated time, dt,
+        the state of the random number generator, the clock and time series
+        of the Observables, if any, and the name, shape and byte offset of
+        every array, with a CRC-32 of all array bytes
+    positions, velocities, radii and masses, as little-endian float64
+    the state of the event-driven engine, if it has taken a step, as
+        little-endian float64 arrays named event_ and the name of each part of
+        EventDrivenEngine.get_state, including every predicted event
+
+Restoring a checkpoint of any engine and carrying on gives exactly the same
+particles as never stopping. Observables carry on with their time series,
+collision energy change and pressure, but their running totals, e.g. the
+kinetic energy, are computed again from the particles, so they can differ
+from never stopping by rounding.
+"""
+import json
+import struct
+import zlib
+import numpy as np
+from EventDrivenEngine import EventDrivenEngine
+from Observables import Observables
+from ParticleManager import ParticleManager
+from Profiler import Profiler
+from Simulation import Simulation
+from typing import Dict
+
+MAGIC = b'PYJACCKP'
+VERSION = 1
+
+# Format of the version and header length following MAGIC
+PREFIX = struct.Struct('<HI')
+
+DTYPE = np.dtype('<f8')
+
+# Arrays stored in every checkpoint, in order
+ARRAYS = ('pos', 'vel', 'radii', 'masses')
+
+# Prefix of the names of arrays holding the state of the event-driven engine
+EVENT_PREFIX = 'event_'
+
+################################################################################
+
+def save_checkpoint(path: str, simulation: Simulation) -> None:
+    """Write the state of simulation, and the ParticleManager it advances, to
+    the file at path.
+    """
+    manager = simulation.manager
+    arrays = dict(zip(ARRAYS, (np.ascontiguousarray(a, dtype=DTYPE)
+                               for a in manager.get_arrays())))
+
+    event_engine = manager.get_event_engine()
+    if event_engine is not None:
+        for name, array in event_engine.get_state().items():
+            arrays[EVENT_PREFIX + name] = np.ascontiguousarray(array,
+                                                               dtype=DTYPE)
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+
+    data = b''.join(array.tobytes() for array in arrays.values())
+
+    skin = None
+    if manager.neighbor_list is not None:
+        skin = manager.neighbor_list.skin
+
+    observables = None
+    if manager.observables is not None:
+        observables = manager.observables.get_state()
+
+    header = {
+        'engine': manager.engine,
+        'broad_phase': manager.broad_phase,
+        'boundary': manager.boundary,
+        'neighbor_skin': skin,
+        'max_particles': manager.max_particles,
+        'steps': simulation.steps,
+        'time': simulation.time,
+        'dt': simulation.dt,
+        'rng': manager.rng.bit_generator.state,
+        'observables': observables,
+        'arrays': layout,
+        'crc32': zlib.crc32(data),
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(PREFIX.pack(VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(data)
+
+
+def read_header(path: str) -> Dict:
+    """Returns the header of the checkpoint file at path, without reading
+    its arrays.
+    """
+    with open(path, 'rb') as f:
+        header, _ = _read(f, read_data=False)
+
+    return header
+
+
+def load_checkpoint(path: str, profiler: Profiler = None) -> Simulation:
+    """Restore the checkpoint file at path, returning a Simulation in the
+    state it was saved in, advancing a ParticleManager with the saved
+    settings, particles, random number generator and observables.
+
+    profiler, if given, is passed on to the ParticleManager.
+    """
+    with open(path, 'rb') as f:
+        header, data = _read(f)
+
+    arrays = [_get_array(data, header['arrays'][name]) for name in ARRAYS]
+
+    rng_state = header['rng']
+    bit_generator = getattr(np.random, rng_state['bit_generator'])()
+    bit_generator.state = rng_state
+
+    manager = ParticleManager(header['engine'], header['broad_phase'],
+                              header['neighbor_skin'],
+                              np.random.Generator(bit_generator),
+                              header['max_particles'], profiler,
+                              boundary=header.get('boundary', 'walls'))
+    manager.set_particles(*arrays)
+
+    if header.get('observables') is not None:
+        manager.observables = Observables.from_state(header['observables'])
+
+    event_state = {name[len(EVENT_PREFIX):]: _get_array(data, layout)
+                   for name, layout in header['arrays'].items()
+                   if name.startswith(EVENT_PREFIX)}
+    if event_state:
+        manager.set_event_engine(
+            EventDrivenEngine.from_state(arrays[2], arrays[3], event_state)
+        )
+
+    simulation = Simulation(manager, header['dt'])
+    simulation.steps = header['steps']
+    simulation.time = header['time']
+
+    return simulation
+
+
+def _get_array(data: bytes, layout: Dict) -> np.ndarray:
+    """Returns a copy of the array at the shape and offset given by layout in
+    the bytes of a checkpoint's arrays.
+    """
+    count = int(np.prod(layout['shape']))
+    array = np.frombuffer(data, dtype=DTYPE, count=count,
+                          offset=layout['offset'])
+
+    return array.reshape(layout['shape']).astype(float)
+
+
+def _read(f, read_data: bool = True):
+    """Read and check the header of the checkpoint file f, and the bytes of
+    its arrays if read_data is True.
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{f.name} is not a checkpoint file")
+
+    version, header_size = PREFIX.unpack(f.read(PREFIX.size))
+    if version > VERSION:
+        raise ValueError(f"checkpoint is version {version}, but only up to "
+                         f"version {VERSION} can be read")
+
+    header = json.loads(f.read(header_size).decode('utf-8'))
+    if not read_data:
+        return header, None
+
+    data = f.read()
+    if zlib.crc32(data) != header['crc32']:
+        raise ValueError(f"{f.name} is corrupted, its arrays don't match "
+                         f"their checksum")
+
+    return header, data
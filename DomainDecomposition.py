@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Simulate a single, very large box of particles on several cores at once,
+by splitting the container into vertical strips, each advanced by its own
+worker process.
+
+All particles are kept in arrays in shared memory, in the same order as in
+the ParticleManager they came from. Each worker owns the particles whose
+centers are in its strip, and in every step:
+    1. finds colliding pairs involving its particles, including particles of
+       the neighboring strips close enough to its edges to reach them (its
+       halo)
+    2. resolves the collisions among its own particles, while chains of
+       collisions reaching into another strip are resolved once, by the main
+       process
+    3. bounces its particles off the walls and moves them
+    4. hands particles that have left its strip over to the worker of their
+       new strip, and publishes its particles near its edges as the halo of
+       its neighbors
+with every process waiting for the others at a barrier in between.
+
+Collisions are resolved in the same order as ParticleArrays.collide_pairs
+resolves them for all particles at once, so particles move exactly as with
+the array engine of ParticleManager.
+"""
+import multiprocessing as mp
+import threading
+import time
+import numpy as np
+import ParticleArrays
+from multiprocessing import shared_memory
+from Particle import X_LIMITS, MIN_DIST
+from ParticleManager import ParticleManager
+from typing import Dict, List, Tuple
+
+# Longest time, in seconds, any process waits for the others at a barrier
+# before deciding that one of them has died
+BARRIER_TIMEOUT = 60
+
+# Rows of the (3, workers) array of counts in shared memory: particles in the
+# halo of each worker, particles that have left its strip, and colliding
+# pairs it has handed over to the main process
+HALO, LEAVING, BORDER = range(3)
+
+################################################################################
+
+class DecomposedSimulation:
+    """Advances the particles of manager, which must use the array engine
+    and walls, by steps of dt units of time, split between n_workers worker
+    processes (by default, one per CPU).
+
+    Steps and simulated time are counted as in Simulation. Rather than
+    copying every particle into manager after each step, manager is only
+    given the particles' current state when it's fetched from the manager
+    attribute, by sync, and on close, so it's best fetched again after
+    stepping than held on to. Particles can't be added or removed in
+    between, and every strip must be at least as wide as the largest
+    collision distance, so there may be fewer workers than asked for.
+
+    The worker processes and shared memory are released by close, or at the
+    end of a with block.
+    """
+    def __init__(self, manager: ParticleManager, n_workers: int = None,
+                 dt: float = 1.0):
+        if manager.engine != 'array' or manager.boundary != 'walls':
+            raise ValueError("only the array engine with walls can be split "
+                             "between workers")
+
+        pos, vel, radii, masses = manager.get_arrays()
+        reach = 2 * radii.max(initial=0) + MIN_DIST
+        n_workers = n_workers or mp.cpu_count()
+
+        self._manager = manager
+        self._synced = True  # whether manager has the particles' current state
+        self._mid_step = False  # whether particles are part way through a step
+        self.dt = dt
+        self.steps = 0
+        self.time = 0.0
+        self.n_workers = max(1, min(n_workers,
+                                    int((X_LIMITS[1] - X_LIMITS[0]) // reach)))
+
+        self._n = len(pos)
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=max(1, _get_size(self._n, self.n_workers))
+        )
+        self._arrays = _get_arrays(self._shm, self._n, self.n_workers)
+        for name, array in zip(('pos', 'vel', 'radii', 'masses'),
+                               (pos, vel, radii, masses)):
+            self._arrays[name][:] = array
+        self._arrays['counts'][:] = 0
+        self._arrays['stop'][:] = 0
+
+        self._barrier = mp.Barrier(self.n_workers + 1, timeout=BARRIER_TIMEOUT)
+        self._processes = [
+            mp.Process(target=_run_strip,
+                       args=(self._shm.name, self._barrier, w, self.n_workers,
+                             self._n, dt, reach),
+                       daemon=True)
+            for w in range(self.n_workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    @property
+    def manager(self) -> ParticleManager:
+        """The ParticleManager being simulated, given the particles' current
+        state first.
+        """
+        self.sync()
+        return self._manager
+
+    def step(self) -> None:
+        """Advance all particles by a single step.
+        """
+        self._step()
+
+    def run(self, n: int) -> float:
+        """Take n steps as fast as possible, and return how many seconds they
+        took.
+        """
+        start = time.perf_counter()
+        for _ in range(n):
+            self._step()
+
+        return time.perf_counter() - start
+
+    def sync(self) -> None:
+        """Give the manager the particles' current state, if they've moved
+        since it was last given it.
+        """
+        if self._synced or self._shm is None:
+            return
+
+        a = self._arrays
+        self._manager.set_particles(a['pos'].copy(), a['vel'].copy(),
+                                    a['radii'].copy(), a['masses'].copy())
+        self._synced = True
+
+    def get_particle_position(self, index: int) -> np.ndarray:
+        """Returns the current position of the particle at index, read
+        straight from shared memory, without syncing the manager.
+        """
+        return self._arrays['pos'][index].copy()
+
+    def close(self, timeout: float = 5) -> None:
+        """Give the manager the particles' final state, stop the worker
+        processes, and free the shared memory.
+
+        If a step has failed part way, the manager is left with the state it
+        was last given instead.
+        """
+        if self._shm is None:
+            return
+
+        if not self._mid_step:
+            self.sync()
+
+        self._arrays['stop'][0] = 1
+        try:
+            self._barrier.wait()
+        except threading.BrokenBarrierError:
+            pass  # a worker has already stopped
+
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+        # drop views of the shared memory before closing it
+        self._arrays = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def _step(self) -> None:
+        """Take a step, going through its phases in step with the workers.
+        """
+        self._wait()  # workers find colliding pairs
+        self._wait()
+
+        # workers resolve collisions among their own particles meanwhile
+        self._synced = False
+        self._mid_step = True
+        a = self._arrays
+        try:
+            _collide(a['pos'], a['vel'], a['masses'],
+                     *_gather_border_pairs(a['border'], a['counts'][BORDER],
+                                           self._n))
+        except BaseException:
+            # the workers are mid-step, so won't stop at the next barrier
+            self._barrier.abort()
+            self.close()
+            raise
+        self._wait()  # workers bounce their particles off walls and move them
+        self._wait()
+
+        # workers hand over particles that have left their strips meanwhile,
+        # which doesn't change any particle
+        self._mid_step = False
+        self.steps += 1
+        self.time += self.dt
+
+    def _wait(self) -> None:
+        """Wait for every worker to finish the current phase of the step.
+        """
+        try:
+            self._barrier.wait()
+        except threading.BrokenBarrierError:
+            self.close()
+            raise RuntimeError("a worker process has stopped")
+
+
+def _get_layout(n: int, n_workers: int) -> List[Tuple[str, Tuple, type]]:
+    """Return the name, shape and type of every array in the shared memory
+    block, in order.
+    """
+    return [
+        ('pos', (n, 2), np.float64),
+        ('vel', (n, 2), np.float64),
+        ('radii', (n,), np.float64),
+        ('masses', (n,), np.float64),
+        ('halo', (n_workers, n), np.int64),
+        ('leaving', (n_workers, n), np.int64),
+        ('border', (n_workers, n, 2), np.int64),
+        ('counts', (3, n_workers), np.int64),
+        ('stop', (1,), np.int64),
+    ]
+
+
+def _get_size(n: int, n_workers: int) -> int:
+    """Return the size in bytes of the shared memory block.
+    """
+    return sum(int(np.prod(shape)) * np.dtype(dtype).itemsize
+               for _, shape, dtype in _get_layout(n, n_workers))
+
+
+def _get_arrays(shm: shared_memory.SharedMemory, n: int,
+                n_workers: int) -> Dict[str, np.ndarray]:
+    """Return every array in the shared memory block, as arrays viewing it.
+    """
+    arrays = {}
+    offset = 0
+    for name, shape, dtype in _get_layout(n, n_workers):
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf,
+                                  offset=offset)
+        offset += arrays[name].nbytes
+
+    return arrays
+
+
+def _gather_border_pairs(border: np.ndarray, counts: np.ndarray,
+                         n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the colliding pairs handed over by every worker, without the
+    pairs handed over by both workers of a strip edge, sorted by (i, j).
+    """
+    pairs = np.concatenate([border[w, :count]
+                            for w, count in enumerate(counts.tolist())])
+    keys = np.unique(pairs[:, 0] * n + pairs[:, 1])
+
+    return keys // n, keys % n
+
+
+def _collide(pos: np.ndarray, vel: np.ndarray, masses: np.ndarray,
+             i: np.ndarray, j: np.ndarray) -> None:
+    """Resolve colliding pairs (i, j), sorted by (i, j), in place, as
+    ParticleArrays.collide_pairs does, working on copies of just the
+    particles involved.
+    """
+    if len(i) == 0:
+        return
+
+    involved, index = np.unique(np.concatenate([i, j]), return_inverse=True)
+    part_vel = vel[involved]
+    ParticleArrays.collide_pairs(pos[involved], part_vel, masses[involved],
+                                 index[:len(i)], index[len(i):])
+    vel[involved] = part_vel
+
+
+def _label_chains(i: np.ndarray, j: np.ndarray, n: int) -> np.ndarray:
+    """Return a label for each of n particles, which is the same for
+    particles linked by a chain of pairs (i, j), and different otherwise.
+    """
+    labels = np.arange(n)
+    while True:
+        lowest = np.minimum(labels[i], labels[j])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, i, lowest)
+        np.minimum.at(new_labels, j, lowest)
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def _find_pairs(pos: np.ndarray, vel: np.ndarray, radii: np.ndarray,
+                owned: np.ndarray, halo: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Find colliding pairs (i, j) with at least one of the owned particles,
+    among the owned particles and the halo.
+
+    Returns (i, j) of pairs whose chain of collisions stays among the owned
+    particles, followed by (i, j) of the rest, both sorted by (i, j).
+    """
+    # keep particles in the order of the shared arrays, so pairs come out in
+    # the same order as for all particles at once
+    ids = np.concatenate([owned, halo])
+    order = np.argsort(ids)
+    local = ids[order]
+    is_owned = (order < len(owned))
+
+    local_pos, local_vel = pos[local], vel[local]
+    local_radii = radii[local]
+    i, j = ParticleArrays.grid_pairs(local_pos, local_radii)
+    i, j = ParticleArrays.find_colliding_pairs(local_pos, local_vel,
+                                               local_radii, i, j)
+    keep = is_owned[i] | is_owned[j]
+    i, j = i[keep], j[keep]
+
+    labels = _label_chains(i, j, len(local))
+    outside = np.concatenate([i[~is_owned[i]], j[~is_owned[j]]])
+    crossing = np.isin(labels[i], labels[outside])
+
+    return (local[i[~crossing]], local[j[~crossing]], local[i[crossing]],
+            local[j[crossing]])
+
+
+def _run_strip(shm_name: str, barrier: mp.Barrier, w: int, n_workers: int,
+               n: int, dt: float, reach: float) -> None:
+    """Main loop of the worker process advancing strip w, going through the
+    phases of every step in step with the other processes.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    a = _get_arrays(shm, n, n_workers)
+    pos, vel, radii, masses = a['pos'], a['vel'], a['radii'], a['masses']
+    counts = a['counts']
+
+    width = (X_LIMITS[1] - X_LIMITS[0]) / n_workers
+    low = X_LIMITS[0] + w * width
+    high = low + width
+    neighbors = [k for k in (w - 1, w + 1) if 0 <= k < n_workers]
+
+    def get_strips(x: np.ndarray) -> np.ndarray:
+        strips = np.floor((x - X_LIMITS[0]) / width)
+        return np.clip(strips, 0, n_workers - 1).astype(np.int64)
+
+    def publish_halo(owned: np.ndarray) -> None:
+        x = pos[owned, 0]
+        halo = owned[(x < low + reach) | (x >= high - reach)]
+        a['halo'][w, :len(halo)] = halo
+        counts[HALO, w] = len(halo)
+
+    owned = np.flatnonzero(get_strips(pos[:, 0]) == w)
+    publish_halo(owned)
+
+    try:
+        while True:
+            barrier.wait()
+            if a['stop'][0]:
+                return
+
+            # 1. find colliding pairs, handing over chains leaving the strip
+            halo = np.concatenate([a['halo'][k, :counts[HALO, k]]
+                                   for k in neighbors] +
+                                  [np.zeros(0, dtype=np.int64)])
+            i, j, border_i, border_j = _find_pairs(pos, vel, radii, owned, halo)
+            if len(border_i) > n:
+                raise RuntimeError(f"more than {n} collisions to hand over")
+            a['border'][w, :len(border_i), 0] = border_i
+            a['border'][w, :len(border_i), 1] = border_j
+            counts[BORDER, w] = len(border_i)
+            barrier.wait()
+
+            # 2. resolve collisions among the strip's own particles
+            _collide(pos, vel, masses, i, j)
+            barrier.wait()
+
+            # 3. bounce off walls and move, as ParticleManager._update_arrays
+            own_pos, own_vel, own_radii = pos[owned], vel[owned], radii[owned]
+            ParticleArrays.bounce_off_walls(
+                own_vel, *ParticleArrays.find_wall_hits(own_pos, own_radii)
+            )
+            ParticleArrays.bounce_off_walls(
+                own_vel, *ParticleArrays.find_wall_hits(own_pos + own_vel * dt,
+                                                        own_radii)
+            )
+            own_pos += own_vel * dt
+            pos[owned], vel[owned] = own_pos, own_vel
+
+            leaving = get_strips(own_pos[:, 0]) != w
+            a['leaving'][w, :np.count_nonzero(leaving)] = owned[leaving]
+            counts[LEAVING, w] = np.count_nonzero(leaving)
+            owned = owned[~leaving]
+            barrier.wait()
+
+            # 4. take over particles that have moved into the strip
+            arrived = [owned]
+            for k in range(n_workers):
+                if k != w:
+                    ids = a['leaving'][k, :counts[LEAVING, k]]
+                    arrived.append(ids[get_strips(pos[ids, 0]) == w])
+            owned = np.sort(np.concatenate(arrived))
+            publish_halo(owned)
+    except threading.BrokenBarrierError:
+        pass  # another process has stopped
+    finally:
+        pos = vel = radii = masses = counts = a = None
+        shm.close()
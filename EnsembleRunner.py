@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run many independent simulations, Wiener walks or particle boxes, across a
+pool of worker processes, and aggregate their results.
+
+Every run gets its own random number generator, spawned from a single
+np.random.SeedSequence, so an ensemble is reproducible from one seed no
+matter how many processes it is split across or in which order runs finish.
+
+Usage: python EnsembleRunner.py particles --speed 1 3 5 --runs 8 --seed 1
+"""
+import argparse
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Brownian_Analysis import ensemble_msd, fit_diffusion, record_trajectories
+from Brownian_Wiener import wiener_walks, INCREMENTS
+from ParticleManager import ParticleManager, MAX_PARTICLES
+from typing import Callable, Dict, Iterator, List, Tuple
+
+################################################################################
+
+def run_wiener_walks(params: Dict,
+                     seed: np.random.SeedSequence) -> Dict[str, float]:
+    """Generate a batch of Wiener walks, and return their diffusion statistics.
+
+    params may hold 'steps', 'walks', 'dims', 'increments' and 'max_lag'.
+    """
+    rng = np.random.default_rng(seed)
+    steps = params.get('steps', 1000)
+    dims = params.get('dims', 3)
+
+    walks = wiener_walks(steps, params.get('walks', 1), dims,
+                         params.get('increments', 'lattice'), rng)
+    msd = ensemble_msd(walks, params.get('max_lag', steps // 10))
+    diffusion, _ = fit_diffusion(msd, dims, dt=1 / steps)
+
+    displacement = walks[:, -1] - walks[:, 0]
+
+    return {
+        'diffusion': diffusion,
+        'mean_sq_displacement': float(np.mean(np.sum(displacement ** 2,
+                                                     axis=1))),
+    }
+
+
+def run_particle_box(params: Dict,
+                     seed: np.random.SeedSequence) -> Dict[str, float]:
+    """Simulate a box of particles, and return statistics about how the
+    particles moved.
+
+    params may hold 'particles', 'steps' and 'engine', and 'speed', 'size' and
+    'mass' for particles added as with the GUI's ADD button. Without any of
+    the last three, particles are random as in simulate_n_particles. The
+    result includes the number of particles simulated.
+    """
+    rng = np.random.default_rng(seed)
+    n = params.get('particles', 30)
+    manager = ParticleManager(params.get('engine', 'array'), rng=rng,
+                              max_particles=max(n, MAX_PARTICLES))
+
+    if any(key in params for key in ('speed', 'size', 'mass')):
+        for _ in range(n):
+            manager.add_particle(params.get('speed', 1), params.get('size', 1),
+                                 params.get('mass', 1))
+    else:
+        manager.simulate_n_particles(n)
+
+    steps = params.get('steps', 500)
+    trajectories = record_trajectories(manager, steps)
+    msd = ensemble_msd(trajectories, params.get('max_lag', steps // 10))
+    diffusion, _ = fit_diffusion(msd, 2)
+
+    if manager.engine == 'object':
+        masses = np.array([p.mass for p in manager.particles], dtype=float)
+        vel = np.array([p.vel for p in manager.particles]).reshape(-1, 2)
+    else:
+        masses, vel = manager.masses, manager.vel
+
+    return {
+        'particles': manager.get_num_particles(),
+        'diffusion': diffusion,
+        'mean_speed': float(np.linalg.norm(vel, axis=1).mean()),
+        'kinetic_energy': float(0.5 * np.sum(masses * np.sum(vel ** 2,
+                                                             axis=1))),
+    }
+
+
+# Simulations that can be run in an ensemble, by name
+TASKS = {
+    'wiener': run_wiener_walks,
+    'particles': run_particle_box,
+}
+
+
+def sweep(**values: List) -> List[Dict]:
+    """Return a parameter dictionary for every combination of values, e.g.
+    sweep(speed=[1, 2], mass=[1, 5]) gives 4 dictionaries.
+    """
+    keys = list(values)
+
+    return [dict(zip(keys, combo))
+            for combo in itertools.product(*(values[k] for k in keys))]
+
+
+class EnsembleRunner:
+    """Runs a task, e.g. run_wiener_walks, once per parameter dictionary,
+    across a pool of processes.
+
+    A task is a module-level function taking a parameter dictionary and a
+    SeedSequence, and returning a dictionary of numbers. Each run's
+    SeedSequence is spawned from one made from seed, so run k always gets the
+    same random numbers, however the runs are scheduled.
+    """
+    def __init__(self, task: Callable[[Dict, np.random.SeedSequence], Dict],
+                 processes: int = None, seed: int = None):
+        self.task = task
+        self.processes = processes
+        self.seed_sequence = np.random.SeedSequence(seed)
+
+    def imap(self, runs: List[Dict]) -> Iterator[Tuple[int, Dict, Dict]]:
+        """Start every run, and yield (index, params, result) for each run as
+        soon as it finishes.
+        """
+        seeds = self.seed_sequence.spawn(len(runs))
+
+        if self.processes == 1:
+            # no need for a pool, e.g. when debugging
+            for k, (params, seed) in enumerate(zip(runs, seeds)):
+                yield k, params, self.task(params, seed)
+            return
+
+        with ProcessPoolExecutor(self.processes) as pool:
+            futures = {pool.submit(self.task, params, seed): k
+                       for k, (params, seed) in enumerate(zip(runs, seeds))}
+
+            for future in as_completed(futures):
+                k = futures[future]
+                yield k, runs[k], future.result()
+
+    def run(self, runs: List[Dict]) -> List[Dict]:
+        """Run everything, returning aggregate_results of all runs.
+
+        Results are aggregated in the order of runs, rather than the order they
+        finish in, so the aggregates are exactly reproducible.
+        """
+        finished = sorted(self.imap(runs), key=lambda run: run[0])
+
+        return aggregate_results((params, result)
+                                 for _, params, result in finished)
+
+
+def aggregate_results(results: Iterator[Tuple[Dict, Dict]]) -> List[Dict]:
+    """Group (params, result) pairs by their parameters, and return, for each
+    group, the parameters, the number of runs, and the mean and standard
+    deviation of every value in the results.
+    """
+    groups = {}
+    for params, result in results:
+        key = tuple(sorted(params.items()))
+        groups.setdefault(key, []).append(result)
+
+    summary = []
+    for key, group in groups.items():
+        entry = {'params': dict(key), 'runs': len(group)}
+        for name in group[0]:
+            values = np.array([result[name] for result in group], dtype=float)
+            entry[f'{name}_mean'] = float(values.mean())
+            entry[f'{name}_std'] = float(values.std())
+
+        summary.append(entry)
+
+    return summary
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Run an ensemble of independent simulations in parallel.'
+    )
+    parser.add_argument('task', choices=list(TASKS),
+                        help='kind of simulation to run')
+    parser.add_argument('--runs', type=int, default=4,
+                        help='number of runs for each set of parameters')
+    parser.add_argument('--steps', type=int, nargs='+', default=[1000],
+                        help='steps per run')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes, defaults to one '
+                             'per CPU')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the whole ensemble')
+
+    wiener = parser.add_argument_group('wiener')
+    wiener.add_argument('--walks', type=int, nargs='+', default=[100],
+                        help='walks per run')
+    wiener.add_argument('--dims', type=int, nargs='+', default=[3],
+                        help='dimensions of each walk')
+    wiener.add_argument('--increments', choices=INCREMENTS, nargs='+',
+                        default=['lattice'], help='kind of walk increments')
+
+    particles = parser.add_argument_group('particles')
+    particles.add_argument('--particles', type=int, nargs='+', default=[30],
+                           help='particles per run')
+    particles.add_argument('--speed', type=int, nargs='+', default=None,
+                           help='speeds of added particles, from 1 to 5')
+    particles.add_argument('--size', type=int, nargs='+', default=None,
+                           help='sizes of added particles, from 1 to 5')
+    particles.add_argument('--mass', type=int, nargs='+', default=None,
+                           help='masses of added particles, from 1 to 5')
+    args = parser.parse_args(argv)
+
+    values = {'steps': args.steps}
+    if args.task == 'wiener':
+        values.update(walks=args.walks, dims=args.dims,
+                      increments=args.increments)
+    else:
+        values['particles'] = args.particles
+        for name in ('speed', 'size', 'mass'):
+            if getattr(args, name) is not None:
+                values[name] = getattr(args, name)
+
+    runs = [params for params in sweep(**values) for _ in range(args.runs)]
+    runner = EnsembleRunner(TASKS[args.task], args.processes, args.seed)
+
+    for entry in runner.run(runs):
+        stats = ', '.join(f'{name} = {value:.4g}' for name, value in
+                          entry.items() if name not in ('params', 'runs'))
+        print(f"{entry['params']} ({entry['runs']} runs): {stats}")
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,504 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import math
+import numpy as np
+from Particle import X_LIMITS, Y_LIMITS, MIN_DIST
+from typing import Dict, Tuple
+
+# Partner ids used in events that aren't collisions between two particles
+WALL_X = -1  # bouncing off the left or right wall
+WALL_Y = -2  # bouncing off the top or bottom wall
+CROSS_X = -3  # moving into the next cell left or right
+CROSS_Y = -4  # moving into the next cell up or down
+
+# Rough number of particles to put in each cell of the neighbor search. Fewer
+# particles per cell mean fewer to check in each prediction, but more events
+# moving between cells
+PARTICLES_PER_CELL = 1
+
+################################################################################
+
+class EventDrivenEngine:
+    """Event-driven simulation of the same hard disks as ParticleManager,
+    jumping straight from one collision to the next instead of moving
+    particles in fixed steps.
+
+    Two particles collide when the gap between them is MIN_DIST, and a particle
+    bounces off a wall when it is MIN_DIST from the wall, as in Particle.
+    Collisions are perfectly elastic, and walls turn the velocity by a right
+    angle, as Particle._check_wall_collision does, so both engines simulate
+    the same system. If the turned velocity still points into the wall, the
+    particle bounces again straight away, turning it back out, like
+    Particle._check_go_past_wall does in the next frame.
+
+    Each particle's position is stored as of the last event it took part in,
+    so only the particles involved in an event are updated. Every particle
+    keeps a single upcoming event, its earliest predicted collision, in a
+    priority queue, and events are invalidated lazily: an event is dropped
+    when its particle has been predicted again since, and the prediction is
+    redone when its partner has collided since.
+
+    The container is split into cells at least as wide as the largest
+    collision distance, and particles are only checked against others in the
+    surrounding cells. Moving into a new cell is an event of its own, so the
+    cost of an event doesn't grow with the number of particles. Moving into a
+    new cell doesn't change where a particle is going, so its earliest
+    collision with a wall or particle is kept, and only the particles in the
+    cells that have just come into reach are checked.
+
+    An event only involves a handful of particles, far too few for numpy to
+    pay off, so particles are kept in plain lists of floats, and numpy arrays
+    are only built when positions are asked for. Each event still costs a few
+    microseconds, far more than a particle's share of a step of the array
+    engine, so the engine is only faster than fixed steps in small, dilute
+    systems, where there are few events per step, or with very short steps
+    (see Benchmark.bench_event_engine).
+    """
+    def __init__(self, pos: np.ndarray, vel: np.ndarray, radii: np.ndarray,
+                 masses: np.ndarray):
+        self.radii = np.array(radii, dtype=float)
+        self.masses = np.array(masses, dtype=float)
+
+        self.time = 0.0
+        self.n_collisions = 0  # particle-particle collisions
+        self.n_wall_bounces = 0
+        self.wall_impulse = 0.0  # total impulse walls have given particles
+
+        # if set to a list, every particle that collides or bounces off a wall
+        # is added to it, e.g. for keeping Observables up to date
+        self.touched = None
+
+        pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+        vel = np.asarray(vel, dtype=float).reshape(-1, 2)
+        n = len(pos)
+
+        # positions as of each particle's last update, and velocities
+        self._x = pos[:, 0].tolist()
+        self._y = pos[:, 1].tolist()
+        self._vx = vel[:, 0].tolist()
+        self._vy = vel[:, 1].tolist()
+        self._r = self.radii.tolist()
+        self._m = self.masses.tolist()
+        self._last_update = [0.0] * n
+        self._counts = [0] * n  # collisions per particle
+        self._versions = [0] * n  # predictions per particle
+        # each particle's earliest collision with a wall or another particle,
+        # as (time, partner, partner's collision count), from its last
+        # prediction
+        self._next_collision = [(math.inf, None, 0)] * n
+
+        # closest each particle's center is allowed to get to the walls
+        self._low_x = [X_LIMITS[0] + MIN_DIST + r for r in self._r]
+        self._low_y = [Y_LIMITS[0] + MIN_DIST + r for r in self._r]
+        self._high_x = [X_LIMITS[1] - MIN_DIST - r for r in self._r]
+        self._high_y = [Y_LIMITS[1] - MIN_DIST - r for r in self._r]
+
+        # cells of the neighbor search, big enough to hold about
+        # PARTICLES_PER_CELL particles, so dilute systems don't spend most of
+        # their events moving between cells
+        width = X_LIMITS[1] - X_LIMITS[0]
+        height = Y_LIMITS[1] - Y_LIMITS[0]
+        min_cell_size = max(2 * self.radii.max(initial=0) + MIN_DIST,
+                            np.sqrt(PARTICLES_PER_CELL * width * height
+                                    / max(n, 1)))
+        self._nx = max(1, int(width // min_cell_size))
+        self._ny = max(1, int(height // min_cell_size))
+        self._cell_width = width / self._nx
+        self._cell_height = height / self._ny
+
+        self._cx = [min(max(int((x - X_LIMITS[0]) // self._cell_width), 0),
+                        self._nx - 1) for x in self._x]
+        self._cy = [min(max(int((y - Y_LIMITS[0]) // self._cell_height), 0),
+                        self._ny - 1) for y in self._y]
+        self._cell_members = [set() for _ in range(self._nx * self._ny)]
+        for i, (cx, cy) in enumerate(zip(self._cx, self._cy)):
+            self._cell_members[cy * self._nx + cx].add(i)
+
+        # the members of each cell and the cells around it
+        self._nearby_cells = []
+        for cy in range(self._ny):
+            for cx in range(self._nx):
+                self._nearby_cells.append([
+                    self._cell_members[ny * self._nx + nx]
+                    for ny in range(max(cy - 1, 0), min(cy + 2, self._ny))
+                    for nx in range(max(cx - 1, 0), min(cx + 2, self._nx))
+                ])
+
+        self._queue = []
+        self._tie_breaker = itertools.count()
+        for i in range(n):
+            self._predict(i)
+
+    @property
+    def vel(self) -> np.ndarray:
+        """(N, 2) array of the velocities of all particles.
+        """
+        return np.column_stack([self._vx, self._vy]).reshape(-1, 2)
+
+    def get_positions(self, t: float = None) -> np.ndarray:
+        """Return positions of all particles at time t, which defaults to the
+        current time, assuming no collisions happen between now and t.
+        """
+        if t is None:
+            t = self.time
+
+        elapsed = t - np.array(self._last_update)
+
+        return np.column_stack([np.array(self._x) + np.array(self._vx) * elapsed,
+                                np.array(self._y) + np.array(self._vy) * elapsed
+                                ]).reshape(-1, 2)
+
+    def state_at(self, t: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Advance the simulation to time t, and return copies of the
+        positions and velocities of all particles at that time.
+        """
+        self.advance_to(t)
+
+        return self.get_positions(), self.vel
+
+    def advance_to(self, t: float) -> None:
+        """Process every collision happening up to time t, and move the clock
+        to t.
+        """
+        if t < self.time:
+            raise ValueError(f"can't go back in time from {self.time} to {t}")
+
+        queue = self._queue
+        while queue and queue[0][0] <= t:
+            self._process_next_event()
+
+        self.time = t
+
+    def advance_events(self, n: int) -> None:
+        """Process the next n collisions, leaving the clock at the time of the
+        last one.
+        """
+        target = self.n_collisions + self.n_wall_bounces + n
+        while self._queue and self.n_collisions + self.n_wall_bounces < target:
+            self._process_next_event()
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Returns everything needed to carry on from exactly where the engine
+        is now, including every predicted event, as float arrays, e.g. to save
+        to a checkpoint and restore with from_state.
+        """
+        tie = next(self._tie_breaker)
+        self._tie_breaker = itertools.count(tie)
+
+        # particles with nothing to collide with have no partner
+        next_collision = [(t, -1 if partner is None else partner, count)
+                          for t, partner, count in self._next_collision]
+
+        return {
+            'clock': np.array([self.time, tie, self.n_collisions,
+                               self.n_wall_bounces, self.wall_impulse]),
+            'pos': np.column_stack([self._x, self._y]).reshape(-1, 2),
+            'vel': self.vel,
+            'last_update': np.array(self._last_update, dtype=float),
+            'counts': np.array(self._counts, dtype=float),
+            'versions': np.array(self._versions, dtype=float),
+            'next_collision': np.array(next_collision,
+                                       dtype=float).reshape(-1, 3),
+            'cells': np.column_stack([self._cx, self._cy]).reshape(-1, 2)
+                .astype(float),
+            'queue': np.array(self._queue, dtype=float).reshape(-1, 6),
+        }
+
+    @classmethod
+    def from_state(cls, radii: np.ndarray, masses: np.ndarray,
+                   state: Dict[str, np.ndarray]) -> 'EventDrivenEngine':
+        """Returns an engine carrying on from state, as returned by get_state,
+        for particles with the given radii and masses, which simulates
+        exactly the same collisions as the engine state was taken from.
+        """
+        engine = cls(state['pos'], state['vel'], radii, masses)
+
+        time, tie, n_collisions, n_wall_bounces, wall_impulse = \
+            state['clock'].tolist()
+        engine.time = time
+        engine._tie_breaker = itertools.count(int(tie))
+        engine.n_collisions = int(n_collisions)
+        engine.n_wall_bounces = int(n_wall_bounces)
+        engine.wall_impulse = wall_impulse
+
+        engine._last_update = state['last_update'].tolist()
+        engine._counts = state['counts'].astype(int).tolist()
+        engine._versions = state['versions'].astype(int).tolist()
+        engine._next_collision = [
+            (t, None if t == math.inf else int(partner), int(count))
+            for t, partner, count in state['next_collision'].tolist()
+        ]
+
+        # particles stay in the cells they were in, even if they've since
+        # moved a rounding error out of them
+        engine._cx, engine._cy = state['cells'].astype(int).T.tolist()
+        for members in engine._cell_members:
+            members.clear()
+        for i, (cx, cy) in enumerate(zip(engine._cx, engine._cy)):
+            engine._cell_members[cy * engine._nx + cx].add(i)
+
+        # the queue is already in heap order
+        engine._queue = [(t, int(tie), int(i), int(j), int(version),
+                          int(count))
+                         for t, tie, i, j, version, count in
+                         state['queue'].tolist()]
+
+        return engine
+
+    def _process_next_event(self) -> None:
+        t, _, i, j, version_i, count_j = heapq.heappop(self._queue)
+
+        if version_i != self._versions[i]:
+            return  # i has been predicted since, and has a newer event
+        if j >= 0 and count_j != self._counts[j]:
+            # j has collided since, so i's prediction is out of date
+            self._predict(i)
+            return
+
+        self.time = t
+        if j == CROSS_X or j == CROSS_Y:
+            self._sync(i)
+            self._move_cell(i, j == CROSS_X)
+            self._predict_after_move(i, j == CROSS_X)
+
+        elif j >= 0:
+            self._sync(i)
+            self._sync(j)
+            self._collide(i, j)
+            self.n_collisions += 1
+            if self.touched is not None:
+                self.touched += (i, j)
+
+            self._counts[i] += 1
+            self._counts[j] += 1
+            self._predict(i)
+            self._predict(j)
+        else:
+            self._sync(i)
+            self._bounce(i, j == WALL_X)
+            self.n_wall_bounces += 1
+            if self.touched is not None:
+                self.touched.append(i)
+
+            self._counts[i] += 1
+            self._predict(i)
+
+    def _bounce(self, i: int, across_x: bool) -> None:
+        """Bounce particle i off a wall, across x if across_x and across y
+        otherwise, as in Particle._check_wall_collision: the velocity is
+        reversed if it's perpendicular to the wall, and turned by a right
+        angle otherwise.
+
+        Only the part of the impulse normal to the wall, into the container,
+        is added to wall_impulse, as in ParticleArrays.get_wall_impulse.
+        """
+        vx, vy = self._vx[i], self._vy[i]
+        if (vy if across_x else vx) == 0:
+            new_vx, new_vy = -vx, -vy
+        else:
+            new_vx, new_vy = vy, -vx
+        self._vx[i], self._vy[i] = new_vx, new_vy
+
+        # the wall being hit is the one the particle was moving towards
+        if across_x:
+            inward = new_vx - vx if vx < 0 else vx - new_vx
+        else:
+            inward = new_vy - vy if vy < 0 else vy - new_vy
+        self.wall_impulse += self._m[i] * inward
+
+    def _sync(self, i: int) -> None:
+        """Move particle i's stored position forward to the current time.
+        """
+        elapsed = self.time - self._last_update[i]
+        self._x[i] += self._vx[i] * elapsed
+        self._y[i] += self._vy[i] * elapsed
+        self._last_update[i] = self.time
+
+    def _move_cell(self, i: int, across_x: bool) -> None:
+        """Move particle i into the next cell, across x if across_x and across
+        y otherwise, in the direction it is travelling.
+        """
+        nx = self._nx
+        self._cell_members[self._cy[i] * nx + self._cx[i]].discard(i)
+        if across_x:
+            self._cx[i] += 1 if self._vx[i] > 0 else -1
+        else:
+            self._cy[i] += 1 if self._vy[i] > 0 else -1
+        self._cell_members[self._cy[i] * nx + self._cx[i]].add(i)
+
+    def _collide(self, i: int, j: int) -> None:
+        """Adjust velocities of particles i and j after they've undergone a 2D
+        elastic collision, as in Particle._collide_particles.
+        """
+        cx = self._x[i] - self._x[j]
+        cy = self._y[i] - self._y[j]
+        b = ((self._vx[i] - self._vx[j]) * cx +
+             (self._vy[i] - self._vy[j]) * cy) / (cx * cx + cy * cy)
+        m_i, m_j = self._m[i], self._m[j]
+        total_mass = m_i + m_j
+
+        scale_i = 2 * m_j / total_mass * b
+        scale_j = 2 * m_i / total_mass * b
+        self._vx[i] -= scale_i * cx
+        self._vy[i] -= scale_i * cy
+        self._vx[j] += scale_j * cx
+        self._vy[j] += scale_j * cy
+
+    def _predict(self, i: int) -> None:
+        """Find the earliest upcoming event for particle i, colliding with a
+        wall or another particle or moving into a new cell, and queue it.
+        """
+        now = self.time
+        elapsed = now - self._last_update[i]
+        vx, vy = self._vx[i], self._vy[i]
+        x = self._x[i] + vx * elapsed
+        y = self._y[i] + vy * elapsed
+
+        best_time = math.inf
+        best_partner = None
+
+        # walls
+        if vx > 0:
+            best_time, best_partner = (self._high_x[i] - x) / vx, WALL_X
+        elif vx < 0:
+            best_time, best_partner = (self._low_x[i] - x) / vx, WALL_X
+        if vy > 0:
+            dt = (self._high_y[i] - y) / vy
+            if dt < best_time:
+                best_time, best_partner = dt, WALL_Y
+        elif vy < 0:
+            dt = (self._low_y[i] - y) / vy
+            if dt < best_time:
+                best_time, best_partner = dt, WALL_Y
+
+        best_time, best_partner = self._find_collision(
+            i, x, y, vx, vy,
+            self._nearby_cells[self._cy[i] * self._nx + self._cx[i]],
+            best_time, best_partner
+        )
+
+        # pairs that already overlap and walls that are already passed
+        # collide straight away
+        if best_partner is not None:
+            best_time = now + max(best_time, 0.0)
+        partner_count = self._counts[best_partner] \
+            if best_partner is not None and best_partner >= 0 else 0
+        self._next_collision[i] = (best_time, best_partner, partner_count)
+
+        self._queue_next_event(i, x, y, vx, vy)
+
+    def _predict_after_move(self, i: int, across_x: bool) -> None:
+        """Queue the next event for particle i after it has moved into a new
+        cell, across x if across_x and across y otherwise, only checking the
+        particles in the cells that have just come into reach.
+        """
+        best_time, best_partner, partner_count = self._next_collision[i]
+        if best_partner is not None and best_partner >= 0 and \
+                partner_count != self._counts[best_partner]:
+            # the partner has collided since, so the collision is off, and
+            # any other particle around could be next instead
+            self._predict(i)
+            return
+
+        now = self.time
+        vx, vy = self._vx[i], self._vy[i]  # synced by the move
+        x, y = self._x[i], self._y[i]
+        cx, cy, nx, ny = self._cx[i], self._cy[i], self._nx, self._ny
+
+        members = self._cell_members
+        if across_x:
+            column = cx + (1 if vx > 0 else -1)
+            cells = [members[row * nx + column]
+                     for row in range(max(cy - 1, 0), min(cy + 2, ny))] \
+                if 0 <= column < nx else []
+        else:
+            row = cy + (1 if vy > 0 else -1)
+            cells = [members[row * nx + column]
+                     for column in range(max(cx - 1, 0), min(cx + 2, nx))] \
+                if 0 <= row < ny else []
+
+        time, partner = self._find_collision(i, x, y, vx, vy, cells,
+                                             best_time - now, None)
+        if partner is not None:
+            self._next_collision[i] = (now + max(time, 0.0), partner,
+                                       self._counts[partner])
+
+        self._queue_next_event(i, x, y, vx, vy)
+
+    def _find_collision(self, i: int, x: float, y: float, vx: float,
+                        vy: float, cells: list, best_time: float,
+                        best_partner: int) -> Tuple[float, int]:
+        """Return the time from now and partner of particle i's earliest
+        collision with a particle in cells, sets of particle indices, or
+        best_time and best_partner if there's none sooner, for particle i
+        at (x, y) moving at (vx, vy).
+
+        Solves |dr + dv * t| = r_i + r_j + MIN_DIST for the smallest t, for
+        every pair moving towards each other.
+        """
+        now = self.time
+        x_all, y_all, vx_all, vy_all = self._x, self._y, self._vx, self._vy
+        last_update, r_all = self._last_update, self._r
+
+        reach = r_all[i] + MIN_DIST
+        for members in cells:
+            for j in members:
+                if j == i:
+                    continue
+                dvx = vx_all[j] - vx
+                dvy = vy_all[j] - vy
+                elapsed = now - last_update[j]
+                dx = x_all[j] + vx_all[j] * elapsed - x
+                dy = y_all[j] + vy_all[j] * elapsed - y
+                b = dx * dvx + dy * dvy
+                if b >= 0:
+                    continue  # moving apart
+
+                dv_sq = dvx * dvx + dvy * dvy
+                sigma = reach + r_all[j]
+                discriminant = b * b - dv_sq * (dx * dx + dy * dy -
+                                                sigma * sigma)
+                if discriminant < 0:
+                    continue  # passing each other by
+
+                dt = -(b + math.sqrt(discriminant)) / dv_sq
+                if dt < best_time:
+                    best_time, best_partner = dt, j
+
+        return best_time, best_partner
+
+    def _queue_next_event(self, i: int, x: float, y: float, vx: float,
+                          vy: float) -> None:
+        """Queue the sooner of particle i's next collision and its move into
+        the next cell, for particle i at (x, y) moving at (vx, vy).
+        """
+        self._versions[i] += 1
+        best_time, best_partner, partner_count = self._next_collision[i]
+
+        now = self.time
+        cx, cy = self._cx[i], self._cy[i]
+        if vx > 0 and cx + 1 < self._nx:
+            t = now + (X_LIMITS[0] + (cx + 1) * self._cell_width - x) / vx
+            if t < best_time:
+                best_time, best_partner, partner_count = t, CROSS_X, 0
+        elif vx < 0 and cx > 0:
+            t = now + (X_LIMITS[0] + cx * self._cell_width - x) / vx
+            if t < best_time:
+                best_time, best_partner, partner_count = t, CROSS_X, 0
+        if vy > 0 and cy + 1 < self._ny:
+            t = now + (Y_LIMITS[0] + (cy + 1) * self._cell_height - y) / vy
+            if t < best_time:
+                best_time, best_partner, partner_count = t, CROSS_Y, 0
+        elif vy < 0 and cy > 0:
+            t = now + (Y_LIMITS[0] + cy * self._cell_height - y) / vy
+            if t < best_time:
+                best_time, best_partner, partner_count = t, CROSS_Y, 0
+
+        if best_partner is None:
+            return  # particle is standing still
+
+        heapq.heappush(self._queue, (best_time, next(self._tie_breaker), i,
+                                     best_partner, self._versions[i],
+                                     partner_count))
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run the particle simulation without pygame, e.g. on a server, in a batch
+job or in tests.
+
+Usage: python Headless.py --particles 500 --steps 1000 --seed 1
+"""
+import argparse
+import numpy as np
+from Checkpoint import load_checkpoint, save_checkpoint
+from DomainDecomposition import DecomposedSimulation
+from Observables import Observables
+from ParticleManager import ParticleManager, BOUNDARIES, ENGINES, \
+    MAX_PARTICLES
+from Profiler import Profiler
+from Simulation import Simulation
+from Trajectory import record
+from typing import Dict, List
+
+################################################################################
+
+def build_manager(n: int, seed: int = None, speed: int = None,
+                  size: int = None, mass: int = None, engine: str = 'array',
+                  neighbor_skin: float = None, profiler: Profiler = None,
+                  packing_fraction: float = None,
+                  temperature: float = None,
+                  observables: Observables = None,
+                  boundary: str = 'walls') -> ParticleManager:
+    """Return a new ParticleManager simulating n particles.
+
+    If speed, size and mass are all None, the particles are random as in
+    ParticleManager.simulate_n_particles. Otherwise they are added as with the
+    GUI's ADD button, with any missing value defaulting to 1. The manager's
+    limit on the number of particles is raised to n, so all of them are
+    added. If packing_fraction
+    or temperature is given instead, the particles are placed without
+    overlapping as in ParticleManager.place_particles.
+
+    seed seeds the manager's random number generator, for reproducible runs,
+    profiler, if given, times each phase of every step, and observables, if
+    given, follows the energy, temperature and pressure of the particles.
+    boundary is passed on to the ParticleManager.
+    """
+    manager = ParticleManager(engine, neighbor_skin=neighbor_skin,
+                              rng=np.random.default_rng(seed),
+                              max_particles=max(n, MAX_PARTICLES),
+                              profiler=profiler, observables=observables,
+                              boundary=boundary)
+
+    if packing_fraction is not None or temperature is not None:
+        manager.place_particles(n, packing_fraction, temperature)
+    elif speed is None and size is None and mass is None:
+        manager.simulate_n_particles(n)
+    else:
+        for _ in range(n):
+            manager.add_particle(speed or 1, size or 1, mass or 1)
+
+    return manager
+
+
+def run_headless(manager: ParticleManager, steps: int, dt: float = 1.0,
+                 record_path: str = None, checkpoint_path: str = None,
+                 checkpoint_every: int = None,
+                 simulation: Simulation = None) -> Dict[str, float]:
+    """Advance the particles in manager by steps steps of dt units of time
+    without rendering, as fast as possible, and return how long this took.
+
+    If record_path is given, the particles are recorded to it at every step,
+    to be replayed later with a Trajectory.TrajectoryReader.
+
+    If checkpoint_path is given, the whole simulation is saved to it at the
+    end, and every checkpoint_every steps if that's given too, so it can be
+    carried on from with Checkpoint.load_checkpoint. simulation, e.g. one
+    restored by load_checkpoint, is carried on from instead of starting a new
+    Simulation of manager, as can a DecomposedSimulation of manager, to use
+    several cores.
+    """
+    if simulation is None:
+        simulation = Simulation(manager, dt)
+
+    if record_path is not None:
+        def save_every(done: int) -> None:
+            if checkpoint_path is not None and checkpoint_every and \
+                    done % checkpoint_every == 0 and done < steps:
+                save_checkpoint(checkpoint_path, simulation)
+
+        seconds = record(simulation, record_path, steps, on_step=save_every)
+    else:
+        seconds = 0.0
+        done = 0
+        while done < steps:
+            batch = min(checkpoint_every or steps, steps - done)
+            seconds += simulation.run(batch)
+            done += batch
+
+            if checkpoint_path is not None and done < steps:
+                save_checkpoint(checkpoint_path, simulation)
+
+    if checkpoint_path is not None:
+        save_checkpoint(checkpoint_path, simulation)
+
+    return {
+        'particles': manager.get_num_particles(),
+        'steps': steps,
+        'seconds': seconds,
+        'steps_per_second': steps / seconds if seconds > 0 else float('inf')
+    }
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Run the particle simulation without rendering.'
+    )
+    parser.add_argument('--particles', '-n', type=int, default=30,
+                        help='number of particles to simulate')
+    parser.add_argument('--steps', '-k', type=int, default=1000,
+                        help='number of physics steps to run, counting any '
+                             'already taken before a checkpoint resumed from')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the random number generator')
+    parser.add_argument('--speed', type=int, default=None,
+                        help='speed of added particles, from 1 to 5')
+    parser.add_argument('--size', type=int, default=None,
+                        help='size of added particles, from 1 to 5')
+    parser.add_argument('--mass', type=int, default=None,
+                        help='mass of added particles, from 1 to 5')
+    parser.add_argument('--packing-fraction', type=float, default=None,
+                        help='place particles without overlapping, scaled to '
+                             'cover this fraction of the container')
+    parser.add_argument('--temperature', type=float, default=None,
+                        help='place particles without overlapping, with '
+                             'velocities drawn for this temperature')
+    parser.add_argument('--dt', type=float, default=1.0,
+                        help='units of simulated time per physics step')
+    parser.add_argument('--engine', choices=ENGINES, default='array',
+                        help='simulation engine to use')
+    parser.add_argument('--boundary', choices=BOUNDARIES, default='walls',
+                        help='bounce particles off the container walls, or '
+                             'wrap them around (array engine only)')
+    parser.add_argument('--neighbor-skin', type=float, default=None,
+                        help='cache nearby pairs in a neighbor list with '
+                             'this skin, which only pays off for particles '
+                             'moving much less than their spacing per step')
+    parser.add_argument('--record', default=None,
+                        help='directory to record the particles at every step '
+                             'to, for replaying with main.py --replay')
+    parser.add_argument('--checkpoint', default=None,
+                        help='file to save the whole simulation to at the end')
+    parser.add_argument('--checkpoint-every', type=int, default=None,
+                        help='also save the checkpoint every this many steps')
+    parser.add_argument('--resume', default=None,
+                        help='checkpoint file to carry on from, instead of '
+                             'starting with new particles')
+    parser.add_argument('--profile', default=None,
+                        help='time each phase of every step, and write the '
+                             'times to this file, as CSV if it ends in .csv '
+                             'and JSON otherwise')
+    parser.add_argument('--observables', default=None,
+                        help='follow the energy, temperature, momentum and '
+                             'wall pressure of the particles, and write them '
+                             'to this CSV file')
+    parser.add_argument('--sample-every', type=int, default=1,
+                        help='steps between samples written to --observables')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='split the container into strips simulated by '
+                             'this many processes, giving the same particles '
+                             '(array engine with walls only)')
+    args = parser.parse_args(argv)
+    if args.boundary == 'periodic' and args.engine != 'array':
+        parser.error('--boundary periodic needs --engine array')
+    if args.workers is not None and (args.observables is not None or
+                                     args.profile is not None):
+        parser.error('--observables and --profile can\'t be used with '
+                     '--workers')
+
+    profiler = Profiler(enabled=args.profile is not None)
+    observables = None
+    if args.observables is not None:
+        observables = Observables(args.sample_every)
+
+    if args.resume is not None:
+        simulation = load_checkpoint(args.resume, profiler)
+        manager = simulation.manager
+        if observables is not None and manager.observables is not None:
+            # carry on with the time series saved in the checkpoint
+            observables = manager.observables
+            observables.sample_every = args.sample_every
+        manager.observables = observables
+        steps = max(0, args.steps - simulation.steps)
+    else:
+        simulation = None
+        manager = build_manager(args.particles, args.seed, args.speed,
+                                args.size, args.mass, args.engine,
+                                args.neighbor_skin, profiler,
+                                args.packing_fraction, args.temperature,
+                                observables, args.boundary)
+        steps = args.steps
+
+    if args.workers is not None:
+        decomposed = DecomposedSimulation(
+            manager, args.workers,
+            args.dt if simulation is None else simulation.dt
+        )
+        if simulation is not None:
+            decomposed.steps, decomposed.time = simulation.steps, simulation.time
+        simulation = decomposed
+
+    try:
+        result = run_headless(manager, steps, args.dt, args.record,
+                              args.checkpoint, args.checkpoint_every,
+                              simulation)
+    finally:
+        if args.workers is not None:
+            simulation.close()
+
+    print(f"{result['particles']} particles, {result['steps']} steps in "
+          f"{result['seconds']:.3f} s ({result['steps_per_second']:.1f} "
+          f"steps/s)")
+
+    if args.profile is not None:
+        for line in profiler.format_lines():
+            print(line)
+        profiler.export(args.profile)
+
+    if observables is not None:
+        print(f"kinetic energy {observables.kinetic_energy:.6g}, temperature "
+              f"{observables.get_temperature():.6g}, energy change from "
+              f"collisions {observables.collision_energy_change:.3g}")
+        observables.to_csv(args.observables)
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import numpy as np
+import ParticleArrays
+from Particle import MIN_DIST
+from typing import Tuple
+
+# Largest fraction of the particles that may have moved too far for the list
+# before it's rebuilt from scratch, rather than only the pairs of those
+# particles being found again
+REFRESH_FRACTION = 0.1
+
+# Number of steps a typical particle takes to use up its share of a skin from
+# suggest_skin
+SKIN_STEPS = 4
+
+################################################################################
+
+def suggest_skin(vel: np.ndarray, dt: float = 1.0,
+                 steps: int = SKIN_STEPS) -> float:
+    """Returns a skin for a NeighborList of particles with velocities vel,
+    which a particle moving at their root mean square speed takes steps
+    steps of dt units of time to use up its half of.
+
+    A neighbor list is only worth using if particles move much less than the
+    gap between neighbors in each step. Otherwise the skin is used up within
+    a step or two, and rebuilding the list every step costs more than
+    searching the grid of ParticleArrays.grid_pairs.
+    """
+    vel = np.asarray(vel, dtype=float).reshape(-1, 2)
+    if len(vel) == 0:
+        return 1.0
+
+    rms_speed = np.sqrt(np.einsum('ij,ij->i', vel, vel).mean())
+
+    return max(2 * steps * rms_speed * dt, 1e-6)
+
+
+class NeighborList:
+    """Verlet neighbor list, caching every pair of particles within
+    r_i + r_j + MIN_DIST + skin of each other across frames.
+
+    A pair that is missing from the list had a gap of more than
+    MIN_DIST + skin between the particles when the list was built, so it can't
+    be colliding until one of the particles has moved by more than half the
+    skin. Only the pairs of particles that have moved that far are found
+    again, with a wider reach, as long as there are few of them, and the
+    whole list is rebuilt once more than REFRESH_FRACTION of the particles
+    have, so a few fast particles don't force a rebuild every frame.
+
+    If periodic is True, the container wraps around, as in ParticleArrays,
+    and pairs are found across opposite edges too.
+    """
+    def __init__(self, skin: float, periodic: bool = False):
+        if skin <= 0:
+            raise ValueError(f"skin must be positive, not {skin}")
+
+        self.skin = skin
+        self.periodic = periodic
+        self.rebuild_count = 0
+        self.refresh_count = 0
+
+        self._i = np.zeros(0, dtype=np.int64)
+        self._j = np.zeros(0, dtype=np.int64)
+        # position of each particle when its pairs were last found
+        self._built_pos = None
+        self._reach = skin  # how far past touching pairs were searched for
+
+    def invalidate(self) -> None:
+        """Force a rebuild the next time pairs are requested, e.g. after
+        particles have been added or removed.
+        """
+        self._built_pos = None
+
+    def get_pairs(self, pos: np.ndarray, radii: np.ndarray,
+                  margin: float = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Return index arrays (i, j), with i < j, for every pair of particles
+        in the list, updating the list first if it could be missing a pair
+        that is colliding.
+
+        margin is any further distance particles may move before the pairs
+        are checked, which is added on to the skin when rebuilding.
+        """
+        if self._built_pos is None or self._built_pos.shape != pos.shape:
+            self._rebuild(pos, radii, margin)
+            return self._i, self._j
+
+        moved = self._find_moved(pos, margin)
+        if len(moved) > REFRESH_FRACTION * len(pos):
+            self._rebuild(pos, radii, margin)
+        elif len(moved) > 0:
+            self._refresh(pos, radii, margin, moved)
+
+        return self._i, self._j
+
+    def _find_moved(self, pos: np.ndarray, margin: float) -> np.ndarray:
+        """Returns the particles that have moved by more than their half of
+        the skin since their pairs were last found.
+        """
+        disp = pos - self._built_pos
+        if self.periodic:
+            # a particle wrapping around has only moved a little
+            disp -= ParticleArrays.BOX * np.round(disp / ParticleArrays.BOX)
+        half = (self._reach - margin) / 2
+
+        return np.flatnonzero(np.einsum('ij,ij->i', disp, disp) >
+                              half * abs(half))
+
+    def _rebuild(self, pos: np.ndarray, radii: np.ndarray,
+                 margin: float) -> None:
+        self._reach = self.skin + margin
+        i, j = ParticleArrays.grid_pairs(pos, radii, self._reach,
+                                         self.periodic)
+
+        # not sorted, as find_colliding_pairs sorts the few colliding pairs
+        close = self._are_close(pos, radii, i, j, self._reach)
+        self._i = i[close]
+        self._j = j[close]
+        self._built_pos = pos.copy()
+
+        self.rebuild_count += 1
+
+    def _refresh(self, pos: np.ndarray, radii: np.ndarray, margin: float,
+                 moved: np.ndarray) -> None:
+        """Find the pairs of the particles in moved again, from their current
+        positions.
+
+        Other particles can be up to their half of the skin from where their
+        pairs were found, and can move as far again before theirs are found
+        again, so pairs are searched for half a skin further out.
+        """
+        reach = self._reach + (self._reach - margin) / 2
+        i, j = ParticleArrays.grid_neighbor_pairs(pos, radii, moved, reach,
+                                                  self.periodic)
+        close = self._are_close(pos, radii, i, j, reach)
+
+        is_moved = np.zeros(len(pos), dtype=bool)
+        is_moved[moved] = True
+        keep = ~(is_moved[self._i] | is_moved[self._j])
+
+        self._i = np.concatenate([self._i[keep], i[close]])
+        self._j = np.concatenate([self._j[keep], j[close]])
+        self._built_pos[moved] = pos[moved]
+
+        self.refresh_count += 1
+
+    def _are_close(self, pos: np.ndarray, radii: np.ndarray, i: np.ndarray,
+                   j: np.ndarray, reach: float) -> np.ndarray:
+        """Returns whether each pair (i, j) is within reach of touching.
+        """
+        diff = ParticleArrays.separation(pos, i, j, self.periodic)
+        cutoff = radii[i] + radii[j] + MIN_DIST + reach
+
+        return np.einsum('ij,ij->i', diff, diff) <= cutoff ** 2
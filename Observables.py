@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Thermodynamic quantities of the particles in a ParticleManager: kinetic
+energy, temperature, momentum, pressure on the container walls and the
+distribution of speeds.
+
+Rather than going over every particle again, the totals are kept up to date
+from the particles that collided or bounced off a wall in each step, which
+the simulation has already found. Every sample_every steps, the totals are
+added to a time series:
+
+    observables = Observables(sample_every=10)
+    manager = ParticleManager('array', observables=observables)
+    ...
+    series = observables.get_time_series()
+
+Temperatures are in the units of Placement, where Boltzmann's constant is 1
+and the motion of the center of mass doesn't count. Pressure is the impulse
+walls give particles normal to the walls, per unit length of wall and unit of
+time, so a dilute gas has pressure times area close to N times temperature.
+"""
+import csv
+import numpy as np
+from collections import deque
+from Particle import Particle, X_LIMITS, Y_LIMITS
+from typing import Dict, Tuple
+
+# Bins of the speed histogram, evenly spread from 0 to HISTOGRAM_MAX_SPEED,
+# with faster particles counted in the last bin
+SPEED_BINS = 20
+HISTOGRAM_MAX_SPEED = 20.0
+
+# Quantities recorded in the time series, in order
+SERIES = ('time', 'kinetic_energy', 'temperature', 'momentum_x',
+          'momentum_y', 'pressure', 'collision_energy_change')
+
+PERIMETER = 2 * ((X_LIMITS[1] - X_LIMITS[0]) + (Y_LIMITS[1] - Y_LIMITS[0]))
+
+################################################################################
+
+class Observables:
+    """Running totals of thermodynamic quantities, kept up to date from the
+    particles changed in each step.
+
+    A copy of every particle's velocity, as of when it last changed, is kept,
+    so a change can be taken out of the totals. Totals drift by rounding over
+    long runs, so they're computed from scratch again whenever particles are
+    added or removed, or resync is called.
+
+    collision_energy_change adds up the change in kinetic energy from every
+    collision, which would be 0 if collisions conserved energy exactly.
+
+    A sample of the totals is added to the time series every sample_every
+    steps, keeping only the last max_samples, if given.
+    """
+    def __init__(self, sample_every: int = 1, max_samples: int = None,
+                 speed_bins: int = SPEED_BINS,
+                 max_speed: float = HISTOGRAM_MAX_SPEED):
+        self.sample_every = sample_every
+        self.speed_edges = np.linspace(0, max_speed, speed_bins + 1)
+        self._samples = deque(maxlen=max_samples)
+
+        self.time = 0.0
+        self.steps = 0
+        self.collision_energy_change = 0.0
+        self.wall_impulse = 0.0  # since the last sample
+
+        self._last_sample_time = 0.0
+        self.resync(np.zeros((0, 2)), np.zeros(0))
+
+    def resync(self, vel: np.ndarray, masses: np.ndarray) -> None:
+        """Compute every total from scratch, for particles with velocities vel
+        and masses masses.
+        """
+        self._vel = np.array(vel, dtype=float).reshape(-1, 2)
+        self._masses = np.array(masses, dtype=float)
+
+        self.kinetic_energy = 0.5 * float(np.sum(self._masses *
+                                                 np.sum(self._vel ** 2, axis=1)))
+        self.momentum = (self._masses[:, None] * self._vel).sum(axis=0)
+        self.speed_counts = np.bincount(self._get_bins(self._vel),
+                                        minlength=len(self.speed_edges) - 1)
+
+    def update(self, vel: np.ndarray, indices: np.ndarray = None) -> float:
+        """Update the totals for the particles at indices, which may repeat,
+        having changed to velocities vel, an array of the velocities of all
+        particles. All particles are checked if indices is None.
+
+        Returns the change in kinetic energy.
+        """
+        if indices is None:
+            indices = np.arange(len(self._vel))
+        else:
+            indices = np.unique(indices)
+
+        old = self._vel[indices]
+        new = np.asarray(vel, dtype=float)[indices]
+        masses = self._masses[indices]
+        self._vel[indices] = new
+
+        change = 0.5 * float(np.sum(masses * (np.sum(new ** 2, axis=1) -
+                                              np.sum(old ** 2, axis=1))))
+        self.kinetic_energy += change
+        self.momentum += (masses[:, None] * (new - old)).sum(axis=0)
+
+        bins = len(self.speed_counts)
+        self.speed_counts -= np.bincount(self._get_bins(old), minlength=bins)
+        self.speed_counts += np.bincount(self._get_bins(new), minlength=bins)
+
+        return change
+
+    def add_collisions(self, vel: np.ndarray,
+                       indices: np.ndarray = None) -> None:
+        """Update the totals for particles at indices that have just collided
+        with each other, as in update, and count the change in kinetic energy
+        towards collision_energy_change.
+        """
+        self.collision_energy_change += self.update(vel, indices)
+
+    def add_wall_impulse(self, impulse: float) -> None:
+        """Count impulse given to particles by the walls towards the pressure.
+        """
+        self.wall_impulse += impulse
+
+    def end_step(self, dt: float) -> None:
+        """Move the clock on by a step dt units of time long, and take a
+        sample if it's due.
+        """
+        self.time += dt
+        self.steps += 1
+
+        if self.steps % self.sample_every == 0:
+            self.sample()
+
+    def sample(self) -> None:
+        """Add the current totals to the time series, with the pressure
+        averaged since the last sample.
+        """
+        pressure = self.get_pressure()
+        self._samples.append((self.time, self.kinetic_energy,
+                              self.get_temperature(), self.momentum[0],
+                              self.momentum[1], pressure,
+                              self.collision_energy_change))
+
+        self.wall_impulse = 0.0
+        self._last_sample_time = self.time
+
+    def get_temperature(self) -> float:
+        """Returns the temperature of the particles, from their kinetic energy
+        less that of their center of mass.
+        """
+        n = len(self._vel)
+        if n < 2:
+            return 0.0
+
+        total_mass = self._masses.sum()
+        center_energy = 0.5 * float(np.dot(self.momentum, self.momentum)) / \
+            total_mass
+
+        return (self.kinetic_energy - center_energy) / (n - 1)
+
+    def get_pressure(self) -> float:
+        """Returns the pressure on the walls since the last sample.
+        """
+        elapsed = self.time - self._last_sample_time
+        if elapsed <= 0:
+            return 0.0
+
+        return self.wall_impulse / (PERIMETER * elapsed)
+
+    def get_speed_histogram(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the number of particles in each speed bin, and the edges of
+        the bins.
+        """
+        return self.speed_counts.copy(), self.speed_edges.copy()
+
+    def get_time_series(self) -> Dict[str, np.ndarray]:
+        """Returns an array of every quantity in SERIES, with an entry per
+        sample.
+        """
+        columns = np.array(self._samples, dtype=float).reshape(-1,
+                                                               len(SERIES))
+
+        return {name: columns[:, k] for k, name in enumerate(SERIES)}
+
+    def to_csv(self, path: str) -> None:
+        """Write the time series to path as CSV, with a row per sample.
+        """
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SERIES)
+            writer.writerows(self._samples)
+
+    def get_state(self) -> Dict:
+        """Returns the settings, clock and time series as plain numbers and
+        lists, e.g. to save as JSON and restore with from_state.
+
+        Totals over the particles aren't included, as they're computed again
+        from the particles themselves.
+        """
+        return {
+            'sample_every': self.sample_every,
+            'max_samples': self._samples.maxlen,
+            'speed_edges': self.speed_edges.tolist(),
+            'time': self.time,
+            'steps': self.steps,
+            'collision_energy_change': self.collision_energy_change,
+            'wall_impulse': self.wall_impulse,
+            'last_sample_time': self._last_sample_time,
+            'samples': [list(sample) for sample in self._samples],
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'Observables':
+        """Returns Observables carrying on from state, as returned by
+        get_state, which need resyncing with the particles before use.
+        """
+        edges = state['speed_edges']
+        observables = cls(state['sample_every'], state['max_samples'],
+                          len(edges) - 1, edges[-1])
+        observables.speed_edges = np.array(edges, dtype=float)
+
+        observables.time = state['time']
+        observables.steps = state['steps']
+        observables.collision_energy_change = state['collision_energy_change']
+        observables.wall_impulse = state['wall_impulse']
+        observables._last_sample_time = state['last_sample_time']
+        observables._samples.extend(tuple(sample)
+                                    for sample in state['samples'])
+
+        return observables
+
+    def _get_bins(self, vel: np.ndarray) -> np.ndarray:
+        """Returns the speed histogram bin of each velocity.
+        """
+        bins = np.searchsorted(self.speed_edges, np.linalg.norm(vel, axis=1),
+                               side='right') - 1
+
+        return np.minimum(bins, len(self.speed_edges) - 2)
+
+
+def check_collision_conservation(n_pairs: int = 1000,
+                                 rng: np.random.Generator = None) \
+        -> Dict[str, float]:
+    """Collide n_pairs random pairs of touching particles, moving towards each
+    other, with Particle._collide_particles, and return the largest relative
+    changes in their total kinetic energy and momentum.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    energy_error = 0.0
+    momentum_error = 0.0
+    for _ in range(n_pairs):
+        r1, r2 = rng.uniform(1, 20, size=2)
+        m1, m2 = rng.uniform(1, 20, size=2)
+        angle = rng.uniform(0, 2 * np.pi)
+        offset = (r1 + r2) * np.array([np.cos(angle), np.sin(angle)])
+
+        a = Particle(rng.uniform(-10, 10, size=2), np.zeros(2), r1, m1, None)
+        b = Particle(rng.uniform(-10, 10, size=2), offset, r2, m2, None)
+        if np.dot(b.pos - a.pos, a.vel - b.vel) <= 0:
+            a.vel, b.vel = b.vel, a.vel  # make them move towards each other
+
+        energy = 0.5 * (m1 * a.vel @ a.vel + m2 * b.vel @ b.vel)
+        momentum = m1 * a.vel + m2 * b.vel
+
+        a._collide_particles(b)
+
+        new_energy = 0.5 * (m1 * a.vel @ a.vel + m2 * b.vel @ b.vel)
+        new_momentum = m1 * a.vel + m2 * b.vel
+
+        energy_error = max(energy_error, abs(new_energy - energy) / energy)
+        # relative to the momenta of the particles, as the total can be ~0
+        scale = m1 * np.linalg.norm(a.vel) + m2 * np.linalg.norm(b.vel)
+        momentum_error = max(momentum_error,
+                             float(np.linalg.norm(new_momentum - momentum)
+                                   / scale))
+
+    return {'pairs': n_pairs, 'max_energy_error': energy_error,
+            'max_momentum_error': momentum_error}
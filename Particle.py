@@ -20,33 +20,41 @@ class Particle:
         self.mass = mass
         self.color = color
 
-        # keep track of particles this particle has already had collisions
-        # accounted for with in this frame
-        # ensures that each interparticle collision is only simulated once
-        # per frame
-        self._collided_with = []
-
-    def update_position(self, other_particles: List[Particle]) -> None:
-        # reset list of particles this particle has collided with, as we are
-        # in a new frame
-        self._collided_with = []
+    def update_position(self, other_particles: List[Particle],
+                        dt: float = 1.0,
+                        touched: List[Particle] = None) -> float:
+        """Move the particle on by a frame, dt units of time long, and return
+        the impulse walls gave it, normal to the walls and into the container.
+
+        If touched is given, this particle and every particle it collides
+        with are added to it if their velocities change, e.g. for keeping
+        Observables up to date.
+        """
+        old_vel = self.vel
 
         # check for collision with other particles and update velocity
-        self._check_particle_collisions(other_particles)
+        self._check_particle_collisions(other_particles, touched)
 
         # check for collision w/ wall and update velocity accordingly
-        self._check_wall_collision()
+        impulse = self._check_wall_collision()
 
         # enforce wall collisions if new velocity of particle causes it to go
         # beyond a wall container in the next frame
-        self._check_go_past_wall()
+        impulse += self._check_go_past_wall(dt)
 
-        # update position using updated velocity, and assuming time increment of
-        # 1 unit
+        # update position using updated velocity, over a time increment of dt
+        # units
         self.pos = np.array(
-            [self._get_x() + self.vel[0], self._get_y() + self.vel[1]]
+            [self._get_x() + self.vel[0] * dt, self._get_y() + self.vel[1] * dt]
         )
 
+        # collisions and bounces replace the velocity rather than changing it
+        # in place
+        if touched is not None and self.vel is not old_vel:
+            touched.append(self)
+
+        return impulse
+
     def get_position(self) -> Tuple[float]:
         return self._get_x(), self._get_y()
 
@@ -56,13 +64,15 @@ class Particle:
     def _get_y(self) -> float:
         return self.pos[1]
 
-    def _check_wall_collision(self) -> bool:
+    def _check_wall_collision(self) -> float:
         """Checks if the particle has collided with any of the container walls,
-        and adjusts the particle's velocity to collide elastically if so.
+        and adjusts the particle's velocity to collide elastically if so,
+        returning the impulse the wall gave it, as in _get_wall_impulse.
 
         A collision counts as the particle being within 2 pixels of a wall,
         including the radius of the particle.
         """
+        old_vel = self.vel
         # check for collision with left/right container borders
         # count as collision if particle is MIN_DIST + radius units away from
         # border,
@@ -81,6 +91,7 @@ class Particle:
                 # otherwise, flip velocity vector and negate new y velocity,
                 # to bounce off right angle from wall
                 self.vel = np.array([self.vel[1], -self.vel[0]])
+            return self._get_wall_impulse(old_vel, 0, dx_left <= 0)
         
         elif dy_top <= 0 or dy_bottom <= 0:
             # particle velocity perpendicular to top/bottom border
@@ -88,18 +99,34 @@ class Particle:
                 self.vel = -self.vel
             else:
                 self.vel = np.array([self.vel[1], -self.vel[0]])
+            return self._get_wall_impulse(old_vel, 1, dy_top <= 0)
+
+        return 0.0
 
-    def _check_particle_collisions(self, other_particles: List[Particle]) -> None:
+    def _get_wall_impulse(self, old_vel: np.ndarray, axis: int,
+                          low: bool) -> float:
+        """Returns the impulse a wall across axis gave the particle in
+        bouncing it from old_vel to its current velocity, counting only the
+        component normal to the wall, into the container. low is whether it
+        is the left or top wall, rather than the right or bottom one.
+        """
+        inward = 1 if low else -1
+
+        return self.mass * inward * (self.vel[axis] - old_vel[axis])
+
+    def _check_particle_collisions(self, other_particles: List[Particle],
+                                   touched: List[Particle] = None) -> None:
         """Check if particle has collided with some other particle.
         If so, adjust the velocity of both particles accordingly, assuming
-        a perfect elastic collision.
+        a perfect elastic collision, and add the other particle to touched,
+        if given.
+
+        Each pair of particles is only simulated colliding once per frame, as
+        after colliding the pair is no longer moving towards each other.
         """
         for p in other_particles:
             # distance between 2 particles = distance between centres minus radii
             # of both particles
-            if p in self._collided_with:
-                break  # collision was already accounted for by this particle
-
             dist = np.linalg.norm(self.pos - p.pos) - self.r - p.r
 
             if dist <= MIN_DIST:
@@ -109,7 +136,8 @@ class Particle:
                 moving_toward = np.dot(p.pos - self.pos, self.vel - p.vel) > 0
                 if moving_toward:
                     self._collide_particles(p)
-                    self._collided_with.append(p)
+                    if touched is not None:
+                        touched.append(p)
     
     def _collide_particles(self, other: Particle) -> None:
         """Adjust velocities of this particle and some other particle after
@@ -126,16 +154,18 @@ class Particle:
         self.vel = self.vel - (a1 * b1 * c1)
         other.vel = other.vel - (a2 * b2 * c2)
     
-    def _check_go_past_wall(self) -> None:
+    def _check_go_past_wall(self, dt: float = 1.0) -> float:
         """Checks whether the particle's new velocity, after colliding with wall
         and/or other particles will cause it to go beyond the walls in the next
-        frame.
+        frame, dt units of time from now.
 
         Make the particle "collide" with the wall it is about to pass if this
-        is the case.
+        is the case, returning the impulse the wall gave it, as in
+        _get_wall_impulse.
         """
-        future_x = self._get_x() + self.vel[0]
-        future_y = self._get_y() + self.vel[1]
+        old_vel = self.vel
+        future_x = self._get_x() + self.vel[0] * dt
+        future_y = self._get_y() + self.vel[1] * dt
 
         dx_left_future = future_x - (X_LIMITS[0] + MIN_DIST + self.r)
         dx_right_future = (X_LIMITS[1] - MIN_DIST - self.r) - future_x
@@ -151,6 +181,7 @@ class Particle:
                 # otherwise, flip velocity vector and negate new y velocity,
                 # to bounce off right angle from wall
                 self.vel = np.array([self.vel[1], -self.vel[0]])
+            return self._get_wall_impulse(old_vel, 0, dx_left_future <= 0)
 
         elif dy_top_future <= 0 or dy_bottom_future <= 0:
             # particle velocity perpendicular to top/bottom border
@@ -158,3 +189,6 @@ class Particle:
                 self.vel = -self.vel
             else:
                 self.vel = np.array([self.vel[1], -self.vel[0]])
+            return self._get_wall_impulse(old_vel, 1, dy_top_future <= 0)
+
+        return 0.0
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Vectorized physics for particles stored as a structure of arrays.
+
+Positions and velocities are (N, 2) float arrays, radii and masses are (N,)
+float arrays. Every function here mirrors one of the per-particle methods of
+Particle, but operates on the whole system at once.
+
+Functions taking periodic treat the container as wrapping around, with no
+walls, and measure the separation of two particles to the nearest copy of
+one of them (the minimum image convention).
+"""
+import numpy as np
+from Particle import X_LIMITS, Y_LIMITS, MIN_DIST
+from SpatialGrid import SpatialGrid
+from typing import Tuple
+
+# Width and height of the container, which positions wrap around when periodic
+BOX = np.array([X_LIMITS[1] - X_LIMITS[0], Y_LIMITS[1] - Y_LIMITS[0]],
+               dtype=float)
+
+# Particles with radii more than this many times the median radius are paired
+# up directly, rather than through the grid, whose cells would otherwise have
+# to grow to fit them, e.g. a large tracer in a bath of small particles
+LARGE_RADIUS_RATIO = 4
+
+################################################################################
+
+def all_pairs(n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return index arrays (i, j), with i < j, for every pair of n particles.
+    """
+    return np.triu_indices(n, 1)
+
+
+def separation(pos: np.ndarray, i: np.ndarray, j: np.ndarray,
+               periodic: bool = False) -> np.ndarray:
+    """Return pos[i] - pos[j], to the nearest copy of particle j if
+    periodic.
+    """
+    diff = pos[i] - pos[j]
+    if periodic:
+        diff -= BOX * np.round(diff / BOX)
+
+    return diff
+
+
+def wrap_positions(pos: np.ndarray) -> None:
+    """Wrap positions that have left the container back into it from the
+    opposite side, in place.
+    """
+    origin = (X_LIMITS[0], Y_LIMITS[0])
+    pos -= origin
+    np.mod(pos, BOX, out=pos)
+    pos += origin
+
+
+def grid_pairs(pos: np.ndarray, radii: np.ndarray, margin: float = 0,
+               periodic: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Return index arrays (i, j), with i < j, for every pair of particles
+    that are close enough to possibly collide, using a SpatialGrid.
+
+    Cells are sized so any two particles within MIN_DIST + margin of touching
+    are in the same or neighboring cells. Particles much larger than the rest
+    (see LARGE_RADIUS_RATIO) are left out of the grid, and paired with every
+    particle within MIN_DIST + margin of touching them instead.
+    """
+    if len(pos) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    large = radii > LARGE_RADIUS_RATIO * np.median(radii)
+    if not large.any():
+        grid = SpatialGrid(2 * radii.max() + MIN_DIST + margin,
+                           periodic=periodic)
+        return grid.candidate_pairs(pos)
+
+    small = np.flatnonzero(~large)
+    grid = SpatialGrid(2 * radii[small].max() + MIN_DIST + margin,
+                       periodic=periodic)
+    i, j = grid.candidate_pairs(pos[small])
+    pairs_i, pairs_j = [small[i]], [small[j]]
+
+    for k in np.flatnonzero(large).tolist():
+        # pairs with large particles before k were found already
+        others = np.concatenate([small, np.flatnonzero(large[k + 1:]) + k + 1])
+        diff = separation(pos, np.full(len(others), k), others, periodic)
+        reach = radii[k] + radii[others] + MIN_DIST + margin
+        near = others[np.einsum('ij,ij->i', diff, diff) <= reach ** 2]
+        pairs_i.append(np.minimum(near, k))
+        pairs_j.append(np.maximum(near, k))
+
+    return (np.concatenate(pairs_i).astype(np.int64),
+            np.concatenate(pairs_j).astype(np.int64))
+
+
+def grid_neighbor_pairs(pos: np.ndarray, radii: np.ndarray,
+                        which: np.ndarray, margin: float = 0,
+                        periodic: bool = False) -> Tuple[np.ndarray,
+                                                         np.ndarray]:
+    """Return index arrays (i, j), with i < j, pairing each particle in which
+    with every other particle close enough to possibly collide with it, as
+    grid_pairs does for every particle.
+
+    Particles much larger than the rest are left out of the grid in the same
+    way, and paired directly with every particle in which, or with every
+    particle if they're in which themselves.
+    """
+    n = len(pos)
+    which = np.asarray(which, dtype=np.int64)
+    if n == 0 or len(which) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    large = radii > LARGE_RADIUS_RATIO * np.median(radii)
+    small = np.flatnonzero(~large)
+    in_which = np.zeros(n, dtype=bool)
+    in_which[which] = True
+
+    # which, numbered among the small particles
+    small_which = np.flatnonzero(in_which[small])
+    grid = SpatialGrid(2 * radii[small].max(initial=0) + MIN_DIST + margin,
+                       periodic=periodic)
+    i, j = grid.neighbor_pairs(pos[small], small_which)
+    if not large.any():
+        return small[i], small[j]
+
+    keys = []
+    for k in np.flatnonzero(large).tolist():
+        others = np.arange(n) if in_which[k] else which
+        others = others[others != k]
+        diff = separation(pos, np.full(len(others), k), others, periodic)
+        reach = radii[k] + radii[others] + MIN_DIST + margin
+        near = others[np.einsum('ij,ij->i', diff, diff) <= reach ** 2]
+        keys.append(np.minimum(near, k) * n + np.maximum(near, k))
+
+    # pairs of two large particles can be found from both of them
+    keys = np.unique(np.concatenate(keys))
+
+    return (np.concatenate([small[i], keys // n]).astype(np.int64),
+            np.concatenate([small[j], keys % n]).astype(np.int64))
+
+
+def find_colliding_pairs(pos: np.ndarray, vel: np.ndarray, radii: np.ndarray,
+                         i: np.ndarray, j: np.ndarray,
+                         periodic: bool = False) -> Tuple[np.ndarray,
+                                                          np.ndarray]:
+    """Filter candidate pairs (i, j) down to the pairs that are colliding.
+
+    Same rule as Particle._check_particle_collisions: the gap between the two
+    particles is at most MIN_DIST, and they are moving towards each other.
+
+    Pairs are returned sorted by (i, j), so the velocities from collide_pairs
+    don't depend on the order the candidate pairs were found in.
+    """
+    # compare squared distances, to avoid taking square roots for every pair
+    diff = separation(pos, i, j, periodic)
+    reach = radii[i] + radii[j] + MIN_DIST
+    close = np.einsum('ij,ij->i', diff, diff) <= reach ** 2
+    i, j, diff = i[close], j[close], diff[close]
+
+    # -diff is pos[j] - pos[i]
+    moving_toward = np.einsum('ij,ij->i', -diff, vel[i] - vel[j]) > 0
+    i, j = i[moving_toward], j[moving_toward]
+
+    order = np.argsort(i * len(pos) + j)
+
+    return i[order], j[order]
+
+
+def collide_pairs(pos: np.ndarray, vel: np.ndarray, masses: np.ndarray,
+                  i: np.ndarray, j: np.ndarray, periodic: bool = False) -> int:
+    """Adjust velocities in place for every colliding pair (i, j), assuming
+    perfect elastic collisions, as in Particle._collide_particles.
+
+    Pairs are collided in rounds, where no particle is in more than one pair
+    of a round, and a pair in an earlier position in (i, j) goes first. After
+    each round, pairs that are no longer moving towards each other are
+    dropped. Like colliding the pairs one at a time, this conserves energy
+    when a particle touches several others at once, which summing all of its
+    impulses at the same time doesn't.
+
+    Returns the number of collisions resolved.
+    """
+    n = len(vel)
+    n_collisions = 0
+    while len(i) > 0:
+        # a pair is in this round if it's the first remaining pair for both
+        # of its particles
+        first = np.full(n, len(i))
+        order = np.arange(len(i))
+        np.minimum.at(first, i, order)
+        np.minimum.at(first, j, order)
+        in_round = (first[i] == order) & (first[j] == order)
+
+        _collide_disjoint_pairs(pos, vel, masses, i[in_round], j[in_round],
+                                periodic)
+        n_collisions += int(np.count_nonzero(in_round))
+
+        i, j = i[~in_round], j[~in_round]
+        moving_toward = np.einsum('ij,ij->i', -separation(pos, i, j, periodic),
+                                  vel[i] - vel[j]) > 0
+        i, j = i[moving_toward], j[moving_toward]
+
+    return n_collisions
+
+
+def _collide_disjoint_pairs(pos: np.ndarray, vel: np.ndarray,
+                            masses: np.ndarray, i: np.ndarray,
+                            j: np.ndarray, periodic: bool = False) -> None:
+    """Adjust velocities in place for colliding pairs (i, j), where no particle
+    is in more than one pair.
+    """
+    c1 = separation(pos, i, j, periodic)
+    dv = vel[i] - vel[j]
+    b = np.einsum('ij,ij->i', dv, c1) / np.einsum('ij,ij->i', c1, c1)
+    total_mass = masses[i] + masses[j]
+
+    a1 = (2 * masses[j]) / total_mass
+    a2 = (2 * masses[i]) / total_mass
+
+    vel[i] -= (a1 * b)[:, None] * c1
+    vel[j] += (a2 * b)[:, None] * c1
+
+
+def _bounce(vel: np.ndarray, hit: np.ndarray, axis: int) -> None:
+    """Bounce velocities of particles flagged in hit off a wall, in place.
+
+    Particles moving perpendicular to the wall (zero velocity along axis)
+    have their velocity reversed, everything else is rotated by a right angle,
+    matching Particle._check_wall_collision.
+    """
+    perpendicular = hit & (vel[:, axis] == 0)
+    rotate = hit & ~perpendicular
+
+    vel[perpendicular] = -vel[perpendicular]
+    vel[rotate] = np.stack([vel[rotate, 1], -vel[rotate, 0]], axis=1)
+
+
+def find_wall_hits(pos: np.ndarray,
+                   radii: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns boolean arrays (hit_x, hit_y) flagging particles touching the
+    left or right wall, and particles touching only the top or bottom wall.
+    """
+    left = pos[:, 0] - (X_LIMITS[0] + MIN_DIST + radii)
+    right = (X_LIMITS[1] - MIN_DIST - radii) - pos[:, 0]
+    top = pos[:, 1] - (Y_LIMITS[0] + MIN_DIST + radii)
+    bottom = (Y_LIMITS[1] - MIN_DIST - radii) - pos[:, 1]
+
+    hit_x = (left <= 0) | (right <= 0)
+    hit_y = ~hit_x & ((top <= 0) | (bottom <= 0))
+
+    return hit_x, hit_y
+
+
+def bounce_off_walls(vel: np.ndarray, hit_x: np.ndarray,
+                     hit_y: np.ndarray) -> None:
+    """Bounce velocities of particles flagged by find_wall_hits off the walls
+    they're touching, in place.
+    """
+    _bounce(vel, hit_x, 1)
+    _bounce(vel, hit_y, 0)
+
+
+def get_wall_impulse(pos: np.ndarray, dv: np.ndarray, masses: np.ndarray,
+                     hit_x: np.ndarray) -> float:
+    """Returns the total impulse walls gave particles at positions pos,
+    changing their velocities by dv, where particles bounced off the left or
+    right wall if hit_x is set and off the top or bottom wall otherwise.
+
+    Only the component normal to each wall counts, taken as positive into the
+    container, as that is what pushes on the wall. A bounce that turns a
+    particle further into the wall counts against it, until the particle
+    bounces again.
+    """
+    rows = np.arange(len(pos))
+    axis = np.where(hit_x, 0, 1)
+    center = np.where(hit_x, (X_LIMITS[0] + X_LIMITS[1]) / 2,
+                      (Y_LIMITS[0] + Y_LIMITS[1]) / 2)
+    inward = np.sign(center - pos[rows, axis])
+
+    return float(np.dot(masses, inward * dv[rows, axis]))
+
+
+def check_wall_collisions(pos: np.ndarray, vel: np.ndarray,
+                          radii: np.ndarray) -> int:
+    """Bounce particles that are touching a container wall, in place, and
+    return the number of particles bounced.
+    """
+    hit_x, hit_y = find_wall_hits(pos, radii)
+    bounce_off_walls(vel, hit_x, hit_y)
+
+    return int(np.count_nonzero(hit_x) + np.count_nonzero(hit_y))
+
+
+def check_go_past_wall(pos: np.ndarray, vel: np.ndarray,
+                       radii: np.ndarray, dt: float = 1.0) -> int:
+    """Bounce particles whose velocity would carry them past a wall in the
+    next frame, dt units of time from now, in place, as in
+    Particle._check_go_past_wall, and return the number of particles bounced.
+    """
+    return check_wall_collisions(pos + vel * dt, vel, radii)
@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import numpy as np
-import random
+import ParticleArrays
+import Placement
+from EventDrivenEngine import EventDrivenEngine
+from NeighborList import NeighborList
+from Observables import Observables
 from Particle import Particle
+from Profiler import Profiler
 from typing import List, Tuple
 
 # Minimum and maximum speeds, masses and radii for simulated particles
@@ -21,59 +26,517 @@ MAX_POS = 525 - 25
 # default color of blue for particles
 COLOR = (0, 0, 255)
 
-# Maximum number of particles to simulate
+# How much red is added to a particle's color per unit of its speed, up to 255
+RED_PER_SPEED = 30
+
+# Default maximum number of particles to simulate
 MAX_PARTICLES = 30
 
+# Available simulation engines
+# object: every particle is a Particle object, updated one at a time
+# array: particles are stored as contiguous arrays, and updated all at once
+# event: particles are stored as contiguous arrays, and an EventDrivenEngine
+# jumps from collision to collision in between frames
+ENGINES = ('object', 'array', 'event')
+
+# Ways of finding pairs of particles that could be colliding
+# grid: only pair up particles in neighboring cells of a SpatialGrid
+# all_pairs: pair up every particle with every other particle
+BROAD_PHASES = ('grid', 'all_pairs')
+
+# What happens at the edges of the container
+# walls: particles bounce off the container walls
+# periodic: particles leaving the container come back in from the opposite
+# side, and collide with particles across the edges
+BOUNDARIES = ('walls', 'periodic')
+
 ################################################################################
 
 class ParticleManager:
     """Stores simulated particles, and controls adding/removing particles from
     the screen.
+
+    With the 'object' engine, particles are kept as Particle objects in
+    self.particles. With the 'array' engine, positions, velocities, radii and
+    masses of all particles are kept in the contiguous arrays self.pos,
+    self.vel, self.radii and self.masses instead. The 'event' engine keeps the
+    same arrays, and copies them to and from an EventDrivenEngine.
+
+    All random numbers are drawn from rng, a numpy Generator, so runs with
+    identically seeded generators are reproducible. A fresh, randomly seeded
+    generator is used if rng is None.
+
+    If neighbor_skin is given, pairs of nearby particles are cached in a
+    NeighborList with that skin across frames, instead of being searched for
+    again every frame.
+
+    add_particle won't add particles beyond max_particles.
+
+    Each phase of update_particles is timed, and pairs tested, collisions and
+    wall bounces are counted, by profiler, if it's enabled.
+
+    If observables is given, its kinetic energy, temperature, momentum, wall
+    pressure and speed histogram are kept up to date every frame, from only
+    the particles that collided or bounced off a wall.
+
+    With boundary 'periodic', which only the array engine supports, there
+    are no walls, and the container wraps around instead, so particles don't
+    feel the edges of the container at all.
     """
-    def __init__(self):
+    def __init__(self, engine: str = 'object', broad_phase: str = 'grid',
+                 neighbor_skin: float = None,
+                 rng: np.random.Generator = None,
+                 max_particles: int = MAX_PARTICLES,
+                 profiler: Profiler = None,
+                 observables: Observables = None, boundary: str = 'walls'):
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, not {engine!r}")
+        if broad_phase not in BROAD_PHASES:
+            raise ValueError(
+                f"broad_phase must be one of {BROAD_PHASES}, not {broad_phase!r}"
+            )
+        if boundary not in BOUNDARIES:
+            raise ValueError(
+                f"boundary must be one of {BOUNDARIES}, not {boundary!r}"
+            )
+        if boundary == 'periodic' and engine != 'array':
+            raise ValueError("only the array engine supports periodic "
+                             "boundaries")
+
+        self.engine = engine
+        self.broad_phase = broad_phase
+        self.boundary = boundary
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.max_particles = max_particles
+        self.profiler = profiler if profiler is not None else \
+            Profiler(enabled=False)
+        self.observables = observables
         self.particles = []
 
+        self._event_engine = None
+        # index of each Particle in self.particles, by id, once needed
+        self._particle_indices = None
+        self._observables_stale = True
+
+        self.neighbor_list = None
+        if neighbor_skin is not None:
+            self.neighbor_list = NeighborList(neighbor_skin,
+                                              boundary == 'periodic')
+
+        self.pos = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.radii = np.zeros(0)
+        self.masses = np.zeros(0)
+
     def simulate_n_particles(self, n: int) -> None:
         """Initialize n particles of random velocities, positions, sizes and
         mass, storing the particles in self.particles.
         """
+        if self.engine != 'object':
+            rand_vel = self.rng.uniform(low = -MAX_SPEED, high = MAX_SPEED,
+                                        size = (n, 2))
+            rand_pos = self.rng.uniform(low = MIN_POS, high = MAX_POS,
+                                        size = (n, 2))
+            rand_radius = self.rng.integers(MIN_RADIUS, MAX_RADIUS + 1, size = n)
+            rand_mass = self.rng.integers(MIN_MASS, MAX_MASS + 1, size = n)
+
+            self._append_arrays(rand_pos, rand_vel, rand_radius, rand_mass)
+            return
+
         for _ in range(n):
-            rand_vel = np.random.uniform(low = -MAX_SPEED, high = MAX_SPEED,
-                                         size = (2,))
-            rand_pos = np.random.uniform(low = MIN_POS, high = MAX_POS,
-                                         size = (2,))
-            rand_radius = random.randint(MIN_RADIUS, MAX_RADIUS)
-            rand_mass = random.randint(MIN_MASS, MAX_MASS)
+            rand_vel = self.rng.uniform(low = -MAX_SPEED, high = MAX_SPEED,
+                                        size = (2,))
+            rand_pos = self.rng.uniform(low = MIN_POS, high = MAX_POS,
+                                        size = (2,))
+            rand_radius = int(self.rng.integers(MIN_RADIUS, MAX_RADIUS + 1))
+            rand_mass = int(self.rng.integers(MIN_MASS, MAX_MASS + 1))
 
             rand_particle = Particle(rand_vel, rand_pos, rand_radius, rand_mass,
                                      COLOR)
 
             self.particles.append(rand_particle)
 
-    def update_particles(self) -> None:
+        self._particles_changed()
+
+    def place_particles(self, n: int, packing_fraction: float = None,
+                        temperature: float = None) -> None:
+        """Initialize n particles of random sizes and masses as in
+        simulate_n_particles, but placed so no two particles overlap, nor
+        overlap any particles already stored, with velocities drawn from the
+        Maxwell-Boltzmann distribution at temperature, with no overall
+        momentum.
+
+        If packing_fraction is given, the radii are scaled together so the new
+        particles cover that fraction of the container. temperature defaults
+        to the average kinetic energy of particles from simulate_n_particles.
+        Raises a ValueError if the particles don't fit.
+        """
+        radii = self.rng.integers(MIN_RADIUS, MAX_RADIUS + 1, size=n)
+        masses = self.rng.integers(MIN_MASS, MAX_MASS + 1, size=n)
+        if packing_fraction is not None:
+            radii = Placement.scale_radii(radii, packing_fraction)
+        if temperature is None:
+            # mean of m * vx ** 2 for vx uniform in (-MAX_SPEED, MAX_SPEED)
+            temperature = (MIN_MASS + MAX_MASS) / 2 * MAX_SPEED ** 2 / 3
+
+        old_pos, _, old_radii, _ = self.get_arrays()
+        pos = Placement.place_disks(radii, self.rng, old_pos, old_radii)
+        vel = Placement.thermal_velocities(masses, temperature, self.rng)
+
+        if self.engine != 'object':
+            self._append_arrays(pos, vel, radii, masses)
+            return
+
+        for p, v, r, m in zip(pos, vel, radii.tolist(), masses.tolist()):
+            self.particles.append(Particle(v, p, r, m, COLOR))
+
+        self._particles_changed()
+
+    def set_particles(self, pos: np.ndarray, vel: np.ndarray,
+                      radii: np.ndarray, masses: np.ndarray) -> None:
+        """Replace all stored particles with the particles given as arrays,
+        e.g. so different engines can start from the same initial conditions.
+        """
+        self.clear()
+
+        if self.engine != 'object':
+            self._append_arrays(pos, vel, radii, masses)
+            return
+
+        for p, v, r, m in zip(pos, vel, radii, masses):
+            self.particles.append(Particle(np.array(v, dtype=float),
+                                           np.array(p, dtype=float), r, m,
+                                           COLOR))
+
+        self._particles_changed()
+
+    def update_particles(self, dt: float = 1.0) -> None:
         """Update velocities and positions for all particles in self.particles
-        in a single frame, based on particle velocities and collisions.
+        in a single frame, dt units of time long, based on particle velocities
+        and collisions.
         """
-        for p in self.particles:
-            p.update_position([par for par in self.particles if par != p])
+        observables = self.observables
+        if observables is not None and self._observables_stale:
+            _, vel, _, masses = self.get_arrays()
+            observables.resync(vel, masses)
+            self._observables_stale = False
+
+        if self.engine == 'array':
+            self._update_arrays(dt)
+        elif self.engine == 'event':
+            self._update_events(dt)
+        else:
+            self._update_objects(dt)
+
+        if observables is not None:
+            observables.end_step(dt)
+
+    def _update_objects(self, dt: float = 1.0) -> None:
+        """Advance every Particle object by a single frame, dt units of time
+        long.
+        """
+        # particles whose velocities changed, if the observables need them
+        touched = [] if self.observables is not None else None
+
+        if self.broad_phase == 'all_pairs' and self.neighbor_list is None:
+            with self.profiler.timer('particles'):
+                impulse = 0.0
+                for p in self.particles:
+                    impulse += p.update_position([par for par in self.particles
+                                                  if par != p], dt, touched)
+            self._observe_objects(impulse, touched)
+            return
+
+        # particles are moved one at a time, so a particle may be checked
+        # against others that have already moved this frame
+        # pad the search by the furthest a particle can move in a frame to
+        # account for this
+        with self.profiler.timer('broad_phase'):
+            pos = np.array([p.pos for p in self.particles]).reshape(-1, 2)
+            vel = np.array([p.vel for p in self.particles]).reshape(-1, 2)
+            radii = np.array([p.r for p in self.particles], dtype=float)
+            margin = 2 * dt * np.abs(vel).sum(axis=1).max(initial=0)
+
+            # visit pairs in (i, j) order, so each particle checks its
+            # neighbors in the same order as it would without the grid
+            i, j = self._get_candidate_pairs(pos, radii, margin)
+            order = np.lexsort((j, i))
+
+            neighbors = [[] for _ in self.particles]
+            for i, j in zip(i[order].tolist(), j[order].tolist()):
+                neighbors[i].append(self.particles[j])
+                neighbors[j].append(self.particles[i])
+        self.profiler.count('candidate_pairs', len(order))
+
+        # collisions, wall bounces and moving happen particle by particle, so
+        # they're timed together
+        with self.profiler.timer('particles'):
+            impulse = 0.0
+            for p, others in zip(self.particles, neighbors):
+                impulse += p.update_position(others, dt, touched)
+        self._observe_objects(impulse, touched)
+
+    def _observe_objects(self, wall_impulse: float,
+                         touched: List[Particle]) -> None:
+        """Update the observables, if any, after a frame of the object engine
+        in which walls gave particles wall_impulse in total, and the particles
+        in touched collided or bounced off a wall.
+
+        Walls don't change the speed of particles, so any change in kinetic
+        energy is put down to collisions.
+        """
+        if self.observables is None:
+            return
+
+        with self.profiler.timer('observables'):
+            if self._particle_indices is None:
+                self._particle_indices = {id(p): k for k, p in
+                                          enumerate(self.particles)}
+            indices = np.array([self._particle_indices[id(p)]
+                                for p in touched], dtype=np.int64)
+
+            # only the velocities of touched particles are read
+            vel = np.empty((len(self.particles), 2))
+            vel[indices] = np.array([p.vel for p in touched],
+                                    dtype=float).reshape(-1, 2)
+
+            self.observables.add_wall_impulse(wall_impulse)
+            self.observables.add_collisions(vel, indices)
+
+    def _update_arrays(self, dt: float = 1.0) -> None:
+        """Advance every particle stored in the arrays by a single frame, dt
+        units of time long, doing the same steps as Particle.update_position
+        for all particles at once.
+        """
+        profiler = self.profiler
+        periodic = self.boundary == 'periodic'
+
+        with profiler.timer('broad_phase'):
+            i, j = self._get_candidate_pairs(self.pos, self.radii)
+        profiler.count('candidate_pairs', len(i))
+
+        with profiler.timer('narrow_phase'):
+            i, j = ParticleArrays.find_colliding_pairs(self.pos, self.vel,
+                                                       self.radii, i, j,
+                                                       periodic)
+
+        with profiler.timer('collisions'):
+            n_collisions = ParticleArrays.collide_pairs(self.pos, self.vel,
+                                                        self.masses, i, j,
+                                                        periodic)
+        profiler.count('collisions', n_collisions)
+
+        if self.observables is not None:
+            with profiler.timer('observables'):
+                self.observables.add_collisions(self.vel,
+                                                np.concatenate([i, j]))
+
+        if not periodic:
+            with profiler.timer('walls'):
+                # bounce off walls being touched, then off walls that would be
+                # passed in the next frame, as in Particle.update_position
+                n_bounces = self._bounce_off_walls(self.pos)
+                n_bounces += self._bounce_off_walls(self.pos + self.vel * dt)
+            profiler.count('wall_bounces', n_bounces)
+
+        # time increment of dt units
+        with profiler.timer('integrate'):
+            self.pos += self.vel * dt
+            if periodic:
+                ParticleArrays.wrap_positions(self.pos)
+
+    def _bounce_off_walls(self, pos: np.ndarray) -> int:
+        """Bounce particles at positions pos that are touching a wall, as in
+        ParticleArrays.check_wall_collisions, passing the impulse on to the
+        observables, if any, and return the number of particles bounced.
+        """
+        hit_x, hit_y = ParticleArrays.find_wall_hits(pos, self.radii)
+        if self.observables is None:
+            ParticleArrays.bounce_off_walls(self.vel, hit_x, hit_y)
+            return int(np.count_nonzero(hit_x) + np.count_nonzero(hit_y))
+
+        bounced = np.flatnonzero(hit_x | hit_y)
+        old_vel = self.vel[bounced]
+        ParticleArrays.bounce_off_walls(self.vel, hit_x, hit_y)
+
+        self.observables.add_wall_impulse(ParticleArrays.get_wall_impulse(
+            pos[bounced], self.vel[bounced] - old_vel, self.masses[bounced],
+            hit_x[bounced]
+        ))
+        self.observables.update(self.vel, bounced)
+
+        return len(bounced)
+
+    def _update_events(self, dt: float = 1.0) -> None:
+        """Advance the event-driven engine by a single frame, dt units of time
+        long, and copy the new positions and velocities back into the arrays.
+        """
+        if self._event_engine is None:
+            self._event_engine = EventDrivenEngine(self.pos, self.vel,
+                                                   self.radii, self.masses)
+
+        engine = self._event_engine
+        if self.observables is not None and engine.touched is None:
+            engine.touched = []
+        n_collisions, n_bounces = engine.n_collisions, engine.n_wall_bounces
+        wall_impulse = engine.wall_impulse
+
+        with self.profiler.timer('events'):
+            self.pos, self.vel = engine.state_at(engine.time + dt)
+
+        if self.observables is not None:
+            # walls only flip a velocity component, so any change in kinetic
+            # energy is down to collisions
+            with self.profiler.timer('observables'):
+                touched, engine.touched = engine.touched, []
+                self.observables.add_wall_impulse(engine.wall_impulse -
+                                                  wall_impulse)
+                self.observables.add_collisions(
+                    self.vel, np.array(touched, dtype=np.int64)
+                )
+
+        self.profiler.count('collisions', engine.n_collisions - n_collisions)
+        self.profiler.count('wall_bounces', engine.n_wall_bounces - n_bounces)
+
+    def _get_candidate_pairs(self, pos: np.ndarray, radii: np.ndarray,
+                             margin: float = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Return index arrays (i, j), with i < j, for pairs of particles that
+        could be colliding, allowing for particles to move by up to margin
+        before the pairs are checked.
+        """
+        if self.neighbor_list is not None:
+            return self.neighbor_list.get_pairs(pos, radii, margin)
+
+        if self.broad_phase == 'grid':
+            return ParticleArrays.grid_pairs(pos, radii, margin,
+                                             self.boundary == 'periodic')
+
+        return ParticleArrays.all_pairs(len(pos))
+
+    def _particles_changed(self) -> None:
+        """Drop anything cached about the particles, after particles have
+        been added or removed.
+        """
+        if self.neighbor_list is not None:
+            self.neighbor_list.invalidate()
+
+        self._event_engine = None
+        self._particle_indices = None
+        self._observables_stale = True
+
+    def get_neighbor_rebuilds(self) -> int:
+        """Returns how many times the neighbor list has been rebuilt, or 0 if
+        no neighbor list is used.
+        """
+        if self.neighbor_list is None:
+            return 0
+
+        return self.neighbor_list.rebuild_count
+
+    def get_event_engine(self) -> EventDrivenEngine:
+        """Returns the event-driven engine simulating the particles, or None
+        if it hasn't taken a step since the particles last changed.
+        """
+        return self._event_engine
+
+    def set_event_engine(self, engine: EventDrivenEngine) -> None:
+        """Carry on simulating the particles with engine, e.g. restored from a
+        checkpoint with EventDrivenEngine.from_state, which must simulate the
+        same particles as are stored.
+        """
+        self._event_engine = engine
+        self.pos, self.vel = engine.get_positions(), engine.vel
+
+    def _append_arrays(self, pos: np.ndarray, vel: np.ndarray,
+                       radii: np.ndarray, masses: np.ndarray) -> None:
+        """Append particles, given as arrays, to the end of the stored arrays.
+        """
+        self.pos = np.concatenate([self.pos, np.asarray(pos, dtype=float)])
+        self.vel = np.concatenate([self.vel, np.asarray(vel, dtype=float)])
+        self.radii = np.concatenate([self.radii,
+                                     np.asarray(radii, dtype=float)])
+        self.masses = np.concatenate([self.masses,
+                                      np.asarray(masses, dtype=float)])
+
+        self._particles_changed()
 
     def clear(self) -> None:
         """Removes all particles stored in the ParticleManager.
         """
         self.particles = []
 
+        self.pos = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.radii = np.zeros(0)
+        self.masses = np.zeros(0)
+
+        self._particles_changed()
+
     def get_num_particles(self) -> int:
         """Returns number of particles stored by ParticleManager.
         """
+        if self.engine != 'object':
+            return len(self.pos)
+
         return len(self.particles)
 
+    def get_positions(self) -> np.ndarray:
+        """Returns an (N, 2) array of the positions of all particles.
+        """
+        if self.engine != 'object':
+            return self.pos.copy()
+
+        return np.array([p.pos for p in self.particles],
+                        dtype=float).reshape(-1, 2)
+
+    def get_velocities(self) -> np.ndarray:
+        """Returns an (N, 2) array of the velocities of all particles.
+        """
+        if self.engine != 'object':
+            return self.vel.copy()
+
+        return np.array([p.vel for p in self.particles],
+                        dtype=float).reshape(-1, 2)
+
+    def get_arrays(self) -> Tuple[np.ndarray, ...]:
+        """Returns copies of the positions, velocities, radii and masses of all
+        particles, which can be passed to set_particles.
+        """
+        if self.engine != 'object':
+            return (self.pos.copy(), self.vel.copy(), self.radii.copy(),
+                    self.masses.copy())
+
+        radii = np.array([p.r for p in self.particles], dtype=float)
+        masses = np.array([p.mass for p in self.particles], dtype=float)
+
+        return self.get_positions(), self.get_velocities(), radii, masses
+
+    def get_render_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns arrays of the positions, radii and speeds of all particles,
+        for drawing every particle at once.
+        """
+        if self.engine != 'object':
+            return self.pos, self.radii, np.linalg.norm(self.vel, axis=1)
+
+        pos, vel, radii, _ = self.get_arrays()
+
+        return pos, radii, np.linalg.norm(vel, axis=1)
+
     def get_updated_particle_info(self) -> List[Tuple]:
         """Return a list of tuples, where each tuple contains the new color
         (scaled by the particle's speed), position and radius for a particle.
         """
+        if self.engine != 'object':
+            speeds = np.linalg.norm(self.vel, axis=1)
+            reds = np.clip(RED_PER_SPEED * speeds, 0, 255)
+
+            return [((red, 0, 255), (x, y), r) for red, (x, y), r in
+                    zip(reds.tolist(), self.pos.tolist(), self.radii.tolist())]
+
         particle_tuples = []
         for p in self.particles:
-            new_col = (np.clip(30 * np.linalg.norm(p.vel), 0, 255), 0, 255)
+            red = np.clip(RED_PER_SPEED * np.linalg.norm(p.vel), 0, 255)
+            new_col = (red, 0, 255)
             new_pos = p.get_position()
             r = p.r
 
@@ -85,9 +548,17 @@ class ParticleManager:
         """Remove a particle from self.particles, and do nothing if
         self.particles is already empty.
         """
-        if len(self.particles) > 0:
+        if self.engine != 'object':
+            self.pos = self.pos[:-1]
+            self.vel = self.vel[:-1]
+            self.radii = self.radii[:-1]
+            self.masses = self.masses[:-1]
+
+        elif len(self.particles) > 0:
             self.particles.pop()
 
+        self._particles_changed()
+
     def add_particle(self, speed: int, radius: int,
                      mass: int) -> None:
         """Adds a new particle for simulation, with speed, radius and mass
@@ -96,16 +567,30 @@ class ParticleManager:
         
         Preconditions: speed, radius and mass are all between 1 to 5, inclusive.
         """
-        if len(self.particles) == MAX_PARTICLES:
+        if self.get_num_particles() >= self.max_particles:
             return  # don't allow number of simulated particles to exceed max
 
-        new_vel = np.array([random.choice([1, -1]) * MIN_SPEED + 2 * (speed - 1),
-                            random.choice([1, -1]) * MIN_SPEED + 2 * (speed - 1)])
-        new_pos = np.random.uniform(low=MIN_POS, high=MAX_POS,
-                                     size=(2,))
+        new_vel = np.array([self.rng.choice([1, -1]) * MIN_SPEED + 2 * (speed - 1),
+                            self.rng.choice([1, -1]) * MIN_SPEED + 2 * (speed - 1)])
         new_radius = MIN_RADIUS + 2 * (radius - 1)
         new_mass = MIN_MASS + 2 * (mass - 1)
 
+        # drop the particle somewhere it doesn't overlap any other particle,
+        # or anywhere if there's no such place
+        old_pos, _, old_radii, _ = self.get_arrays()
+        try:
+            new_pos = Placement.place_disks([new_radius], self.rng, old_pos,
+                                            old_radii)[0]
+        except ValueError:
+            new_pos = self.rng.uniform(low=MIN_POS, high=MAX_POS,
+                                       size=(2,))
+
+        if self.engine != 'object':
+            self._append_arrays(new_pos[None, :], new_vel[None, :],
+                                [new_radius], [new_mass])
+            return
+
         p = Particle(new_vel, new_pos, new_radius, new_mass, COLOR)
 
         self.particles.append(p)
+        self._particles_changed()
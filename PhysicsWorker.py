@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run the particle simulation in a separate process, so a slow physics step
+never holds up handling input or drawing.
+
+The worker process owns the ParticleManager. After every step it writes the
+positions, radii and speeds of all particles into the back half of a
+double-buffered shared memory block, then swaps the halves. The GUI reads
+the front half in place, without copying, and sends commands (e.g. adding a
+particle) to the worker through a queue.
+"""
+import multiprocessing as mp
+import queue
+import time
+import numpy as np
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from ParticleManager import ParticleManager
+from Simulation import Simulation
+from typing import Iterator, Tuple
+
+# Layout of the header at the start of the shared memory block, as int64s:
+# which buffer is the front one, steps taken so far, then the number of
+# particles in each buffer
+FRONT = 0
+STEPS = 1
+COUNTS = 2
+HEADER_SIZE = 4
+
+# Columns of each buffer: x, y, radius and speed of every particle
+COLUMNS = 4
+
+# Longest time the worker sleeps while waiting for the next step to be due
+MAX_SLEEP = 0.005
+
+################################################################################
+
+class PhysicsWorker:
+    """Simulates particles in a worker process, and shares their latest
+    state with the process that created it.
+
+    Commands are sent with send, as the same action names the GUI's buttons
+    use: 'CLEAR', 'RANDOM' (with the number of particles), 'ADD' (with speed,
+    size and mass) and 'REMOVE'. The latest particles are read with read.
+
+    The worker advances the simulation in real time, by time_per_second units
+    of simulated time per second, in steps of dt, or as fast as it can if
+    steps take longer than that. engine and boundary are passed on to the
+    worker's ParticleManager.
+    """
+    def __init__(self, engine: str = 'array',
+                 max_particles: int = 1000, dt: float = 1.0,
+                 time_per_second: float = 60, seed: int = None,
+                 boundary: str = 'walls'):
+        self.max_particles = max_particles
+
+        n_bytes = 8 * (HEADER_SIZE + 2 * max_particles * COLUMNS)
+        self._shm = shared_memory.SharedMemory(create=True, size=n_bytes)
+        self._header, self._buffers = _get_arrays(self._shm, max_particles)
+        self._header[:] = 0
+
+        # held while reading the front buffer, so it isn't swapped mid-read
+        self._lock = mp.Lock()
+        self._commands = mp.Queue()
+
+        self._process = mp.Process(
+            target=_run_worker,
+            args=(self._shm.name, self._lock, self._commands, engine,
+                  max_particles, dt, time_per_second, seed, boundary),
+            daemon=True
+        )
+        self._process.start()
+
+    def send(self, action: str, *args) -> None:
+        """Ask the worker to do action with args, as soon as it can.
+        """
+        self._commands.put((action, args))
+
+    @contextmanager
+    def read(self) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Give views of the positions, radii and speeds of all particles as
+        of the latest completed step, for use inside a with block.
+
+        The worker can't publish new steps until the with block ends, so the
+        arrays must not be used after it.
+        """
+        with self._lock:
+            front = int(self._header[FRONT])
+            n = int(self._header[COUNTS + front])
+            data = self._buffers[front, :n]
+
+            yield data[:, :2], data[:, 2], data[:, 3]
+
+    def get_steps(self) -> int:
+        """Returns the number of steps the worker has taken so far.
+        """
+        return int(self._header[STEPS])
+
+    def is_alive(self) -> bool:
+        return self._process.is_alive()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Stop the worker process, and free the shared memory.
+        """
+        if self._process.is_alive():
+            self.send('STOP')
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+
+        # drop views of the shared memory before closing it
+        self._header = self._buffers = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _get_arrays(shm: shared_memory.SharedMemory,
+                max_particles: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the header and the (2, max_particles, COLUMNS) buffers of a
+    shared memory block, as arrays viewing the block.
+    """
+    header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=shm.buf)
+    buffers = np.ndarray((2, max_particles, COLUMNS), dtype=np.float64,
+                         buffer=shm.buf, offset=header.nbytes)
+
+    return header, buffers
+
+
+def _apply_command(manager: ParticleManager, action: str, args: Tuple) -> None:
+    """Do what the GUI's button for action does to manager.
+    """
+    if action == 'CLEAR':
+        manager.clear()
+    elif action == 'RANDOM':
+        manager.clear()
+        manager.simulate_n_particles(*args)
+    elif action == 'ADD':
+        manager.add_particle(*args)
+    elif action == 'REMOVE':
+        manager.remove_particle()
+    else:
+        raise ValueError(f"unknown command {action!r}")
+
+
+def _run_worker(shm_name: str, lock: mp.Lock, commands: mp.Queue,
+                engine: str, max_particles: int, dt: float,
+                time_per_second: float, seed: int, boundary: str) -> None:
+    """Main loop of the worker process: apply commands, step the simulation
+    in real time, and publish the particles after every step.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    header, buffers = _get_arrays(shm, max_particles)
+
+    manager = ParticleManager(engine, rng=np.random.default_rng(seed),
+                              max_particles=max_particles, boundary=boundary)
+    # take at most one step between checking for commands, so commands are
+    # applied promptly, and publish every step
+    # if steps take longer than they simulate, the simulation runs as fast as
+    # it can rather than catching up
+    simulation = Simulation(manager, dt, max_catch_up=dt)
+
+    try:
+        last = time.perf_counter()
+        changed = True  # publish the particles even if no step is taken
+        while True:
+            while True:
+                try:
+                    action, args = commands.get_nowait()
+                except queue.Empty:
+                    break
+
+                if action == 'STOP':
+                    return
+                _apply_command(manager, action, args)
+                changed = True
+
+            now = time.perf_counter()
+            n_steps = simulation.advance((now - last) * time_per_second)
+            last = now
+
+            if n_steps > 0 or changed:
+                _publish(manager, header, buffers, lock, n_steps)
+                changed = False
+            else:
+                # wait for the next step to be due
+                time.sleep(min(MAX_SLEEP, dt / time_per_second))
+    finally:
+        header = buffers = None
+        shm.close()
+
+
+def _publish(manager: ParticleManager, header: np.ndarray,
+             buffers: np.ndarray, lock: mp.Lock, n_steps: int) -> None:
+    """Write the particles into the back buffer, then make it the front one.
+    """
+    back = 1 - int(header[FRONT])
+    pos, radii, speeds = manager.get_render_arrays()
+    n = len(pos)
+
+    buffers[back, :n, :2] = pos
+    buffers[back, :n, 2] = radii
+    buffers[back, :n, 3] = speeds
+    header[COUNTS + back] = n
+
+    with lock:
+        header[FRONT] = back
+        header[STEPS] += n_steps
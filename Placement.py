@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Place particles in the container without any of them overlapping, and
+draw their velocities for a given temperature.
+
+Particles are placed one at a time at random positions, largest first,
+rejecting positions too close to particles already placed, which are found
+through a grid of cells. If some particle can't be placed, or the particles
+are too dense for random placement to stand a chance, every particle is
+instead put on a hexagonal lattice, with a band of lattice for each class of
+similar radii, spaced for the particles in it.
+
+Particles are kept MIN_DIST apart, so none starts out colliding, unless
+they're too dense for that to fit, in which case the lattice is squeezed
+closer, but never so close that particles overlap.
+
+Temperatures are in units where Boltzmann's constant is 1, so in two
+dimensions a temperature T means kinetic energy T per particle, less the
+motion of the center of mass.
+"""
+import math
+import numpy as np
+from Particle import X_LIMITS, Y_LIMITS, MIN_DIST
+from typing import Dict, List, Tuple
+
+# Random positions tried for a particle before giving up on placing it, plus
+# one more for every ATTEMPT_PARTICLES particles being placed, as the last of
+# many particles have little room left to land in
+MAX_ATTEMPTS = 100
+ATTEMPT_PARTICLES = 100
+
+# Random placement isn't tried when the particles, counting MIN_DIST around
+# each, cover more than this fraction of the container, as random sequential
+# addition jams at about 0.55
+RANDOM_LIMIT = 0.5
+
+# Numbers of classes of similar radii, each getting a band of lattice, that
+# place_on_lattice tries splitting particles into. Fewer classes mix sizes
+# better, but waste more room on small particles spaced for larger ones
+LATTICE_CLASSES = (1, 2, 4, 8, 16)
+
+# Halvings of the gap left between particles on a lattice too dense for
+# MIN_DIST, to find the widest gap that fits
+GAP_BISECTIONS = 30
+
+# Random positions drawn at once for a particle, as drawing them one at a time
+# is slow
+BATCH = 16
+
+# Extra space left between particles, so particles that are placed as close
+# as allowed don't count as touching
+GAP = 1e-6
+
+################################################################################
+
+def get_packing_fraction(radii: np.ndarray, x_limits: Tuple = X_LIMITS,
+                         y_limits: Tuple = Y_LIMITS) -> float:
+    """Returns the fraction of the container covered by particles of the
+    given radii.
+    """
+    area = (x_limits[1] - x_limits[0]) * (y_limits[1] - y_limits[0])
+
+    return float(np.pi * np.sum(np.square(radii)) / area)
+
+
+def scale_radii(radii: np.ndarray, packing_fraction: float,
+                x_limits: Tuple = X_LIMITS,
+                y_limits: Tuple = Y_LIMITS) -> np.ndarray:
+    """Returns radii scaled by the same factor, so they cover packing_fraction
+    of the container.
+    """
+    covered = get_packing_fraction(radii, x_limits, y_limits)
+
+    return np.asarray(radii, dtype=float) * np.sqrt(packing_fraction / covered)
+
+
+def place_disks(radii: np.ndarray, rng: np.random.Generator,
+                fixed_pos: np.ndarray = None, fixed_radii: np.ndarray = None,
+                max_attempts: int = None, x_limits: Tuple = X_LIMITS,
+                y_limits: Tuple = Y_LIMITS) -> np.ndarray:
+    """Returns an (N, 2) array of positions for particles of the given radii,
+    inside the container and more than MIN_DIST from its walls and from each
+    other, so no particle starts out colliding.
+
+    Particles at fixed_pos with fixed_radii, e.g. ones already being
+    simulated, are avoided too. Without any, particles that can't be placed
+    randomly, or are too dense to try (see RANDOM_LIMIT), are put on a
+    lattice instead, as in place_on_lattice. With some, a ValueError is
+    raised.
+
+    max_attempts defaults to MAX_ATTEMPTS, plus one for every
+    ATTEMPT_PARTICLES particles.
+    """
+    radii = np.asarray(radii, dtype=float)
+    if fixed_pos is None:
+        fixed_pos, fixed_radii = np.zeros((0, 2)), np.zeros(0)
+    if max_attempts is None:
+        max_attempts = MAX_ATTEMPTS + len(radii) // ATTEMPT_PARTICLES
+
+    if len(fixed_pos) == 0 and _get_reach_fraction(radii, x_limits,
+                                                   y_limits) > RANDOM_LIMIT:
+        return place_on_lattice(radii, rng, x_limits, y_limits)
+
+    max_r = max(radii.max(initial=0), np.max(fixed_radii, initial=0))
+    cell_size = 2 * max_r + MIN_DIST + GAP
+    cells: Dict[Tuple[int, int], List[Tuple[float, float, float]]] = {}
+
+    def fits(x: float, y: float, r: float) -> bool:
+        cx, cy = int(x // cell_size), int(y // cell_size)
+        for nx in (cx - 1, cx, cx + 1):
+            for ny in (cy - 1, cy, cy + 1):
+                for ox, oy, o_r in cells.get((nx, ny), ()):
+                    reach = r + o_r + MIN_DIST + GAP
+                    if (x - ox) ** 2 + (y - oy) ** 2 <= reach * reach:
+                        return False
+        return True
+
+    def add(x: float, y: float, r: float) -> None:
+        cells.setdefault((int(x // cell_size), int(y // cell_size)),
+                         []).append((x, y, r))
+
+    for (x, y), r in zip(fixed_pos.tolist(), np.asarray(fixed_radii).tolist()):
+        add(x, y, r)
+
+    pos = np.empty((len(radii), 2))
+    # larger particles are harder to fit in later, so go first
+    for k in np.argsort(-radii, kind='stable').tolist():
+        r = radii[k]
+        low = (x_limits[0] + MIN_DIST + GAP + r,
+               y_limits[0] + MIN_DIST + GAP + r)
+        high = (x_limits[1] - MIN_DIST - GAP - r,
+                y_limits[1] - MIN_DIST - GAP - r)
+
+        placed = False
+        for first in range(0, max_attempts, BATCH):
+            size = min(BATCH, max_attempts - first)
+            for x, y in rng.uniform(low, high, size=(size, 2)).tolist():
+                if fits(x, y, r):
+                    add(x, y, r)
+                    pos[k] = x, y
+                    placed = True
+                    break
+            if placed:
+                break
+
+        if not placed:
+            if len(fixed_pos) > 0:
+                raise ValueError("no room left for another particle")
+            return place_on_lattice(radii, rng, x_limits, y_limits)
+
+    return pos
+
+
+def place_on_lattice(radii: np.ndarray, rng: np.random.Generator,
+                     x_limits: Tuple = X_LIMITS,
+                     y_limits: Tuple = Y_LIMITS) -> np.ndarray:
+    """Returns an (N, 2) array of positions for particles of the given radii,
+    on hexagonal lattices packed as densely as their sizes allow.
+
+    Particles are split into classes of similar radii, and each class is
+    put on random sites of its own band of lattice, spaced for the largest
+    particle of the class, with bands stacked from the bottom of the
+    container up. Particles are kept MIN_DIST apart if that fits, and
+    otherwise as far apart as fits, so they may start out colliding, but
+    never overlapping. The fewest classes from LATTICE_CLASSES that keep
+    particles MIN_DIST apart are used, or else those keeping them furthest
+    apart.
+
+    Raises a ValueError if the particles don't fit even touching each other.
+    """
+    radii = np.asarray(radii, dtype=float)
+    if len(radii) == 0:
+        return np.zeros((0, 2))
+
+    best = None  # widest gap found so far, and the classes giving it
+    for n_classes in LATTICE_CLASSES:
+        classes = _get_classes(radii, n_classes)
+        class_radii = [radii[members].max() for members in classes]
+        counts = [len(members) for members in classes]
+
+        clearance = _get_clearance(class_radii, counts, x_limits, y_limits)
+        if clearance is not None and (best is None or clearance > best[0]):
+            best = clearance, classes, class_radii, counts
+        if clearance == MIN_DIST:
+            break
+
+    if best is None:
+        raise ValueError(f"{len(radii)} particles covering "
+                         f"{get_packing_fraction(radii, x_limits, y_limits):.3g} "
+                         f"of the container don't fit in it")
+
+    clearance, classes, class_radii, counts = best
+    rows = _get_rows(class_radii, counts, clearance, x_limits, y_limits)
+    pos = np.empty((len(radii), 2))
+    for members, r, band in zip(classes, class_radii, rows):
+        spacing = 2 * r + clearance + GAP
+        x0 = x_limits[0] + clearance + GAP + r
+        width = x_limits[1] - clearance - GAP - r - x0
+
+        sites = []
+        for k, y in enumerate(band):
+            # every other row is shifted by half a site
+            shift = spacing / 2 if k % 2 else 0.0
+            columns = _get_columns(width - shift, spacing)
+            xs = x0 + shift + spacing * np.arange(columns)
+            sites.append(np.column_stack([xs, np.full(columns, y)]))
+        sites = np.concatenate(sites)
+
+        pos[members] = sites[rng.choice(len(sites), size=len(members),
+                                        replace=False)]
+
+    return pos
+
+
+def _get_reach_fraction(radii: np.ndarray, x_limits: Tuple,
+                        y_limits: Tuple) -> float:
+    """Returns the fraction of the container covered by particles of the
+    given radii, each counting half of MIN_DIST around it.
+    """
+    return get_packing_fraction(np.asarray(radii) + (MIN_DIST + GAP) / 2,
+                                x_limits, y_limits)
+
+
+def _get_classes(radii: np.ndarray, n_classes: int) -> List[np.ndarray]:
+    """Split particles into up to n_classes classes of similar radii,
+    returning the indices of the particles in each class, largest radii
+    first.
+
+    Particles with the same radius share a class, if there are no more than
+    n_classes different radii. Otherwise, classes hold equal numbers of
+    particles.
+    """
+    order = np.argsort(-radii, kind='stable')
+    values, starts = np.unique(-radii[order], return_index=True)
+    if len(values) <= n_classes:
+        return np.split(order, starts[1:])
+
+    return [members for members in np.array_split(order, n_classes)
+            if len(members) > 0]
+
+
+def _get_clearance(class_radii: List[float], counts: List[int],
+                   x_limits: Tuple, y_limits: Tuple) -> float:
+    """Returns the widest gap, up to MIN_DIST, that can be left between
+    particles on the lattices of _get_rows, or None if they don't fit even
+    touching each other.
+    """
+    if _get_rows(class_radii, counts, MIN_DIST, x_limits,
+                 y_limits) is not None:
+        return MIN_DIST
+    if _get_rows(class_radii, counts, 0.0, x_limits, y_limits) is None:
+        return None
+
+    low, high = 0.0, MIN_DIST
+    for _ in range(GAP_BISECTIONS):
+        middle = (low + high) / 2
+        if _get_rows(class_radii, counts, middle, x_limits, y_limits) is None:
+            high = middle
+        else:
+            low = middle
+
+    return low
+
+
+def _get_columns(width: float, spacing: float) -> int:
+    """Returns the number of sites spacing apart that fit in a row where
+    centers can be up to width apart.
+    """
+    return int(width // spacing) + 1 if width >= 0 else 0
+
+
+def _get_rows(class_radii: List[float], counts: List[int], clearance: float,
+              x_limits: Tuple, y_limits: Tuple) -> List[np.ndarray]:
+    """Returns the heights of the rows of lattice of each class, for counts
+    particles of each class, with particles clearance + GAP apart, or None if
+    they don't all fit in the container.
+    """
+    rows = []
+    top = None  # height and radius of the last row so far
+    for r, count in zip(class_radii, counts):
+        spacing = 2 * r + clearance + GAP
+        width = x_limits[1] - x_limits[0] - 2 * (clearance + GAP + r)
+        per_row = (_get_columns(width, spacing),
+                   _get_columns(width - spacing / 2, spacing))
+        if per_row[0] == 0:
+            return None
+
+        # rows come in pairs, the second shifted by half a site
+        pairs, rest = divmod(count, sum(per_row))
+        n_rows = 2 * pairs + (0 if rest == 0 else 1 if rest <= per_row[0]
+                              else 2)
+
+        if top is None:
+            first = y_limits[0] + clearance + GAP + r
+        else:
+            first = top[0] + top[1] + r + clearance + GAP
+        band = first + spacing * math.sqrt(3) / 2 * np.arange(n_rows)
+        rows.append(band)
+        top = (band[-1], r)
+
+    if top[0] > y_limits[1] - clearance - GAP - top[1]:
+        return None
+
+    return rows
+
+
+def thermal_velocities(masses: np.ndarray, temperature: float,
+                       rng: np.random.Generator) -> np.ndarray:
+    """Returns an (N, 2) array of velocities for particles of the given
+    masses, drawn from the Maxwell-Boltzmann distribution, with no overall
+    momentum, and scaled to exactly the given temperature.
+    """
+    masses = np.asarray(masses, dtype=float)
+    n = len(masses)
+    vel = rng.standard_normal((n, 2)) * np.sqrt(temperature / masses)[:, None]
+    if n < 2:
+        return np.zeros((n, 2))  # a single particle can't move without momentum
+
+    # remove the motion of the center of mass
+    vel -= (masses[:, None] * vel).sum(axis=0) / masses.sum()
+
+    # 2 degrees of freedom per particle, less 2 for the center of mass
+    kinetic_energy = 0.5 * np.sum(masses * np.sum(vel ** 2, axis=1))
+    current = kinetic_energy / (n - 1)
+    if current > 0:
+        vel *= np.sqrt(temperature / current)
+
+    return vel
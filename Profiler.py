@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Lightweight timers and counters for finding where frame time goes.
+
+Code being profiled wraps each phase in a named timer, and counts things
+like pairs tested with named counters:
+
+    with profiler.timer('collisions'):
+        ...
+    profiler.count('collisions', len(i))
+
+A disabled profiler hands out a shared timer that does nothing, and ignores
+counts, so instrumented code runs at nearly full speed when not profiling.
+"""
+import csv
+import json
+import time
+import numpy as np
+from collections import deque
+from typing import Dict, List
+
+# Number of most recent times kept for each timer, which its percentiles are
+# computed over
+WINDOW = 600
+
+PERCENTILES = (50, 90, 99)
+
+################################################################################
+
+class _NullTimer:
+    """Timer handed out by a disabled Profiler, which does nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    """Times a with block, and adds the time to a Profiler under a name.
+    """
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """Collects times of named phases and totals of named counters.
+
+    For every timer, the number of times it ran and their total are kept,
+    along with the last window times, for rolling percentiles. Profiling can
+    be switched on and off at any time with enabled.
+    """
+    def __init__(self, enabled: bool = True, window: int = WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all times and counts collected so far.
+        """
+        self._recent = {}  # last window times of each timer, in seconds
+        self._calls = {}
+        self._totals = {}
+        self.counters = {}
+
+    def timer(self, name: str):
+        """Returns a context manager timing a with block as the phase name.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+
+        return _Timer(self, name)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Record that the phase name took seconds.
+        """
+        if not self.enabled:
+            return
+
+        if name not in self._recent:
+            self._recent[name] = deque(maxlen=self.window)
+            self._calls[name] = 0
+            self._totals[name] = 0.0
+
+        self._recent[name].append(seconds)
+        self._calls[name] += 1
+        self._totals[name] += seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Add n to the counter name.
+        """
+        if not self.enabled:
+            return
+
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns, for each timer, the number of times it ran, its total and
+        mean time in seconds, and percentiles of its recent times in seconds.
+        """
+        summary = {}
+        for name, recent in self._recent.items():
+            stats = {
+                'calls': self._calls[name],
+                'total_seconds': self._totals[name],
+                'mean_seconds': self._totals[name] / self._calls[name],
+            }
+            values = np.percentile(np.fromiter(recent, float, len(recent)),
+                                   PERCENTILES)
+            for q, value in zip(PERCENTILES, values.tolist()):
+                stats[f'p{q}_seconds'] = value
+
+            summary[name] = stats
+
+        return summary
+
+    def format_lines(self) -> List[str]:
+        """Returns a line of text per timer and one for all counters, for
+        showing the profile on screen or in a terminal.
+        """
+        lines = [f"{name}: p50 {1000 * stats['p50_seconds']:.2f} ms, "
+                 f"p99 {1000 * stats['p99_seconds']:.2f} ms"
+                 for name, stats in self.summary().items()]
+
+        if self.counters:
+            lines.append(', '.join(f'{name} {value}' for name, value in
+                                   self.counters.items()))
+
+        return lines
+
+    def to_json(self, path: str) -> None:
+        """Write the summary of every timer, and every counter, to path as
+        JSON.
+        """
+        with open(path, 'w') as f:
+            json.dump({'timers': self.summary(), 'counters': self.counters},
+                      f, indent=2)
+
+    def to_csv(self, path: str) -> None:
+        """Write the summary of every timer to path as CSV, with a row per
+        timer, followed by a row per counter with only its total in the count
+        column. The kind column tells the two apart, as a timer and a counter
+        can share a name, e.g. 'collisions'.
+        """
+        columns = ['calls', 'total_seconds', 'mean_seconds'] + \
+            [f'p{q}_seconds' for q in PERCENTILES]
+
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'name'] + columns + ['count'])
+            for name, stats in self.summary().items():
+                writer.writerow(['timer', name] +
+                                [stats[column] for column in columns] + [''])
+            for name, value in self.counters.items():
+                writer.writerow(['counter', name] + [''] * len(columns) +
+                                [value])
+
+    def export(self, path: str) -> None:
+        """Write the profile to path, as CSV if path ends in .csv, and as JSON
+        otherwise.
+        """
+        if path.endswith('.csv'):
+            self.to_csv(path)
+        else:
+            self.to_json(path)
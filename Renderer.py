@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import numpy as np
+import pygame
+from Button import Button
+from ParticleManager import RED_PER_SPEED
+from typing import Dict, List, Tuple
+
+BACKGROUND_COLOR = (255, 255, 255)
+BORDER_COLOR = (0, 0, 0)
+
+# Particle container, as (left, top, width, height)
+CONTAINER_RECT = (75, 75, 450, 450)
+
+# Above this many changed areas in a frame, the display is updated in one go
+# over the area covering all of them, which is faster than many small updates
+MAX_DIRTY_RECTS = 100
+
+# Number of distinct shades of red particles are drawn with when drawing
+# particles in a batch, each shade having its own pre-rendered sprites
+COLOR_BUCKETS = 32
+
+# Color that is transparent in particle sprites
+SPRITE_COLORKEY = (255, 255, 255)
+
+# Area of the window below the container and buttons showing the overlay, as
+# (left, top, width, height), and the size and color of its text
+OVERLAY_RECT = (75, 530, 850, 70)
+OVERLAY_FONT_SIZE = 14
+OVERLAY_COLUMN_WIDTH = 280
+OVERLAY_COLOR = (80, 80, 80)
+
+################################################################################
+
+class Renderer:
+    """Draws the game window, redrawing only what has changed each frame.
+
+    Everything that never changes (background, particle container, labels and
+    buttons) is drawn once into a cached background surface. Each frame, the
+    areas covered by particles in the last frame are restored from the
+    background, particles are drawn at their new positions, value buttons are
+    redrawn if their value changed, and only those areas of the display are
+    updated.
+
+    Particles can be drawn one at a time with draw, or all at once with
+    draw_arrays, which blits a pre-rendered sprite for each particle's radius
+    and shade of red, and is much faster for thousands of particles.
+
+    Both can also draw lines of text, e.g. from Profiler.format_lines, in an
+    overlay below the container.
+    """
+    def __init__(self, window: pygame.Surface, buttons: List[Button],
+                 labels: List[Button], values: Dict[str, Button]):
+        self.window = window
+        self.values = values  # buttons showing values, by particle property
+        self.background = self._draw_static(buttons, labels)
+
+        self._particle_rects = []  # areas covered by particles last frame
+        self._full_redraw = True
+
+        self._sprites = {}  # particle sprites, by (radius, color bucket)
+
+    def _draw_static(self, buttons: List[Button],
+                     labels: List[Button]) -> pygame.Surface:
+        """Return a surface with everything that doesn't change drawn on it.
+        """
+        background = pygame.Surface(self.window.get_size()).convert()
+        background.fill(BACKGROUND_COLOR)
+
+        pygame.draw.rect(background, BORDER_COLOR, CONTAINER_RECT, 2)
+
+        for button in labels + buttons:
+            button.draw(background, BORDER_COLOR)
+
+        return background
+
+    def invalidate(self) -> None:
+        """Redraw and update the whole window in the next frame.
+        """
+        self._full_redraw = True
+
+    def draw(self, particle_info: List[Tuple],
+             particle_values: Dict[str, int],
+             overlay: List[str] = None) -> None:
+        """Draw a frame, with particles given as (color, position, radius)
+        tuples from ParticleManager.get_updated_particle_info, the values of
+        new particles' properties given by particle_values, and the lines of
+        overlay, if given.
+        """
+        dirty = self._erase()
+        self._draw_values(particle_values, dirty)
+        self._draw_overlay(overlay, dirty)
+
+        self._particle_rects = [pygame.draw.circle(self.window, color, pos, r)
+                                for color, pos, r in particle_info]
+        dirty.extend(self._particle_rects)
+
+        self._update_display(dirty)
+
+    def draw_arrays(self, pos: np.ndarray, radii: np.ndarray,
+                    speeds: np.ndarray, particle_values: Dict[str, int],
+                    overlay: List[str] = None) -> None:
+        """Draw a frame, with particles given as arrays of positions, radii and
+        speeds from ParticleManager.get_render_arrays, the values of new
+        particles' properties given by particle_values, and the lines of
+        overlay, if given.
+
+        Colors are computed for all particles at once, and rounded to one of
+        COLOR_BUCKETS shades, so particles can be blitted from cached sprites.
+        """
+        dirty = self._erase()
+        self._draw_values(particle_values, dirty)
+        self._draw_overlay(overlay, dirty)
+
+        int_radii = np.maximum(np.rint(radii).astype(int), 1)
+        reds = np.clip(RED_PER_SPEED * speeds, 0, 255)
+        buckets = np.rint(reds * ((COLOR_BUCKETS - 1) / 255)).astype(int)
+
+        # look up a sprite once for each distinct (radius, bucket), rather than
+        # for every particle
+        keys, inverse = np.unique(int_radii * COLOR_BUCKETS + buckets,
+                                  return_inverse=True)
+        sprites = [self._get_sprite(key // COLOR_BUCKETS, key % COLOR_BUCKETS)
+                   for key in keys.tolist()]
+
+        corners = np.rint(pos - int_radii[:, None]).astype(int)
+        self._particle_rects = self.window.blits(
+            zip(map(sprites.__getitem__, inverse.ravel().tolist()),
+                corners.tolist())
+        )
+        dirty.extend(self._particle_rects)
+
+        self._update_display(dirty)
+
+    def _get_sprite(self, radius: int, bucket: int) -> pygame.Surface:
+        """Return a sprite of a particle with the given radius and color
+        bucket, only drawing it the first time it's asked for.
+        """
+        if (radius, bucket) not in self._sprites:
+            red = round(bucket * 255 / (COLOR_BUCKETS - 1))
+            sprite = pygame.Surface((2 * radius, 2 * radius))
+            sprite.fill(SPRITE_COLORKEY)
+            pygame.draw.circle(sprite, (red, 0, 255), (radius, radius), radius)
+            sprite = sprite.convert()
+            sprite.set_colorkey(SPRITE_COLORKEY, pygame.RLEACCEL)
+
+            self._sprites[(radius, bucket)] = sprite
+
+        return self._sprites[(radius, bucket)]
+
+    def _erase(self) -> List[pygame.Rect]:
+        """Restore the background wherever particles were drawn in the last
+        frame, or everywhere if the whole window needs redrawing, and return
+        the areas of the window that were restored.
+        """
+        if self._full_redraw:
+            self.window.blit(self.background, (0, 0))
+            return []
+
+        rects = self._particle_rects
+        if len(rects) > MAX_DIRTY_RECTS:
+            # one large blit is faster than many small ones
+            rects = [rects[0].unionall(rects[1:])]
+
+        for rect in rects:
+            self.window.blit(self.background, rect, rect)
+
+        return list(rects)
+
+    def _draw_values(self, particle_values: Dict[str, int],
+                     dirty: List[pygame.Rect]) -> None:
+        """Draw the buttons showing particle_values that need to be drawn,
+        adding the areas they cover to dirty.
+        """
+        for name, button in self.values.items():
+            text = str(particle_values[name])
+            rect = button.get_rect()
+
+            # values may also have been erased along with a particle
+            if (self._full_redraw or button.text != text
+                    or rect.collidelist(dirty) != -1):
+                button.text = text
+                button.draw(self.window)
+                dirty.append(rect)
+
+    def _draw_overlay(self, overlay: List[str],
+                      dirty: List[pygame.Rect]) -> None:
+        """Draw the lines of overlay, if given, adding the area they cover to
+        dirty.
+        """
+        if overlay is None:
+            return
+
+        rect = pygame.Rect(OVERLAY_RECT)
+        self.window.blit(self.background, rect, rect)
+
+        # lines fill the area column by column, and any that don't fit are
+        # left out
+        font = Button.get_font(size=OVERLAY_FONT_SIZE)
+        x, y = rect.left, rect.top
+        for line in overlay:
+            if y + font.get_linesize() > rect.bottom:
+                x, y = x + OVERLAY_COLUMN_WIDTH, rect.top
+            if x + OVERLAY_COLUMN_WIDTH > rect.right:
+                break
+
+            self.window.blit(font.render(line, 1, OVERLAY_COLOR), (x, y))
+            y += font.get_linesize()
+
+        dirty.append(rect)
+
+    def _update_display(self, dirty: List[pygame.Rect]) -> None:
+        if self._full_redraw:
+            pygame.display.update()
+            self._full_redraw = False
+        elif len(dirty) > MAX_DIRTY_RECTS:
+            pygame.display.update(dirty[0].unionall(dirty[1:]))
+        elif dirty:
+            pygame.display.update(dirty)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import time
+import numpy as np
+import ParticleArrays
+from ParticleManager import ParticleManager
+
+# Most simulated time advance will catch up on in one call, in the same units
+# as dt, so a few slow frames don't make every following frame slower still
+MAX_CATCH_UP = 5.0
+
+################################################################################
+
+class Simulation:
+    """Advances the physics of a ParticleManager, independently of anything
+    drawing the particles.
+
+    The GUI in main.py and the headless runner in Headless.py both step the
+    particles through this loop.
+
+    Every step advances the particles by the same dt units of time, where a
+    unit is one frame of the original GUI. A smaller dt runs the physics more
+    accurately, at more steps per unit of time. Headless runs call step or run
+    as fast as possible, while the GUI calls advance with the time elapsed
+    between frames, which takes as many fixed steps as fit in that time.
+    """
+    def __init__(self, manager: ParticleManager, dt: float = 1.0,
+                 max_catch_up: float = MAX_CATCH_UP):
+        self.manager = manager
+        self.dt = dt
+        self.max_steps = max(1, int(np.ceil(max_catch_up / dt)))
+
+        self.steps = 0  # physics steps taken so far
+        self.time = 0.0  # simulated time so far
+
+        # time passed to advance that hasn't been stepped through yet
+        self._accumulator = 0.0
+        # positions before the last step taken by advance, for interpolation
+        self._previous_pos = None
+
+    def step(self) -> None:
+        """Advance all particles by a single step.
+        """
+        self.manager.update_particles(self.dt)
+        self.steps += 1
+        self.time += self.dt
+
+    def run(self, n_steps: int) -> float:
+        """Advance all particles by n_steps steps, returning the number of
+        seconds this took.
+        """
+        start = time.perf_counter()
+        for _ in range(n_steps):
+            self.step()
+
+        return time.perf_counter() - start
+
+    def advance(self, elapsed: float) -> int:
+        """Advance all particles by as many steps as fit in elapsed units of
+        time, plus whatever was left over from previous calls, and return the
+        number of steps taken.
+
+        At most max_steps steps are taken. If more time has passed than that,
+        e.g. after the window was dragged, the rest is dropped and the
+        simulation falls behind, rather than trying ever harder to catch up.
+        """
+        self._accumulator += elapsed
+
+        n_steps = int(self._accumulator // self.dt)
+        if n_steps > self.max_steps:
+            n_steps = self.max_steps
+            self._accumulator = n_steps * self.dt
+
+        for k in range(n_steps):
+            if k == n_steps - 1:
+                self._previous_pos = self.manager.get_positions()
+            self.step()
+
+        self._accumulator -= n_steps * self.dt
+
+        return n_steps
+
+    def reset_interpolation(self) -> None:
+        """Stop interpolating positions until the next step, e.g. after the
+        particles were replaced.
+        """
+        self._previous_pos = None
+
+    def get_interpolation(self) -> float:
+        """Returns how far, from 0 to 1, the time passed to advance has got
+        towards the next step.
+        """
+        return self._accumulator / self.dt
+
+    def get_positions(self) -> np.ndarray:
+        """Returns an (N, 2) array of particle positions, interpolated between
+        the last two steps taken by advance according to get_interpolation,
+        so particles move smoothly when drawn more often than steps are taken.
+
+        Positions after the last step are returned if particles have been
+        added or removed since then.
+        """
+        pos = self.manager.get_positions()
+        if self._previous_pos is None or self._previous_pos.shape != pos.shape:
+            return pos
+
+        alpha = self.get_interpolation()
+
+        if self.manager.boundary == 'periodic':
+            # particles that wrapped around move the short way
+            step = pos - self._previous_pos
+            step -= ParticleArrays.BOX * np.round(step / ParticleArrays.BOX)
+            pos = self._previous_pos + alpha * step
+            ParticleArrays.wrap_positions(pos)
+            return pos
+
+        return (1 - alpha) * self._previous_pos + alpha * pos
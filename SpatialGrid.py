@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import numpy as np
+from Particle import X_LIMITS, Y_LIMITS
+from typing import Tuple
+
+# Neighboring cells to pair each cell with, besides the cell itself
+# Only half of the 8 surrounding cells are needed, as the other half are
+# covered when the grid visits those cells instead
+HALF_STENCIL = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+# A cell and all 8 surrounding cells, for finding every neighbor of a particle
+FULL_STENCIL = tuple((dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1))
+
+################################################################################
+
+class SpatialGrid:
+    """Uniform grid of square cells covering the particle container, used to
+    find pairs of particles that could possibly be colliding.
+
+    As long as cell_size is at least the largest distance between the centers
+    of two touching particles, every touching pair is in the same or in
+    neighboring cells, so only those pairs need to be checked.
+
+    If periodic is True, the container wraps around, so cells on opposite
+    edges are neighbors too. The cells are then stretched to fit a whole
+    number of them across the container.
+    """
+    def __init__(self, cell_size: float, x_limits: Tuple[float] = X_LIMITS,
+                 y_limits: Tuple[float] = Y_LIMITS, periodic: bool = False):
+        self.cell_size = cell_size
+        self.x_limits = x_limits
+        self.y_limits = y_limits
+        self.periodic = periodic
+
+        width = x_limits[1] - x_limits[0]
+        height = y_limits[1] - y_limits[0]
+        if periodic:
+            self.nx = max(1, int(width // cell_size))
+            self.ny = max(1, int(height // cell_size))
+            self.cell_width = width / self.nx
+            self.cell_height = height / self.ny
+        else:
+            self.nx = max(1, int(np.ceil(width / cell_size)))
+            self.ny = max(1, int(np.ceil(height / cell_size)))
+            self.cell_width = self.cell_height = cell_size
+
+    def get_cells(self, pos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the column and row of the cell holding each position.
+
+        Positions outside of the container are put in the closest edge cell,
+        or wrapped around into the container if it's periodic.
+        """
+        cx = np.floor((pos[:, 0] - self.x_limits[0]) / self.cell_width)
+        cy = np.floor((pos[:, 1] - self.y_limits[0]) / self.cell_height)
+
+        if self.periodic:
+            return (cx.astype(np.int64) % self.nx,
+                    cy.astype(np.int64) % self.ny)
+
+        cx = np.clip(cx, 0, self.nx - 1).astype(np.int64)
+        cy = np.clip(cy, 0, self.ny - 1).astype(np.int64)
+
+        return cx, cy
+
+    def candidate_pairs(self, pos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return index arrays (i, j), with i < j, for every pair of particles
+        in the same or neighboring cells. Each pair appears exactly once.
+        """
+        n = len(pos)
+        cx, cy = self.get_cells(pos)
+        keys = cy * self.nx + cx
+        order, cell_starts = self._sort_into_cells(keys)
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+
+        # pair each particle with the particles after it in its own cell
+        particles = np.arange(n)
+        i_parts = [particles]
+        starts = [rank + 1]
+        ends = [cell_starts[keys + 1]]
+
+        # then with every particle in half of the surrounding cells
+        for dx, dy in HALF_STENCIL:
+            ncx = cx + dx
+            ncy = cy + dy
+            if self.periodic:
+                ncx %= self.nx
+                ncy %= self.ny
+            valid = (ncx >= 0) & (ncx < self.nx) & (ncy >= 0) & (ncy < self.ny)
+            neighbor_keys = ncy[valid] * self.nx + ncx[valid]
+
+            i_parts.append(particles[valid])
+            starts.append(cell_starts[neighbor_keys])
+            ends.append(cell_starts[neighbor_keys + 1])
+
+        i, j = _expand_ranges(np.concatenate(i_parts), np.concatenate(starts),
+                              np.concatenate(ends))
+        j = order[j]
+        i, j = np.minimum(i, j), np.maximum(i, j)
+
+        if self.periodic and (self.nx < 3 or self.ny < 3):
+            # with fewer than 3 cells across, wrapping around reaches the
+            # same cell from both sides, or a cell from itself
+            keys = np.unique(i[i != j] * n + j[i != j])
+            i, j = keys // n, keys % n
+
+        return i, j
+
+    def neighbor_pairs(self, pos: np.ndarray,
+                       which: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return index arrays (i, j), with i < j, pairing each particle in
+        which with every other particle in the same or neighboring cells. Each
+        pair appears exactly once, even if both particles are in which.
+        """
+        n = len(pos)
+        which = np.asarray(which, dtype=np.int64)
+        cx, cy = self.get_cells(pos)
+        order, cell_starts = self._sort_into_cells(cy * self.nx + cx)
+
+        i_parts, starts, ends = [], [], []
+        for dx, dy in FULL_STENCIL:
+            ncx = cx[which] + dx
+            ncy = cy[which] + dy
+            if self.periodic:
+                ncx %= self.nx
+                ncy %= self.ny
+            valid = (ncx >= 0) & (ncx < self.nx) & (ncy >= 0) & (ncy < self.ny)
+            neighbor_keys = ncy[valid] * self.nx + ncx[valid]
+
+            i_parts.append(which[valid])
+            starts.append(cell_starts[neighbor_keys])
+            ends.append(cell_starts[neighbor_keys + 1])
+
+        i, j = _expand_ranges(np.concatenate(i_parts), np.concatenate(starts),
+                              np.concatenate(ends))
+        j = order[j]
+
+        # a pair of two particles in which is found from both of them, so
+        # only keep it from the first, which drops each particle's pair with
+        # itself too
+        in_which = np.zeros(n, dtype=bool)
+        in_which[which] = True
+        keep = ~in_which[j] | (i < j)
+        i, j = np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep])
+
+        if self.periodic and (self.nx < 3 or self.ny < 3):
+            # as in candidate_pairs, cells can be reached more than once
+            keys = np.unique(i * n + j)
+            i, j = keys // n, keys % n
+
+        return i, j
+
+    def _sort_into_cells(self, keys: np.ndarray) -> Tuple[np.ndarray,
+                                                           np.ndarray]:
+        """Sort particles by the key of their cell, returning the order they
+        sort in, and where each cell's particles start in that order, so cell
+        key holds particles order[cell_starts[key]:cell_starts[key + 1]].
+        """
+        order = np.argsort(keys, kind='stable')
+        cell_starts = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.nx * self.ny),
+                  out=cell_starts[1:])
+
+        return order, cell_starts
+
+
+def _expand_ranges(i: np.ndarray, starts: np.ndarray,
+                   ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair each i[k] with every index in range(starts[k], ends[k]), returning
+    the pairs as two flat index arrays.
+    """
+    counts = np.maximum(ends - starts, 0)
+    total = counts.sum()
+
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    return np.repeat(i, counts), np.repeat(starts, counts) + offsets
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""A single heavy, large tracer particle in a bath of thousands of small,
+light, fast particles, whose collisions push the tracer around in a
+Brownian motion, like the Wiener walks of Brownian_Wiener.
+
+Only the tracer's positions are recorded, to a memory-mapped .npy file of
+shape (steps + 1, 2), unwrapped across periodic boundaries, so the file can
+be analysed with Brownian_Analysis just like a Wiener walk:
+
+    manager = build_bath(3000, seed=1)
+    record_tracer(Simulation(manager), 'tracer.npy', 100000)
+    positions = np.load('tracer.npy', mmap_mode='r')
+    D, _ = fit_diffusion(msd(positions, max_lag=1000), dims=2)
+
+Usage: python Tracer.py --bath 3000 --steps 100000 --output tracer.npy
+"""
+import argparse
+import time
+import numpy as np
+import Placement
+from Brownian_Analysis import msd, fit_diffusion
+from DomainDecomposition import DecomposedSimulation
+from Particle import X_LIMITS, Y_LIMITS
+from ParticleArrays import BOX
+from ParticleManager import ParticleManager, BOUNDARIES
+from Profiler import Profiler
+from Simulation import Simulation
+from typing import Dict, List, Tuple
+
+# Index of the tracer among the particles of a bath from build_bath
+TRACER = 0
+
+TRACER_RADIUS = 40.0
+TRACER_MASS = 2000.0
+
+BATH_RADIUS = 1.5
+BATH_MASS = 1.0
+
+# Temperature of the bath, in the units of Placement. Bath particles move
+# about 2 pixels a step, slowly enough not to skip past each other
+BATH_TEMPERATURE = 2.0
+
+################################################################################
+
+def build_bath(n: int, seed: int = None, tracer_radius: float = TRACER_RADIUS,
+               tracer_mass: float = TRACER_MASS,
+               bath_radius: float = BATH_RADIUS,
+               bath_mass: float = BATH_MASS,
+               temperature: float = BATH_TEMPERATURE,
+               boundary: str = 'periodic', neighbor_skin: float = None,
+               profiler: Profiler = None) -> ParticleManager:
+    """Return a new ParticleManager, with the array engine, simulating a
+    tracer in the middle of the container, at index TRACER, and n bath
+    particles placed around it without overlapping, all with velocities
+    drawn for temperature with no overall momentum.
+
+    seed seeds the manager's random number generator, and boundary,
+    neighbor_skin and profiler are passed on to the ParticleManager. The
+    default periodic boundary keeps the tracer from feeling any walls.
+    Raises a ValueError if the bath doesn't fit around the tracer.
+    """
+    rng = np.random.default_rng(seed)
+    manager = ParticleManager('array', neighbor_skin=neighbor_skin, rng=rng,
+                              max_particles=n + 1, profiler=profiler,
+                              boundary=boundary)
+
+    center = np.array([[(X_LIMITS[0] + X_LIMITS[1]) / 2,
+                        (Y_LIMITS[0] + Y_LIMITS[1]) / 2]])
+    radii = np.concatenate([[tracer_radius], np.full(n, bath_radius)])
+    masses = np.concatenate([[tracer_mass], np.full(n, bath_mass)])
+
+    bath_pos = Placement.place_disks(radii[1:], rng, center, radii[:1])
+    vel = Placement.thermal_velocities(masses, temperature, rng)
+
+    manager.set_particles(np.concatenate([center, bath_pos]), vel, radii,
+                          masses)
+
+    return manager
+
+
+def record_tracer(simulation: Simulation, path: str, steps: int,
+                  index: int = TRACER) -> Dict[str, float]:
+    """Advance simulation by steps steps, writing the position of the
+    particle at index, e.g. the tracer of build_bath, before the first step
+    and after every step to a memory-mapped .npy file at path, and return how
+    long this took, as Headless.run_headless does.
+
+    With periodic boundaries, positions are unwrapped, following the
+    particle across the edges of the container rather than wrapping it back
+    in, so displacements are measured correctly. simulation can also be a
+    DecomposedSimulation, whose manager is then only given the particles'
+    state once, at the end, as the particle is read straight from shared
+    memory.
+    """
+    manager = simulation.manager
+    periodic = manager.boundary == 'periodic'
+    if isinstance(simulation, DecomposedSimulation):
+        def get_position() -> np.ndarray:
+            return simulation.get_particle_position(index)
+    else:
+        def get_position() -> np.ndarray:
+            return manager.pos[index]
+
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64,
+                                    shape=(steps + 1, 2))
+    last = get_position().copy()
+    current = last.copy()
+    out[0] = current
+
+    start = time.perf_counter()
+    for k in range(1, steps + 1):
+        simulation.step()
+        new = get_position()
+        step = new - last
+        if periodic:
+            # the tracer moves far less than half the container in a step
+            step -= BOX * np.round(step / BOX)
+        current += step
+        last[:] = new
+        out[k] = current
+    seconds = time.perf_counter() - start
+    if isinstance(simulation, DecomposedSimulation):
+        simulation.sync()
+
+    out.flush()
+    del out
+
+    return {
+        'particles': manager.get_num_particles(),
+        'steps': steps,
+        'seconds': seconds,
+        'steps_per_second': steps / seconds if seconds > 0 else float('inf')
+    }
+
+
+def tracer_diffusion(positions: np.ndarray, max_lag: int = None,
+                     dt: float = 1.0) -> Tuple[np.ndarray, float]:
+    """Return the MSD of a tracer trajectory, e.g. a file from record_tracer
+    opened with np.load(path, mmap_mode='r'), up to max_lag, and its
+    diffusion coefficient fitted with Brownian_Analysis.fit_diffusion, for
+    steps dt units of time long.
+    """
+    msd_values = msd(positions, max_lag)
+    diffusion, _ = fit_diffusion(msd_values, dims=2, dt=dt)
+
+    return msd_values, diffusion
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Simulate a heavy tracer particle in a bath of small '
+                    'particles, and record and analyse its Brownian motion.'
+    )
+    parser.add_argument('--bath', '-n', type=int, default=3000,
+                        help='number of bath particles')
+    parser.add_argument('--steps', '-k', type=int, default=10000,
+                        help='number of physics steps to run')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the random number generator')
+    parser.add_argument('--dt', type=float, default=1.0,
+                        help='units of simulated time per physics step')
+    parser.add_argument('--tracer-radius', type=float, default=TRACER_RADIUS,
+                        help='radius of the tracer')
+    parser.add_argument('--tracer-mass', type=float, default=TRACER_MASS,
+                        help='mass of the tracer')
+    parser.add_argument('--bath-radius', type=float, default=BATH_RADIUS,
+                        help='radius of each bath particle')
+    parser.add_argument('--bath-mass', type=float, default=BATH_MASS,
+                        help='mass of each bath particle')
+    parser.add_argument('--temperature', type=float, default=BATH_TEMPERATURE,
+                        help='temperature to draw velocities for')
+    parser.add_argument('--boundary', choices=BOUNDARIES, default='periodic',
+                        help='wrap particles around the container, or bounce '
+                             'them off its walls')
+    parser.add_argument('--neighbor-skin', type=float, default=None,
+                        help='skin of the neighbor list, if using one')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='split the container into strips simulated by '
+                             'this many processes (walls only)')
+    parser.add_argument('--output', '-o', default='tracer.npy',
+                        help='.npy file to write the tracer positions to')
+    parser.add_argument('--max-lag', type=int, default=None,
+                        help='longest lag to compute the MSD for, by default '
+                             'a tenth of the steps')
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.boundary != 'walls':
+        parser.error('--workers needs --boundary walls')
+
+    manager = build_bath(args.bath, args.seed, args.tracer_radius,
+                         args.tracer_mass, args.bath_radius, args.bath_mass,
+                         args.temperature, args.boundary, args.neighbor_skin)
+
+    if args.workers is not None:
+        simulation = DecomposedSimulation(manager, args.workers, args.dt)
+    else:
+        simulation = Simulation(manager, args.dt)
+
+    try:
+        result = record_tracer(simulation, args.output, args.steps)
+    finally:
+        if args.workers is not None:
+            simulation.close()
+
+    print(f"{result['particles']} particles, {result['steps']} steps in "
+          f"{result['seconds']:.3f} s ({result['steps_per_second']:.1f} "
+          f"steps/s)")
+
+    max_lag = args.max_lag or max(1, args.steps // 10)
+    positions = np.load(args.output, mmap_mode='r')
+    _, diffusion = tracer_diffusion(positions, max_lag, args.dt)
+    print(f"tracer diffusion coefficient {diffusion:.6g}, written to "
+          f"{args.output}")
+
+################################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Record the positions and velocities of particles at every step to disk,
+and read them back later without running the simulation again.
+
+A recording is a directory holding:
+    header.json: format version, number of particles and frames, dt and the
+        number of frames in each chunk
+    radii.npy, masses.npy: radius and mass of every particle
+    chunk_00000.npy, chunk_00001.npy, ...: float32 arrays of shape
+        (4, frames_per_chunk, particles), holding x, y, vx and vy of every
+        particle in consecutive frames
+
+Chunks are written and read through memory maps, one at a time, so
+recordings can be far larger than memory.
+"""
+import json
+import os
+import time
+import numpy as np
+from ParticleManager import ParticleManager
+from Simulation import Simulation
+from typing import Callable, Iterator, Tuple
+
+VERSION = 1
+
+HEADER_FILE = 'header.json'
+RADII_FILE = 'radii.npy'
+MASSES_FILE = 'masses.npy'
+CHUNK_FILE = 'chunk_{:05d}.npy'
+
+# Size each chunk is aimed at, when the number of frames per chunk isn't given
+CHUNK_BYTES = 64 * 2 ** 20
+
+# Rows of each chunk
+X, Y, VX, VY = range(4)
+
+DTYPE = np.float32
+
+################################################################################
+
+class TrajectoryWriter:
+    """Writes a recording of particles to the directory path, one frame at a
+    time, for particles of the given radii and masses, with frames dt units
+    of time apart.
+
+    Every chunk is written at its full size, except that the last one is cut
+    down when the writer is closed. The number of particles can't change
+    during a recording. The header is rewritten whenever a chunk is filled,
+    so everything up to the last full chunk can be read even if the writer is
+    never closed.
+    """
+    def __init__(self, path: str, radii: np.ndarray, masses: np.ndarray,
+                 dt: float = 1.0, frames_per_chunk: int = None):
+        self.path = path
+        self.n_particles = len(radii)
+        self.dt = dt
+        self.n_frames = 0
+
+        if frames_per_chunk is None:
+            frame_bytes = 4 * self.n_particles * np.dtype(DTYPE).itemsize
+            frames_per_chunk = max(1, CHUNK_BYTES // max(1, frame_bytes))
+        self.frames_per_chunk = frames_per_chunk
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, RADII_FILE), np.asarray(radii, dtype=float))
+        np.save(os.path.join(path, MASSES_FILE),
+                np.asarray(masses, dtype=float))
+        self._write_header()
+
+        self._chunk = None  # memory map of the chunk being written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def append(self, pos: np.ndarray, vel: np.ndarray) -> None:
+        """Write the (N, 2) positions and velocities of the particles as the
+        next frame.
+        """
+        if len(pos) != self.n_particles:
+            raise ValueError(f"recording has {self.n_particles} particles, "
+                             f"not {len(pos)}")
+
+        row = self.n_frames % self.frames_per_chunk
+        if row == 0:
+            self._next_chunk()
+
+        self._chunk[X:Y + 1, row] = pos.T
+        self._chunk[VX:VY + 1, row] = vel.T
+        self.n_frames += 1
+
+    def append_manager(self, manager: ParticleManager) -> None:
+        """Write the current positions and velocities of the particles in
+        manager as the next frame.
+        """
+        self.append(manager.get_positions(), manager.get_velocities())
+
+    def close(self) -> None:
+        """Write everything out, cut the last chunk down to the frames written
+        to it, and update the header with the final number of frames.
+        """
+        chunk, self._chunk = self._chunk, None
+        if chunk is not None:
+            chunk.flush()
+
+            rows = self.n_frames % self.frames_per_chunk
+            if rows > 0:
+                trimmed = chunk.filename + '.tmp.npy'
+                np.save(trimmed, chunk[:, :rows])
+                path, chunk = chunk.filename, None  # unmap before replacing
+                os.replace(trimmed, path)
+
+        self._write_header()
+
+    def _next_chunk(self) -> None:
+        """Finish the chunk being written, and start the next one.
+        """
+        if self._chunk is not None:
+            self._chunk.flush()
+            self._write_header()
+
+        index = self.n_frames // self.frames_per_chunk
+        self._chunk = np.lib.format.open_memmap(
+            os.path.join(self.path, CHUNK_FILE.format(index)), mode='w+',
+            dtype=DTYPE, shape=(4, self.frames_per_chunk, self.n_particles)
+        )
+
+    def _write_header(self) -> None:
+        header = {
+            'version': VERSION,
+            'particles': self.n_particles,
+            'frames': self.n_frames,
+            'dt': self.dt,
+            'frames_per_chunk': self.frames_per_chunk,
+        }
+        with open(os.path.join(self.path, HEADER_FILE), 'w') as f:
+            json.dump(header, f, indent=2)
+
+
+class TrajectoryReader:
+    """Reads a recording written by TrajectoryWriter from the directory path.
+
+    Any frame can be read directly by its index, and only the chunk holding
+    it is mapped into memory.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            header = json.load(f)
+        if header['version'] > VERSION:
+            raise ValueError(f"recording is version {header['version']}, "
+                             f"but only up to version {VERSION} can be read")
+
+        self.n_particles = header['particles']
+        self.n_frames = header['frames']
+        self.dt = header['dt']
+        self.frames_per_chunk = header['frames_per_chunk']
+
+        self.radii = np.load(os.path.join(path, RADII_FILE))
+        self.masses = np.load(os.path.join(path, MASSES_FILE))
+
+        self._chunk_index = None
+        self._chunk = None
+
+    def __len__(self) -> int:
+        return self.n_frames
+
+    def get_frame(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (N, 2) positions and velocities of the particles in
+        frame k, which can be negative to count from the end.
+        """
+        if k < 0:
+            k += self.n_frames
+        if not 0 <= k < self.n_frames:
+            raise IndexError(f"frame {k} out of range for a recording of "
+                             f"{self.n_frames} frames")
+
+        chunk = self._get_chunk(k // self.frames_per_chunk)
+        row = k % self.frames_per_chunk
+
+        return (chunk[X:Y + 1, row].T.astype(float),
+                chunk[VX:VY + 1, row].T.astype(float))
+
+    def iter_chunks(self, start: int = 0, stop: int = None) -> \
+            Iterator[Tuple[int, np.ndarray]]:
+        """Yield (first frame, chunk) for every chunk holding frames from
+        start up to stop, where each chunk is a read-only (4, frames,
+        particles) memory map of x, y, vx and vy, cut down to the requested
+        frames.
+        """
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+
+        first = start
+        while first < stop:
+            index = first // self.frames_per_chunk
+            chunk_start = index * self.frames_per_chunk
+            last = min(stop, chunk_start + self.frames_per_chunk)
+
+            chunk = self._get_chunk(index)
+            yield first, chunk[:, first - chunk_start:last - chunk_start]
+            first = last
+
+    def get_trajectories(self, start: int = 0, stop: int = None,
+                         particles: np.ndarray = None) -> np.ndarray:
+        """Returns the positions of particles (by default, all of them) in
+        frames from start up to stop, as an array of shape (particles, frames,
+        2) that can be passed to Brownian_Analysis.ensemble_msd.
+        """
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        if particles is None:
+            particles = np.arange(self.n_particles)
+
+        trajectories = np.empty((len(particles), max(0, stop - start), 2))
+        for first, chunk in self.iter_chunks(start, stop):
+            frames = chunk.shape[1]
+            trajectories[:, first - start:first - start + frames] = \
+                chunk[X:Y + 1][:, :, particles].transpose(2, 1, 0)
+
+        return trajectories
+
+    def _get_chunk(self, index: int) -> np.ndarray:
+        """Returns a memory map of chunk number index, keeping only the most
+        recently used chunk mapped.
+        """
+        if index != self._chunk_index:
+            self._chunk = np.load(
+                os.path.join(self.path, CHUNK_FILE.format(index)), mmap_mode='r'
+            )
+            self._chunk_index = index
+
+        return self._chunk
+
+
+def record(simulation: Simulation, path: str, steps: int,
+           frames_per_chunk: int = None,
+           on_step: Callable[[int], None] = None) -> float:
+    """Step simulation steps times, recording the particles' starting state
+    and their state after every step to path, and return the number of
+    seconds this took.
+
+    on_step, if given, is called with the number of steps taken so far after
+    every step is recorded, e.g. to save checkpoints along the way.
+    """
+    _, _, radii, masses = simulation.manager.get_arrays()
+
+    start = time.perf_counter()
+    with TrajectoryWriter(path, radii, masses, simulation.dt,
+                          frames_per_chunk) as writer:
+        writer.append_manager(simulation.manager)
+        for done in range(1, steps + 1):
+            simulation.step()
+            # fetched again, as a DecomposedSimulation only brings its
+            # manager up to date when it's fetched
+            writer.append_manager(simulation.manager)
+            if on_step is not None:
+                on_step(done)
+
+    return time.perf_counter() - start
@@ -1,11 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import argparse
+import numpy as np
 import pygame
 import random
-from ParticleManager import ParticleManager
+import time
+from ParticleManager import ParticleManager, BOUNDARIES, ENGINES, MAX_PARTICLES
+from PhysicsWorker import PhysicsWorker
+from Profiler import Profiler
+from Simulation import Simulation
 from Button import *
+from Renderer import Renderer
+from Trajectory import TrajectoryReader
 from typing import Dict, List
-pygame.init()
 
 ################################################################################
 
@@ -14,8 +21,6 @@ pygame.init()
 # Define game window
 WIDTH = 925
 HEIGHT = 600
-WINDOW = pygame.display.set_mode((WIDTH, HEIGHT))  # set main window
-pygame.display.set_caption("Many body interactions!")  # set window name
 
 # Particle container
 CONTAINER_WIDTH = 450
@@ -28,59 +33,70 @@ CONTAINER_BORDERS = {
 }
 
 # Simulation constants
-MAX_PARTICLES = 30
 FPS = 60
 
-################################################################################
+# Units of simulated time per second, where a unit is one frame at the original
+# fixed frame rate, so particles move at the same speed whatever the frame rate
+TIME_PER_SECOND = 60
 
-# Functions
-def draw_window(manager: ParticleManager, buttons: List[Button],
-                particle_values: Dict[str, int]) -> None:
-    # create white background
-    WINDOW.fill((255, 255, 255))
+# Units of simulated time skipped by the left and right arrow keys in a replay
+REPLAY_SKIP = 5 * TIME_PER_SECOND
 
-    # create particle container
-    pygame.draw.rect(WINDOW,
-                    (0, 0, 0),
-                    (75, 75, 450, 450),
-                     2)
+################################################################################
 
-    # draw labels for buttons adjusting particle speed/size/mass, and the buttons
-    # themselves
+# Functions
+def draw_window(renderer: Renderer, manager: ParticleManager,
+                particle_values: Dict[str, int], batched: bool = False,
+                positions: np.ndarray = None,
+                overlay: List[str] = None) -> None:
+    # draw particles at their new positions, or at positions if given (e.g.
+    # interpolated between physics steps), along with the current values of
+    # particle speed/size/mass and the overlay, only redrawing what has changed
+    # drawing in a batch is much faster for thousands of particles
+    profiler = manager.profiler
+
+    if batched:
+        with profiler.timer('colors'):
+            pos, radii, speeds = manager.get_render_arrays()
+        if positions is not None:
+            pos = positions
+        with profiler.timer('draw'):
+            renderer.draw_arrays(pos, radii, speeds, particle_values, overlay)
+        return
+
+    with profiler.timer('colors'):
+        particle_info = manager.get_updated_particle_info()
+    if positions is not None:
+        particle_info = [(color, tuple(pos), r) for (color, _, r), pos in
+                         zip(particle_info, positions.tolist())]
+    with profiler.timer('draw'):
+        renderer.draw(particle_info, particle_values, overlay)
+
+
+def make_labels() -> List[Button]:
+    """Initialize labels for buttons adjusting particle speed/size/mass, and
+    return a list of all the labels.
+    """
     # reuse button to make labels, because I'm lazy
     speed_label = Button(575, 75, 100, 50, 'SPEED')
-    speed_label.draw(WINDOW, (0, 0, 0))
-
     size_label = Button(575, 175, 100, 50, 'SIZE')
-    size_label.draw(WINDOW, (0, 0, 0))
-
     mass_label = Button(575, 275, 100, 50, 'MASS')
-    mass_label.draw(WINDOW, (0, 0, 0))
 
-    # draw current values of particle speed/size/mass
-    speed_value = Button(765, 75, 50, 50, str(particle_values['SPEED']),
-                         color = (255, 255, 255), text_color= (0, 0, 0))
-    size_value = Button(765, 175, 50, 50, str(particle_values['SIZE']),
-                        color = (255, 255, 255), text_color = (0, 0, 0))
-    mass_value = Button(765, 275, 50, 50, str(particle_values['MASS']),
-                        color = (255, 255, 255), text_color = (0, 0, 0))
-    speed_value.draw(WINDOW)
-    size_value.draw(WINDOW)
-    mass_value.draw(WINDOW)
+    return [speed_label, size_label, mass_label]
 
-    # draw buttons
-    for button in buttons:
-        button.draw(WINDOW, (0, 0, 0))
 
-    # update particle velocities and positions
-    manager.update_particles()
-
-    # update positions and colors of all onscreen particles
-    new_particle_info = manager.get_updated_particle_info()
-    [pygame.draw.circle(WINDOW, p[0], p[1], p[2]) for p in new_particle_info]
+def make_value_buttons() -> Dict[str, Button]:
+    """Initialize buttons showing the current values of particle
+    speed/size/mass, and return them keyed by the property they show.
+    """
+    speed_value = Button(765, 75, 50, 50, color = (255, 255, 255),
+                         text_color = (0, 0, 0))
+    size_value = Button(765, 175, 50, 50, color = (255, 255, 255),
+                        text_color = (0, 0, 0))
+    mass_value = Button(765, 275, 50, 50, color = (255, 255, 255),
+                        text_color = (0, 0, 0))
 
-    # refresh the display
-    pygame.display.update()
+    return {'SPEED': speed_value, 'SIZE': size_value, 'MASS': mass_value}
 
 
 def make_and_get_buttons() -> List[Button]:
@@ -107,6 +123,12 @@ def clear(manager: ParticleManager) -> None:
     manager.clear()
 
 
+def random_particle_count(max_particles: int) -> int:
+    # Number of random particles to start with, from 1 to one less than
+    # max_particles, or just 1 if that's all there's room for
+    return random.randint(1, max(1, max_particles - 1))
+
+
 def random_simulation(manager: ParticleManager, n: int) -> None:
     # Regenerate n random particles to simulate
     manager.clear()
@@ -117,7 +139,8 @@ def add_particle(manager: ParticleManager, particle_values: Dict[str, int]) -> N
     """Add a new particle to the screen, with speed, size and mass specified
     by particle_values.
 
-    Do nothing if MAX_PARTICLES is already on the screen
+    Do nothing if the manager's maximum number of particles is already on the
+    screen
     """
     manager.add_particle(particle_values['SPEED'], particle_values['SIZE'],
                          particle_values['MASS'])
@@ -130,6 +153,20 @@ def remove_particle(manager: ParticleManager) -> None:
     manager.remove_particle()
 
 
+def send_action(worker: PhysicsWorker, action: str,
+                particle_values: Dict[str, int]) -> None:
+    """Ask worker to do what the button for action does, when particles are
+    simulated in a PhysicsWorker rather than in this process.
+    """
+    if action == 'RANDOM':
+        worker.send(action, random_particle_count(worker.max_particles))
+    elif action == 'ADD':
+        worker.send(action, particle_values['SPEED'], particle_values['SIZE'],
+                    particle_values['MASS'])
+    else:
+        worker.send(action)
+
+
 def adjust_particles(property: str, particle_values: Dict[str, int]) -> None:
     """Increase or decrease speed, mass or size of new particles added to screen
     by 1, by adjusting their values in the particle_values dictionary.
@@ -145,46 +182,193 @@ def adjust_particles(property: str, particle_values: Dict[str, int]) -> None:
         particle_values[value] = min(5, particle_values[value] + 1)
 
 
-def main():
+def replay(renderer: Renderer, reader: TrajectoryReader,
+           particle_values: Dict[str, int], fps: int = FPS) -> None:
+    """Play back a recording from reader in real time, instead of simulating
+    particles, until the window is closed.
+
+    Space pauses and resumes, and the left and right arrow keys skip back and
+    forward by REPLAY_SKIP units of time.
+    """
+    clock = pygame.time.Clock()
+    replay_time = 0.0
+    paused = False
+    end_time = (len(reader) - 1) * reader.dt
+
+    while True:
+        elapsed = clock.tick(fps) / 1000 * TIME_PER_SECOND
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+
+            if event.type == pygame.VIDEOEXPOSE:
+                renderer.invalidate()
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_LEFT:
+                    replay_time -= REPLAY_SKIP
+                elif event.key == pygame.K_RIGHT:
+                    replay_time += REPLAY_SKIP
+
+        if not paused:
+            replay_time += elapsed
+        replay_time = min(max(replay_time, 0), end_time)
+
+        pos, vel = reader.get_frame(int(replay_time / reader.dt))
+        renderer.draw_arrays(pos, reader.radii, np.linalg.norm(vel, axis=1),
+                             particle_values)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Many body interactions!')
+    parser.add_argument('--max-particles', type=int, default=MAX_PARTICLES,
+                        help='maximum number of particles on the screen')
+    parser.add_argument('--engine', choices=ENGINES, default='object',
+                        help='simulation engine, use array for thousands of '
+                             'particles')
+    parser.add_argument('--boundary', choices=BOUNDARIES, default='walls',
+                        help='bounce particles off the container walls, or '
+                             'wrap them around (array engine only)')
+    parser.add_argument('--batched', action='store_true',
+                        help='draw all particles at once from pre-rendered '
+                             'sprites, for thousands of particles')
+    parser.add_argument('--substeps', type=int, default=1,
+                        help='physics steps per unit of simulated time, more '
+                             'steps simulating collisions more accurately')
+    parser.add_argument('--fps', type=int, default=FPS,
+                        help='frames drawn per second')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each phase of every frame, and show the '
+                             'times on screen, toggled with the P key')
+    parser.add_argument('--replay', default=None,
+                        help='play back a recording made with Headless.py '
+                             '--record from this directory, instead of '
+                             'simulating particles')
+    parser.add_argument('--worker', action='store_true',
+                        help='simulate particles in a separate process, so the '
+                             'window stays responsive with many particles, '
+                             'always drawing particles in a batch')
+    args = parser.parse_args(argv)
+    if args.boundary == 'periodic' and args.engine != 'array':
+        parser.error('--boundary periodic needs --engine array')
+    if args.max_particles < 1:
+        parser.error('--max-particles must be at least 1')
+
+    pygame.init()
+    window = pygame.display.set_mode((WIDTH, HEIGHT))  # set main window
+    pygame.display.set_caption("Many body interactions!")  # set window name
+
     run = True
     clock = pygame.time.Clock()
-    manager = ParticleManager()
+    profiler = Profiler(enabled=args.profile)
+    manager = ParticleManager(args.engine, max_particles=args.max_particles,
+                              profiler=profiler, boundary=args.boundary)
+    simulation = Simulation(manager, dt=1 / args.substeps)
 
     # keep track of scaling factors for the speed, mass and size of new
     # particles, with the factors being from 1 - 5
     particle_values = {'SPEED': 1, 'MASS': 1, 'SIZE': 1}
     buttons = make_and_get_buttons()
+    renderer = Renderer(window, buttons, make_labels(), make_value_buttons())
 
-    # Initially have n random particles simulated on the screen, from 1 to
-    # MAX_PARTICLES - 1
-    manager.simulate_n_particles(random.randint(1, MAX_PARTICLES - 1))
-    
-    while run:
-        clock.tick(FPS)  # run while loop 60x per second consistently
+    if args.replay is not None:
+        replay(renderer, TrajectoryReader(args.replay), particle_values,
+               args.fps)
+        return
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
-                pygame.quit()
+    # simulate particles in a separate process if asked to, sending it
+    # button presses and drawing whatever it last finished simulating
+    worker = None
+    if args.worker:
+        worker = PhysicsWorker(args.engine, args.max_particles,
+                               1 / args.substeps, TIME_PER_SECOND,
+                               boundary=args.boundary)
 
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                for button in buttons:
-                    if button.isOver(pygame.mouse.get_pos()):
-                        action = button.action
-                        print(f"{action} pressed")
-                        if action == 'CLEAR':
-                            clear(manager)
-                        elif action == 'RANDOM':
-                            n = random.randint(1, MAX_PARTICLES - 1)
-                            random_simulation(manager, n)
-                        elif action == 'ADD':
-                            add_particle(manager, particle_values)
-                        elif action == 'REMOVE':
-                            remove_particle(manager)
-                        elif '-' in action or '+' in action:
-                            adjust_particles(button.action, particle_values)
-
-        draw_window(manager, buttons, particle_values)
+    # Initially have n random particles simulated on the screen, from 1 to
+    # one less than the maximum number of particles
+    if worker is not None:
+        send_action(worker, 'RANDOM', particle_values)
+    else:
+        manager.simulate_n_particles(
+            random_particle_count(manager.max_particles)
+        )
+
+    try:
+        while run:
+            # run while loop at most args.fps times per second, and find how
+            # much time has passed since the last frame
+            frame_seconds = clock.tick(args.fps) / 1000
+            elapsed = frame_seconds * TIME_PER_SECOND
+            profiler.add_time('frame', frame_seconds)
+
+            start = time.perf_counter()
+            for event in pygame.event.get():
+                if event.type == pygame.VIDEOEXPOSE:
+                    renderer.invalidate()  # window contents may have been lost
+
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                    # switch profiling on or off, removing the overlay when off
+                    profiler.enabled = not profiler.enabled
+                    profiler.reset()
+                    renderer.invalidate()
+
+                if event.type == pygame.QUIT:
+                    run = False
+                    pygame.quit()
+
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                    for button in buttons:
+                        if button.isOver(pygame.mouse.get_pos()):
+                            action = button.action
+                            print(f"{action} pressed")
+                            if '-' in action or '+' in action:
+                                adjust_particles(button.action, particle_values)
+                            elif worker is not None:
+                                send_action(worker, action, particle_values)
+                            elif action == 'CLEAR':
+                                clear(manager)
+                            elif action == 'RANDOM':
+                                n = random_particle_count(manager.max_particles)
+                                random_simulation(manager, n)
+                            elif action == 'ADD':
+                                add_particle(manager, particle_values)
+                            elif action == 'REMOVE':
+                                remove_particle(manager)
+
+                            # don't interpolate between different particles
+                            simulation.reset_interpolation()
+            profiler.add_time('events', time.perf_counter() - start)
+
+            if not run:
+                break
+
+            overlay = profiler.format_lines() if profiler.enabled else None
+
+            if worker is not None:
+                if not worker.is_alive():
+                    raise RuntimeError('physics worker stopped unexpectedly')
+
+                # draw straight from the worker's latest completed step
+                with profiler.timer('draw'), \
+                        worker.read() as (pos, radii, speeds):
+                    renderer.draw_arrays(pos, radii, speeds, particle_values,
+                                         overlay)
+                continue
+
+            # update particle velocities and positions by as many fixed steps
+            # as fit in the time since the last frame, then draw them in
+            # between the last two steps
+            with profiler.timer('physics'):
+                simulation.advance(elapsed)
+            draw_window(renderer, manager, particle_values, args.batched,
+                        simulation.get_positions(), overlay)
+    finally:
+        if worker is not None:
+            worker.stop()
 
 ################################################################################
 
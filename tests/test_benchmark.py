@@ -0,0 +1,71 @@
+import json
+import numpy as np
+import pytest
+from Benchmark import ENGINE_CONFIGS, MAX_PACKING_FRACTION, MAX_POS, \
+    MIN_POS, bench_engine, main, make_initial_conditions, summarize
+
+
+def test_initial_conditions_are_seeded():
+    first = make_initial_conditions(100, seed=4)
+    again = make_initial_conditions(100, seed=4)
+    other = make_initial_conditions(100, seed=5)
+
+    for a, b in zip(first, again):
+        np.testing.assert_array_equal(a, b)
+    assert not np.array_equal(first[0], other[0])
+
+
+def test_large_systems_are_scaled_down_to_the_packing_fraction():
+    _, _, radii, _ = make_initial_conditions(20000, seed=1)
+    _, _, few_radii, _ = make_initial_conditions(10, seed=1)
+
+    covered = np.pi * np.sum(radii ** 2) / (MAX_POS - MIN_POS) ** 2
+    assert covered == pytest.approx(MAX_PACKING_FRACTION)
+    # small systems keep the default whole-number radii
+    np.testing.assert_array_equal(few_radii, np.round(few_radii))
+
+
+def test_summarize_reports_throughput_and_percentiles():
+    summary = summarize(np.array([1.0, 2.0, 3.0, 4.0]), items=10)
+
+    assert summary['calls'] == 4
+    assert summary['mean_seconds'] == 2.5
+    assert summary['calls_per_second'] == 0.4
+    assert summary['items_per_second'] == 4.0
+    assert summary['p50_seconds'] == 2.5
+    assert summary['p99_seconds'] == pytest.approx(3.97)
+
+
+@pytest.mark.parametrize('name', list(ENGINE_CONFIGS))
+def test_every_engine_can_be_benchmarked(name):
+    result = bench_engine(name, 20, steps=3, seed=0, warmup=1)
+
+    assert result['engine'] == name
+    assert result['particles'] == 20
+    assert result['update_particles']['calls'] == 3
+    assert result['get_updated_particle_info']['calls'] == 3
+    assert result['peak_memory_bytes'] > 0
+
+
+def test_main_writes_json(tmp_path, capsys):
+    output = tmp_path / 'bench.json'
+    main(['--engines', 'object', 'array_grid', '--counts', '10', '500',
+          '--steps', '2', '--walk-steps', '100', '--walk-repeats', '2',
+          '--event-duration', '5', '--output', str(output)])
+
+    report = json.loads(output.read_text())
+    assert report['metadata']['numpy'] == np.__version__
+
+    results = report['results']
+    # the object engine isn't run with more particles than it allows
+    assert [(r['engine'], r['particles']) for r in results
+            if r['benchmark'] == 'update_particles'] == \
+        [('object', 10), ('array_grid', 10), ('array_grid', 500)]
+    assert [r['steps'] for r in results
+            if r['benchmark'] == 'brown_randwalk'] == [100]
+    for result in results:
+        if result['benchmark'] == 'event_engine':
+            assert set(result['seconds']) == {'array', 'event'}
+            assert result['duration'] == 5
+
+    assert 'event vs array' in capsys.readouterr().out
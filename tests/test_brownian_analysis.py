@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from Brownian_Analysis import ensemble_msd, fit_diffusion, msd, \
+    record_trajectories
+from Brownian_Wiener import stream_walk, wiener_walks
+from Headless import build_manager
+
+
+def naive_msd(positions, max_lag):
+    return np.array([np.mean(np.sum((positions[m:] - positions[:-m or None])
+                                    ** 2, axis=1))
+                     for m in range(max_lag + 1)])
+
+
+@pytest.fixture
+def walk():
+    return np.random.default_rng(0).standard_normal((1000, 3)).cumsum(axis=0)
+
+
+def test_msd_matches_looping_over_every_lag(walk):
+    np.testing.assert_allclose(msd(walk), naive_msd(walk, len(walk) - 1),
+                               rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('max_lag, block_size', [
+    (50, None), (50, 64), (200, 37), (5000, 100),
+])
+def test_msd_in_blocks_matches_looping_over_every_lag(walk, max_lag,
+                                                     block_size):
+    result = msd(walk, max_lag=max_lag, block_size=block_size)
+
+    lags = min(max_lag, len(walk) - 1)
+    np.testing.assert_allclose(result, naive_msd(walk, lags),
+                               rtol=1e-9, atol=1e-9)
+
+
+def test_msd_of_a_memory_mapped_walk(tmp_path):
+    path = tmp_path / 'walk.npy'
+    for _ in stream_walk(5000, chunk=700, increments='gaussian',
+                         rng=np.random.default_rng(1), path=str(path)):
+        pass
+    walk = np.load(path, mmap_mode='r')
+
+    np.testing.assert_allclose(msd(walk, max_lag=30, block_size=512),
+                               naive_msd(np.asarray(walk), 30), rtol=1e-9,
+                               atol=1e-12)
+
+
+def test_ensemble_msd_averages_every_walk():
+    walks = wiener_walks(300, walks=5, dims=2, increments='gaussian',
+                         rng=np.random.default_rng(2))
+
+    np.testing.assert_allclose(ensemble_msd(iter(walks), max_lag=40),
+                               np.mean([msd(w, 40) for w in walks], axis=0))
+    with pytest.raises(ValueError):
+        ensemble_msd([])
+
+
+def test_fit_recovers_the_diffusion_coefficient_of_wiener_walks():
+    steps = 2000
+    walks = wiener_walks(steps, walks=200, dims=3, increments='gaussian',
+                         rng=np.random.default_rng(3))
+
+    # unit variance per unit of time along each axis, so D = 1 / 2
+    diffusion, offset = fit_diffusion(ensemble_msd(walks, max_lag=100),
+                                      dims=3, dt=1 / steps)
+    assert diffusion == pytest.approx(0.5, rel=0.05)
+    assert offset == pytest.approx(0.0, abs=1e-3)
+
+
+def test_fit_of_an_exact_line():
+    diffusion, offset = fit_diffusion(4 * 0.25 * np.arange(100) + 2.0, dims=2)
+
+    assert diffusion == pytest.approx(0.25)
+    assert offset == pytest.approx(2.0)
+
+
+def test_particle_trajectories_start_from_the_current_positions():
+    manager = build_manager(20, seed=1, packing_fraction=0.1)
+    start = manager.get_positions()
+
+    trajectories = record_trajectories(manager, 10)
+
+    assert trajectories.shape == (20, 11, 2)
+    np.testing.assert_array_equal(trajectories[:, 0], start)
+    np.testing.assert_array_equal(trajectories[:, -1],
+                                  manager.get_positions())
+    assert ensemble_msd(trajectories).shape == (11,)
@@ -0,0 +1,175 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+import Brownian_Wiener
+from Brownian_Wiener import RunningStats, bin_walk, brown_randwalk, \
+    decimate_walk, draw_increments, stream_walk, wiener_walks
+
+
+def test_walks_have_one_row_per_step():
+    walks = wiener_walks(100, walks=4, dims=2, rng=np.random.default_rng(0),
+                         start=3.0)
+
+    assert walks.shape == (4, 100, 2)
+    np.testing.assert_array_equal(walks[:, 0], 3.0)
+
+
+def test_lattice_walks_step_by_minus_one_zero_or_one():
+    step = 400
+    walks = wiener_walks(step, walks=3, dims=3, increments='lattice',
+                         rng=np.random.default_rng(0))
+
+    steps = np.round(np.diff(walks, axis=1) * np.sqrt(step), 9)
+    assert set(np.unique(steps)) == {-1.0, 0.0, 1.0}
+
+
+def test_gaussian_walks_step_by_standard_normals():
+    step = 10000
+    walks = wiener_walks(step, walks=20, dims=3, increments='gaussian',
+                         rng=np.random.default_rng(0))
+
+    steps = np.diff(walks, axis=1) * np.sqrt(step)
+    assert abs(steps.mean()) < 0.01
+    assert steps.var() == pytest.approx(1.0, abs=0.01)
+    # walks in a batch are independent of each other
+    assert abs(np.corrcoef(steps[0, :, 0], steps[1, :, 0])[0, 1]) < 0.05
+
+
+def test_walks_are_reproducible_from_a_seed():
+    first = wiener_walks(50, walks=2, rng=np.random.default_rng(7))
+    again = wiener_walks(50, walks=2, rng=np.random.default_rng(7))
+    other = wiener_walks(50, walks=2, rng=np.random.default_rng(8))
+
+    np.testing.assert_array_equal(first, again)
+    assert not np.array_equal(first, other)
+
+
+def test_brown_randwalk_is_a_single_three_dimensional_walk():
+    x, y, z = brown_randwalk(200, np.random.default_rng(2))
+    walk = wiener_walks(200, walks=1, dims=3, rng=np.random.default_rng(2))[0]
+
+    for axis, positions in enumerate((x, y, z)):
+        np.testing.assert_array_equal(positions, walk[:, axis])
+
+
+def test_unknown_increments_are_rejected():
+    with pytest.raises(ValueError):
+        draw_increments(10, 'uniform')
+
+
+def test_importing_has_no_side_effects():
+    result = subprocess.run([sys.executable, '-c', 'import Brownian_Wiener'],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(Brownian_Wiener.__file__))
+
+    assert result.stdout == '' and result.stderr == ''
+
+
+def test_chunks_carry_on_from_each_other():
+    step = 1000
+    chunks = list(stream_walk(step, chunk=7, increments='gaussian',
+                              rng=np.random.default_rng(3), start=2.0))
+    whole = list(stream_walk(step, chunk=step, increments='gaussian',
+                             rng=np.random.default_rng(3), start=2.0))
+
+    assert [len(c) for c in chunks] == [7] * 142 + [6]
+    walk = np.concatenate(chunks)
+    np.testing.assert_array_equal(walk[0], 2.0)
+    # chunking the same increments differently gives the same walk
+    np.testing.assert_allclose(walk, whole[0], rtol=0, atol=1e-12)
+
+
+def test_lattice_chunks_step_by_minus_one_zero_or_one_across_chunks():
+    step = 500
+    walk = np.concatenate(list(stream_walk(step, chunk=9,
+                                           rng=np.random.default_rng(1))))
+
+    steps = np.round(np.diff(walk, axis=0) * np.sqrt(step), 9)
+    assert set(np.unique(steps)) <= {-1.0, 0.0, 1.0}
+
+
+def test_running_stats_match_the_whole_walk():
+    stats = RunningStats(start=1.0, thresholds=(0.1, 0.5, 100.0))
+    walk = np.concatenate(list(stream_walk(5000, chunk=333, dims=2,
+                                           increments='gaussian',
+                                           rng=np.random.default_rng(4),
+                                           stats=stats)))
+
+    displacement = walk - 1.0
+    distance = np.linalg.norm(displacement, axis=1)
+    assert stats.count == 5000
+    np.testing.assert_allclose(stats.mean, walk.mean(axis=0))
+    np.testing.assert_allclose(stats.variance, walk.var(axis=0))
+    np.testing.assert_allclose(stats.max_excursion,
+                               np.abs(displacement).max(axis=0))
+    assert stats.max_distance == pytest.approx(distance.max())
+    assert stats.first_passage == {
+        0.1: int(np.argmax(distance >= 0.1)),
+        0.5: int(np.argmax(distance >= 0.5)),
+        100.0: None,
+    }
+
+
+def test_streamed_walk_is_written_to_file(tmp_path):
+    path = tmp_path / 'walk.npy'
+    walk = np.concatenate(list(stream_walk(1000, chunk=64,
+                                           rng=np.random.default_rng(5),
+                                           path=str(path))))
+
+    np.testing.assert_array_equal(np.load(path), walk)
+
+
+@pytest.fixture
+def long_walk():
+    return wiener_walks(100000, dims=2, increments='gaussian',
+                        rng=np.random.default_rng(6))[0]
+
+
+def test_short_walks_are_not_decimated():
+    walk = np.arange(30.0).reshape(15, 2)
+    indices, kept = decimate_walk(walk, points=15)
+
+    np.testing.assert_array_equal(indices, np.arange(15))
+    np.testing.assert_array_equal(kept, walk)
+
+
+@pytest.mark.parametrize('chunk', [10 ** 6, 5000, 100])
+def test_decimation_keeps_the_extremes_of_every_bucket(long_walk, chunk):
+    points = 400
+    indices, kept = decimate_walk(long_walk, points=points, chunk=chunk)
+
+    assert len(kept) <= points
+    assert np.all(np.diff(indices) > 0)
+    np.testing.assert_array_equal(kept, long_walk[indices])
+
+    # 100 buckets of 1000 steps, with the lowest and highest step along each
+    # axis of every bucket kept
+    for bucket in np.split(np.arange(len(long_walk)), 100):
+        steps = long_walk[bucket]
+        for axis in range(2):
+            assert bucket[steps[:, axis].argmin()] in indices
+            assert bucket[steps[:, axis].argmax()] in indices
+
+
+def test_memory_mapped_walks_are_decimated_the_same(tmp_path, long_walk):
+    path = tmp_path / 'walk.npy'
+    np.save(path, long_walk)
+
+    for got, want in zip(decimate_walk(np.load(path, mmap_mode='r'),
+                                       points=400, chunk=3000),
+                         decimate_walk(long_walk, points=400)):
+        np.testing.assert_array_equal(got, want)
+
+
+@pytest.mark.parametrize('chunk', [10 ** 6, 777])
+def test_binning_counts_every_step(long_walk, chunk):
+    counts, edges = bin_walk(long_walk, bins=16, chunk=chunk)
+    want, _ = np.histogramdd(long_walk, bins=edges)
+
+    assert counts.shape == (16, 16) and counts.sum() == len(long_walk)
+    for axis in range(2):
+        assert edges[axis][0] == long_walk[:, axis].min()
+        assert edges[axis][-1] == pytest.approx(long_walk[:, axis].max())
+    np.testing.assert_array_equal(counts, want)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from Checkpoint import load_checkpoint, read_header, save_checkpoint
+from Headless import build_manager, main
+from Observables import Observables
+from Simulation import Simulation
+
+
+def make_simulation(engine, observables=None, **kwargs):
+    manager = build_manager(100, seed=1, packing_fraction=0.2, engine=engine,
+                            observables=observables, **kwargs)
+    return Simulation(manager, dt=0.5)
+
+
+@pytest.mark.parametrize('engine, kwargs', [
+    ('object', {}),
+    ('array', {}),
+    ('array', {'neighbor_skin': 2.0}),
+    ('array', {'boundary': 'periodic'}),
+    ('event', {}),
+])
+def test_resuming_is_the_same_as_never_stopping(tmp_path, engine, kwargs):
+    path = tmp_path / 'state.bin'
+    straight = make_simulation(engine, **kwargs)
+    straight.run(40)
+
+    stopped = make_simulation(engine, **kwargs)
+    stopped.run(20)
+    save_checkpoint(path, stopped)
+    resumed = load_checkpoint(path)
+    resumed.run(20)
+
+    assert (resumed.steps, resumed.time, resumed.dt) == (40, 20.0, 0.5)
+    for got, want in zip(resumed.manager.get_arrays(),
+                         straight.manager.get_arrays()):
+        np.testing.assert_array_equal(got, want)
+
+    # the random number generator carries on too
+    resumed.manager.simulate_n_particles(1)
+    straight.manager.simulate_n_particles(1)
+    np.testing.assert_array_equal(resumed.manager.get_positions(),
+                                  straight.manager.get_positions())
+
+
+def test_observables_carry_on_with_their_time_series(tmp_path):
+    path = tmp_path / 'state.bin'
+    straight = make_simulation('array', Observables(sample_every=5))
+    straight.run(40)
+
+    stopped = make_simulation('array', Observables(sample_every=5))
+    stopped.run(20)
+    save_checkpoint(path, stopped)
+    resumed = load_checkpoint(path)
+    resumed.run(20)
+
+    observables = resumed.manager.observables
+    assert observables.steps == 40
+    got = observables.get_time_series()
+    want = straight.manager.observables.get_time_series()
+    assert len(got['time']) == 8
+    np.testing.assert_array_equal(got['time'], want['time'])
+    np.testing.assert_array_equal(got['pressure'], want['pressure'])
+    # totals are computed again from the particles, up to rounding
+    np.testing.assert_allclose(got['kinetic_energy'], want['kinetic_energy'],
+                               rtol=1e-12)
+
+
+def test_header_can_be_read_on_its_own(tmp_path):
+    path = tmp_path / 'state.bin'
+    simulation = make_simulation('event')
+    simulation.run(3)
+    save_checkpoint(path, simulation)
+
+    header = read_header(path)
+    assert header['engine'] == 'event' and header['steps'] == 3
+    assert header['observables'] is None
+    assert 'event_queue' in header['arrays']
+
+
+def test_corrupted_checkpoints_are_rejected(tmp_path):
+    path = tmp_path / 'state.bin'
+    save_checkpoint(path, make_simulation('array'))
+
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xff
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match='corrupted'):
+        load_checkpoint(path)
+
+    path.write_bytes(b'not a checkpoint')
+    with pytest.raises(ValueError, match='not a checkpoint'):
+        load_checkpoint(path)
+
+
+def test_headless_resumes_up_to_the_total_steps(tmp_path, capsys):
+    path = str(tmp_path / 'state.bin')
+    main(['-n', '20', '--steps', '5', '--seed', '1', '--checkpoint', path])
+    main(['--resume', path, '--steps', '12', '--checkpoint', path])
+
+    assert read_header(path)['steps'] == 12
+    assert '20 particles, 7 steps' in capsys.readouterr().out
@@ -0,0 +1,40 @@
+import numpy as np
+from DomainDecomposition import DecomposedSimulation
+from Headless import build_manager
+from Simulation import Simulation
+
+
+def test_decomposed_steps_match_array_engine():
+    manager = build_manager(300, seed=1, packing_fraction=0.2,
+                            temperature=50.0)
+    expected = build_manager(300, seed=1, packing_fraction=0.2,
+                             temperature=50.0)
+    Simulation(expected).run(20)
+
+    with DecomposedSimulation(manager, 2) as simulation:
+        simulation.run(10)
+        for _ in range(10):
+            simulation.step()
+
+    for got, want in zip(manager.get_arrays(), expected.get_arrays()):
+        assert np.array_equal(got, want)
+
+
+def test_manager_is_only_synced_when_fetched(monkeypatch):
+    manager = build_manager(100, seed=1, packing_fraction=0.2)
+    synced = []
+    set_particles = manager.set_particles
+    monkeypatch.setattr(manager, 'set_particles',
+                        lambda *arrays: synced.append(set_particles(*arrays)))
+
+    with DecomposedSimulation(manager, 2) as simulation:
+        for _ in range(5):
+            simulation.step()
+        simulation.run(5)
+        assert synced == []
+
+        simulation.manager
+        simulation.manager
+        assert len(synced) == 1
+
+    assert len(synced) == 1
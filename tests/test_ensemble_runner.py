@@ -0,0 +1,22 @@
+import numpy as np
+from EnsembleRunner import EnsembleRunner, run_particle_box
+
+
+def test_particle_box_simulates_every_added_particle():
+    result = run_particle_box({'particles': 50, 'speed': 1, 'steps': 40, 'max_lag': 12},
+                              np.random.SeedSequence(1))
+    assert result['particles'] == 50
+
+
+def test_particle_box_simulates_every_random_particle():
+    result = run_particle_box({'particles': 50, 'steps': 40, 'max_lag': 12},
+                              np.random.SeedSequence(1))
+    assert result['particles'] == 50
+
+
+def test_ensemble_is_reproducible():
+    runs = [{'particles': 40, 'speed': 2, 'steps': 40, 'max_lag': 12}] * 2
+    first = EnsembleRunner(run_particle_box, processes=1, seed=3).run(runs)
+    second = EnsembleRunner(run_particle_box, processes=1, seed=3).run(runs)
+    assert first == second
+    assert first[0]['particles_mean'] == 40
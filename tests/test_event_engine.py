@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from EventDrivenEngine import EventDrivenEngine
+from Headless import build_manager
+from Particle import X_LIMITS, Y_LIMITS, MIN_DIST
+
+
+def dense_box():
+    return build_manager(300, seed=5, packing_fraction=0.3,
+                         temperature=100.0).get_arrays()
+
+
+def test_collisions_conserve_energy_and_momentum():
+    pos, vel, radii, masses = dense_box()
+    engine = EventDrivenEngine(pos, vel, radii, masses)
+    energy = 0.5 * np.sum(masses * np.sum(vel ** 2, axis=1))
+
+    for _ in range(500):
+        # walls don't conserve momentum, so only check it across collisions
+        momentum, n_bounces = masses @ engine.vel, engine.n_wall_bounces
+        engine.advance_events(1)
+        if engine.n_wall_bounces == n_bounces:
+            np.testing.assert_allclose(masses @ engine.vel, momentum,
+                                       rtol=0, atol=1e-8)
+
+    assert engine.n_collisions > 0
+    assert 0.5 * np.sum(masses * np.sum(engine.vel ** 2, axis=1)) == \
+        pytest.approx(energy, rel=1e-9)
+
+
+def test_particles_never_overlap_or_leave_the_container():
+    pos, vel, radii, masses = dense_box()
+    engine = EventDrivenEngine(pos, vel, radii, masses)
+
+    for t in np.linspace(0.5, 30.0, 60):
+        pos, _ = engine.state_at(t)
+
+        gaps = np.linalg.norm(pos[:, None] - pos[None], axis=2) \
+            - (radii[:, None] + radii[None])
+        np.fill_diagonal(gaps, np.inf)
+        assert gaps.min() > MIN_DIST - 1e-6
+        assert np.all(pos - radii[:, None] >= [X_LIMITS[0], Y_LIMITS[0]])
+        assert np.all(pos + radii[:, None] <= [X_LIMITS[1], Y_LIMITS[1]])
+
+    assert engine.n_collisions > 0 and engine.n_wall_bounces > 0
+
+
+def test_head_on_collision_swaps_equal_velocities():
+    pos = np.array([[300.0, 300.0], [400.0, 300.0]])
+    vel = np.array([[5.0, 0.0], [-5.0, 0.0]])
+    engine = EventDrivenEngine(pos, vel, np.full(2, 10.0), np.full(2, 3.0))
+
+    # the gap of 80 - MIN_DIST closes at 10 per unit of time
+    engine.advance_to(10.0)
+    assert engine.n_collisions == 1
+    np.testing.assert_allclose(engine.vel, vel[::-1])
+
+    hit = (80.0 - MIN_DIST) / 10.0
+    np.testing.assert_allclose(engine.get_positions(),
+                               pos + vel * hit - vel * (10.0 - hit))
+
+
+def test_advancing_in_pieces_is_the_same_as_all_at_once():
+    arrays = dense_box()
+    whole = EventDrivenEngine(*arrays)
+    pieces = EventDrivenEngine(*arrays)
+
+    whole.advance_to(20.0)
+    for t in np.arange(1.0, 21.0):
+        pieces.advance_to(t)
+
+    np.testing.assert_allclose(pieces.get_positions(), whole.get_positions(),
+                               rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(pieces.vel, whole.vel)
+    assert pieces.n_collisions == whole.n_collisions
+
+
+def test_cannot_go_back_in_time():
+    engine = EventDrivenEngine(*dense_box())
+    engine.advance_to(2.0)
+    with pytest.raises(ValueError):
+        engine.advance_to(1.0)
@@ -0,0 +1,37 @@
+import pytest
+from Headless import build_manager, main
+
+
+def test_added_particles_are_not_capped():
+    manager = build_manager(50, seed=1, speed=2, engine='array')
+    assert manager.get_num_particles() == 50
+
+
+def test_added_particles_are_not_capped_with_object_engine():
+    manager = build_manager(40, seed=1, size=1, engine='object')
+    assert manager.get_num_particles() == 40
+
+
+def test_main_runs_requested_particles(capsys):
+    main(['-n', '45', '--speed', '2', '--steps', '2', '--seed', '1'])
+    assert capsys.readouterr().out.startswith('45 particles')
+
+
+def test_checkpoints_are_saved_while_recording(tmp_path, monkeypatch):
+    import Headless
+    saved = []
+    monkeypatch.setattr(Headless, 'save_checkpoint',
+                        lambda path, simulation: saved.append(simulation.steps))
+
+    main(['-n', '10', '--steps', '7', '--seed', '1',
+          '--record', str(tmp_path / 'run'),
+          '--checkpoint', str(tmp_path / 'state.bin'),
+          '--checkpoint-every', '3'])
+
+    assert saved == [3, 6, 7]
+
+
+def test_periodic_boundary_needs_array_engine(capsys):
+    with pytest.raises(SystemExit):
+        main(['-n', '5', '--engine', 'object', '--boundary', 'periodic'])
+    assert '--boundary periodic needs --engine array' in capsys.readouterr().err
@@ -0,0 +1,21 @@
+import pytest
+from main import main, random_particle_count
+
+
+@pytest.mark.parametrize('engine', ['object', 'event'])
+def test_periodic_boundary_needs_array_engine(engine, capsys):
+    with pytest.raises(SystemExit):
+        main(['--engine', engine, '--boundary', 'periodic'])
+    assert '--boundary periodic needs --engine array' in capsys.readouterr().err
+
+
+def test_random_particle_count_fits_the_limit():
+    assert random_particle_count(1) == 1
+    assert random_particle_count(2) == 1
+    assert {random_particle_count(4) for _ in range(200)} == {1, 2, 3}
+
+
+def test_max_particles_must_be_positive(capsys):
+    with pytest.raises(SystemExit):
+        main(['--max-particles', '0'])
+    assert '--max-particles must be at least 1' in capsys.readouterr().err
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import ParticleArrays
+from Headless import build_manager
+from NeighborList import NeighborList, suggest_skin
+from Particle import MIN_DIST
+from ParticleManager import ParticleManager
+from Tracer import build_bath
+
+
+def run(arrays, steps, **kwargs):
+    manager = ParticleManager('array', max_particles=len(arrays[0]), **kwargs)
+    manager.set_particles(*arrays)
+    for _ in range(steps):
+        manager.update_particles()
+    return manager
+
+
+@pytest.mark.parametrize('boundary', ['walls', 'periodic'])
+def test_neighbor_list_matches_grid(boundary):
+    arrays = build_manager(1000, seed=2, packing_fraction=0.3,
+                           temperature=20.0).get_arrays()
+    skin = suggest_skin(arrays[1])
+
+    grid = run(arrays, 60, boundary=boundary)
+    listed = run(arrays, 60, boundary=boundary, neighbor_skin=skin)
+
+    for got, want in zip(listed.get_arrays(), grid.get_arrays()):
+        assert np.array_equal(got, want)
+    assert listed.neighbor_list.refresh_count > 0
+    assert listed.neighbor_list.rebuild_count < 60
+
+
+def test_neighbor_list_matches_grid_around_tracer():
+    arrays = build_bath(2000, seed=1).get_arrays()
+
+    grid = run(arrays, 40, boundary='periodic')
+    listed = run(arrays, 40, boundary='periodic',
+                 neighbor_skin=suggest_skin(arrays[1]))
+
+    for got, want in zip(listed.get_arrays(), grid.get_arrays()):
+        assert np.array_equal(got, want)
+
+
+@pytest.mark.parametrize('periodic', [False, True])
+def test_grid_neighbor_pairs_finds_every_nearby_pair(periodic):
+    rng = np.random.default_rng(3)
+    pos, _, radii, _ = build_bath(1500, seed=3).get_arrays()
+    radii[1] = radii[0]  # a second large particle
+    which = rng.choice(len(pos), size=200, replace=False)
+    which = np.union1d(which, [0])
+    margin = 3.0
+
+    i, j = ParticleArrays.grid_neighbor_pairs(pos, radii, which, margin,
+                                              periodic)
+    assert np.all(i < j)
+    found = set(zip(i.tolist(), j.tolist()))
+    assert len(found) == len(i)
+
+    all_i, all_j = ParticleArrays.all_pairs(len(pos))
+    diff = ParticleArrays.separation(pos, all_i, all_j, periodic)
+    near = np.linalg.norm(diff, axis=1) <= \
+        radii[all_i] + radii[all_j] + MIN_DIST + margin
+    involved = np.isin(all_i, which) | np.isin(all_j, which)
+    expected = set(zip(all_i[near & involved].tolist(),
+                       all_j[near & involved].tolist()))
+    assert expected <= found
+
+
+def test_skin_must_be_positive():
+    with pytest.raises(ValueError):
+        NeighborList(0)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from Headless import build_manager
+from Observables import Observables
+from Particle import Particle, X_LIMITS, Y_LIMITS
+from ParticleManager import COLOR
+from Simulation import Simulation
+
+AREA = (X_LIMITS[1] - X_LIMITS[0]) * (Y_LIMITS[1] - Y_LIMITS[0])
+
+
+@pytest.mark.parametrize('engine', ['array', 'object', 'event'])
+def test_dilute_gas_pressure_is_ideal(engine):
+    n, steps = 40, 500
+    observables = Observables(sample_every=steps)
+    manager = build_manager(n, seed=1, packing_fraction=0.02,
+                            temperature=100.0, observables=observables,
+                            engine=engine)
+    simulation = Simulation(manager)
+    for _ in range(steps):
+        simulation.step()
+
+    series = observables.get_time_series()
+    pressure, temperature = series['pressure'][-1], series['temperature'][-1]
+    assert pressure * AREA == pytest.approx(n * temperature, rel=0.15)
+
+
+@pytest.mark.parametrize('engine', ['array', 'object', 'event'])
+def test_totals_match_the_particles(engine):
+    observables = Observables()
+    manager = build_manager(150, seed=2, packing_fraction=0.3,
+                            temperature=50.0, observables=observables,
+                            engine=engine)
+    Simulation(manager).run(50)
+
+    totals = (observables.kinetic_energy, observables.momentum.copy(),
+              observables.speed_counts.copy())
+    _, vel, _, masses = manager.get_arrays()
+    observables.resync(vel, masses)
+
+    assert totals[0] == pytest.approx(observables.kinetic_energy, rel=1e-12)
+    np.testing.assert_allclose(totals[1], observables.momentum, atol=1e-9)
+    np.testing.assert_array_equal(totals[2], observables.speed_counts)
+
+
+def test_object_engine_only_passes_on_touched_particles(monkeypatch):
+    observables = Observables()
+    manager = build_manager(60, seed=3, packing_fraction=0.05,
+                            observables=observables, engine='object')
+    passed = []
+    monkeypatch.setattr(observables, 'add_collisions',
+                        lambda vel, indices=None: passed.append(indices))
+
+    Simulation(manager).run(20)
+
+    assert all(indices is not None for indices in passed)
+    assert 0 < sum(map(len, passed)) < 60 * 20
+
+
+def test_particles_report_changed_velocities():
+    still = Particle(np.array([0.0, 0.0]), np.array([300.0, 300.0]), 10, 12,
+                     COLOR)
+    moving = Particle(np.array([-5.0, 0.0]), np.array([322.0, 300.0]), 10, 12,
+                      COLOR)
+    bouncing = Particle(np.array([-5.0, 1.0]), np.array([X_LIMITS[0] + 12.0,
+                                                         200.0]), 10, 12,
+                        COLOR)
+
+    touched = []
+    moving.update_position([still, bouncing], touched=touched)
+    bouncing.update_position([still, moving], touched=touched)
+    assert touched == [still, moving, bouncing]
+
+    # nothing changes once they're moving apart
+    touched = []
+    for p in (still, moving):
+        p.update_position([still, moving], touched=touched)
+    assert touched == []
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from Headless import build_manager
+from ParticleManager import RED_PER_SPEED, ParticleManager
+
+
+def run_engine(engine, arrays, steps, **kwargs):
+    manager = ParticleManager(engine, max_particles=len(arrays[0]), **kwargs)
+    manager.set_particles(*arrays)
+    for _ in range(steps):
+        manager.update_particles()
+    return manager.get_arrays()
+
+
+def kinetic_energy(vel, masses):
+    return 0.5 * np.sum(masses * np.sum(vel ** 2, axis=1))
+
+
+@pytest.mark.parametrize('pos, vel', [
+    # particles bouncing around the walls on their own, including straight
+    # at a wall
+    ([[300.0, 200.0]], [[7.0, 3.0]]),
+    ([[300.0, 200.0]], [[0.0, -6.0]]),
+    # particles running into one standing still, head-on and obliquely
+    # the object engine moves particles one at a time, so moving particles
+    # come after the one they hit, or the collision is seen a frame sooner
+    ([[300.0, 300.0], [450.0, 300.0]], [[0.0, 0.0], [-5.0, 0.0]]),
+    ([[300.0, 300.0], [450.0, 315.0]], [[0.0, 0.0], [-5.0, -0.5]]),
+])
+def test_array_engine_moves_particles_like_objects(pos, vel):
+    n = len(pos)
+    arrays = (np.array(pos), np.array(vel), np.full(n, 15.0),
+              np.arange(12.0, 12.0 + n))
+
+    objects = run_engine('object', arrays, 60)
+    array = run_engine('array', arrays, 60)
+
+    for got, want in zip(array, objects):
+        np.testing.assert_allclose(got, want, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('engine', ['object', 'array', 'event'])
+def test_dense_box_conserves_energy(engine):
+    arrays = build_manager(200, seed=3, packing_fraction=0.4,
+                           temperature=100.0).get_arrays()
+    _, vel, _, masses = run_engine(engine, arrays, 100)
+
+    assert kinetic_energy(vel, masses) == \
+        pytest.approx(kinetic_energy(arrays[1], masses), rel=1e-9)
+
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_render_arrays_match_particle_info(engine):
+    manager = build_manager(50, seed=2, engine=engine)
+    pos, radii, speeds = manager.get_render_arrays()
+
+    info = manager.get_updated_particle_info()
+    np.testing.assert_allclose(pos, [p for _, p, _ in info])
+    np.testing.assert_allclose(radii, [r for _, _, r in info])
+    np.testing.assert_allclose(np.clip(RED_PER_SPEED * speeds, 0, 255),
+                               [color[0] for color, _, _ in info])
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_particles_are_capped_at_max_particles(engine):
+    manager = ParticleManager(engine, max_particles=1000,
+                              rng=np.random.default_rng(0))
+    for _ in range(1005):
+        manager.add_particle(1, 1, 1)
+
+    assert manager.get_num_particles() == 1000
@@ -0,0 +1,79 @@
+import time
+from contextlib import nullcontext
+import numpy as np
+import pytest
+from Headless import build_manager
+from ParticleManager import ParticleManager
+from PhysicsWorker import COLUMNS, COUNTS, FRONT, HEADER_SIZE, STEPS, \
+    PhysicsWorker, _apply_command, _publish
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out waiting for the worker'
+        time.sleep(0.01)
+
+
+def test_publishing_fills_the_back_buffer_then_swaps():
+    manager = build_manager(5, seed=1)
+    header = np.zeros(HEADER_SIZE, dtype=np.int64)
+    buffers = np.zeros((2, 10, COLUMNS))
+
+    _publish(manager, header, buffers, nullcontext(), n_steps=3)
+
+    assert header[FRONT] == 1 and header[COUNTS + 1] == 5
+    assert header[STEPS] == 3
+    pos, radii, speeds = manager.get_render_arrays()
+    np.testing.assert_array_equal(buffers[1, :5],
+                                  np.column_stack([pos, radii, speeds]))
+
+    # the next step goes into the other buffer
+    _publish(manager, header, buffers, nullcontext(), n_steps=1)
+    assert header[FRONT] == 0 and header[STEPS] == 4
+
+
+def test_commands_do_what_the_buttons_do():
+    manager = ParticleManager('array', max_particles=50,
+                              rng=np.random.default_rng(0))
+
+    _apply_command(manager, 'RANDOM', (20,))
+    assert manager.get_num_particles() == 20
+    _apply_command(manager, 'ADD', (1, 1, 1))
+    _apply_command(manager, 'REMOVE', ())
+    _apply_command(manager, 'REMOVE', ())
+    assert manager.get_num_particles() == 19
+    _apply_command(manager, 'CLEAR', ())
+    assert manager.get_num_particles() == 0
+
+    with pytest.raises(ValueError):
+        _apply_command(manager, 'EXPLODE', ())
+
+
+def test_worker_simulates_in_the_background():
+    worker = PhysicsWorker('array', max_particles=100, seed=1,
+                           time_per_second=600)
+    try:
+        worker.send('RANDOM', 30)
+
+        def count():
+            with worker.read() as (pos, _, _):
+                return len(pos)
+
+        wait_for(lambda: count() == 30)
+        with worker.read() as (pos, _, _):
+            start = pos.copy()
+
+        steps = worker.get_steps()
+        wait_for(lambda: worker.get_steps() > steps + 5)
+        with worker.read() as (pos, radii, speeds):
+            assert not np.array_equal(pos, start)
+            assert np.all(radii > 0) and np.all(speeds >= 0)
+
+        worker.send('CLEAR')
+        wait_for(lambda: count() == 0)
+        assert worker.is_alive()
+    finally:
+        worker.stop()
+
+    assert not worker.is_alive()
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import ParticleArrays
+from Headless import build_manager
+from Particle import MIN_DIST, X_LIMITS, Y_LIMITS
+from Placement import get_packing_fraction, place_disks, scale_radii
+
+
+def assert_no_overlaps(pos, radii):
+    i, j = ParticleArrays.grid_pairs(pos, radii, 0.0, False)
+    dist = np.linalg.norm(pos[i] - pos[j], axis=1)
+    assert np.all(dist > radii[i] + radii[j])
+
+    assert np.all(pos - radii[:, None] > (X_LIMITS[0], Y_LIMITS[0]))
+    assert np.all(pos + radii[:, None] < (X_LIMITS[1], Y_LIMITS[1]))
+
+
+@pytest.mark.parametrize('n, packing_fraction', [
+    (1000, 0.5), (1000, 0.7), (3000, 0.4), (5000, 0.3), (10000, 0.2),
+    (20000, 0.1), (20000, 0.7), (50000, 0.7)
+])
+def test_dense_placement_has_no_overlaps(n, packing_fraction):
+    rng = np.random.default_rng(1)
+    radii = scale_radii(rng.integers(12, 21, size=n).astype(float),
+                        packing_fraction)
+    pos = place_disks(radii, rng)
+
+    assert get_packing_fraction(radii) == pytest.approx(packing_fraction)
+    assert_no_overlaps(pos, radii)
+
+
+@pytest.mark.parametrize('n, packing_fraction', [
+    (30, 0.3), (1000, 0.3), (1000, 0.5)
+])
+def test_placement_keeps_min_dist_if_it_fits(n, packing_fraction):
+    rng = np.random.default_rng(1)
+    radii = scale_radii(rng.integers(12, 21, size=n).astype(float),
+                        packing_fraction)
+    pos = place_disks(radii, rng)
+
+    i, j = ParticleArrays.grid_pairs(pos, radii, 0.0, False)
+    gaps = np.linalg.norm(pos[i] - pos[j], axis=1) - radii[i] - radii[j]
+    assert np.all(gaps >= MIN_DIST)
+
+
+def test_headless_packing_fraction():
+    manager = build_manager(20000, seed=1, packing_fraction=0.7,
+                            engine='array')
+    pos, _, radii, _ = manager.get_arrays()
+
+    assert manager.get_num_particles() == 20000
+    assert_no_overlaps(pos, radii)
@@ -0,0 +1,19 @@
+import csv
+from Profiler import Profiler
+
+
+def test_csv_tells_timers_and_counters_apart(tmp_path):
+    profiler = Profiler()
+    with profiler.timer('collisions'):
+        pass
+    profiler.count('collisions', 7)
+
+    path = tmp_path / 'profile.csv'
+    profiler.to_csv(str(path))
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    assert [(row['kind'], row['name']) for row in rows] == \
+        [('timer', 'collisions'), ('counter', 'collisions')]
+    assert rows[0]['calls'] == '1' and rows[0]['count'] == ''
+    assert rows[1]['count'] == '7' and rows[1]['calls'] == ''
@@ -0,0 +1,131 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+import pytest
+from Button import Button
+from Renderer import COLOR_BUCKETS, CONTAINER_RECT, Renderer
+from main import WIDTH, HEIGHT, make_and_get_buttons, make_labels, \
+    make_value_buttons
+
+VALUES = {'SPEED': 1, 'MASS': 1, 'SIZE': 1}
+
+
+@pytest.fixture(scope='module', autouse=True)
+def window():
+    # pygame isn't quit in between tests, as Button keeps its fonts
+    pygame.init()
+    return pygame.display.set_mode((WIDTH, HEIGHT))
+
+
+@pytest.fixture
+def renderer(window, monkeypatch):
+    renderer = Renderer(window, make_and_get_buttons(), make_labels(),
+                        make_value_buttons())
+    # record what's pushed to the display each frame
+    renderer.updates = []
+    monkeypatch.setattr(pygame.display, 'update',
+                        lambda *rects: renderer.updates.append(rects))
+
+    return renderer
+
+
+def particle(pos, r=10):
+    return ((0, 0, 255), pos, r)
+
+
+def test_fonts_and_text_are_only_rendered_once():
+    assert Button.get_font() is Button.get_font()
+
+    window = pygame.Surface((200, 200))
+    button = Button(0, 0, 50, 50, '1')
+    button.draw(window)
+    rendered = button._text_surface
+
+    button.draw(window)
+    assert button._text_surface is rendered
+
+    button.text = '2'
+    button.draw(window)
+    assert button._text_surface is not rendered
+
+
+def test_only_changed_areas_are_updated(renderer):
+    renderer.draw([particle((200, 200))], VALUES)
+    assert renderer.updates.pop() == ()  # first frame updates everything
+
+    renderer.draw([particle((210, 200))], VALUES)
+    rects = renderer.updates.pop()[0]
+    assert rects == [pygame.Rect(190, 190, 20, 20),
+                     pygame.Rect(200, 190, 20, 20)]
+
+    # nothing to update once the particles are gone and the values are the same
+    renderer.draw([], VALUES)
+    assert renderer.updates.pop()[0] == [pygame.Rect(200, 190, 20, 20)]
+    renderer.draw([], VALUES)
+    assert renderer.updates == []
+
+    renderer.draw([], dict(VALUES, SPEED=2))
+    assert renderer.updates.pop()[0] == \
+        [renderer.values['SPEED'].get_rect()]
+
+
+def test_particles_are_erased_from_the_background(renderer):
+    renderer.draw([particle((200, 200)), particle((300, 300), 20)], VALUES)
+    renderer.draw([], VALUES)
+
+    container = pygame.Rect(CONTAINER_RECT)
+    assert pygame.image.tostring(renderer.window.subsurface(container),
+                                 'RGB') == \
+        pygame.image.tostring(renderer.background.subsurface(container), 'RGB')
+
+
+def test_invalidate_redraws_the_whole_window(renderer):
+    renderer.draw([particle((200, 200))], VALUES)
+    renderer.window.fill((0, 0, 0))
+
+    renderer.invalidate()
+    renderer.draw([], VALUES)
+
+    assert renderer.updates.pop() == ()
+    assert renderer.window.get_at((5, 5)) == renderer.background.get_at((5, 5))
+
+
+def test_batched_particles_are_shaded_by_speed(renderer):
+    pos = np.array([[200.0, 200.0], [300.0, 300.0]])
+    radii = np.array([10.0, 5.0])
+    speeds = np.array([0.0, 100.0])
+
+    renderer.draw_arrays(pos, radii, speeds, VALUES)
+
+    assert renderer.window.get_at((200, 200))[:3] == (0, 0, 255)
+    assert renderer.window.get_at((300, 300))[:3] == (255, 0, 255)
+    # the corners of sprites are see-through
+    assert renderer.window.get_at((191, 191)) == \
+        renderer.background.get_at((191, 191))
+
+
+def test_sprites_are_drawn_once_per_radius_and_shade(renderer):
+    rng = np.random.default_rng(0)
+    n = 1000
+    pos = rng.uniform(100, 500, size=(n, 2))
+    radii = rng.choice([2.0, 3.0], size=n)
+    speeds = rng.choice([0.0, 100.0], size=n)
+
+    renderer.draw_arrays(pos, radii, speeds, VALUES)
+    renderer.draw_arrays(pos + 1, radii, speeds, VALUES)
+
+    assert set(renderer._sprites) == {(2, 0), (3, 0), (2, COLOR_BUCKETS - 1),
+                                      (3, COLOR_BUCKETS - 1)}
+    # too many particles moved to update each one separately
+    assert len(renderer.updates.pop()) == 1
+
+
+def test_batched_frames_are_erased_like_single_ones(renderer):
+    renderer.draw_arrays(np.array([[200.0, 200.0]]), np.array([10.0]),
+                         np.array([1.0]), VALUES)
+    renderer.draw([], VALUES)
+
+    assert renderer.window.get_at((200, 200)) == \
+        renderer.background.get_at((200, 200))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from ParticleManager import ParticleManager
+from Simulation import Simulation
+
+
+def single_particle(pos=(300.0, 300.0), vel=(2.0, 1.0), **kwargs):
+    manager = ParticleManager('array', max_particles=1, **kwargs)
+    manager.set_particles(np.array([pos]), np.array([vel]), np.array([10.0]),
+                          np.array([12.0]))
+    return manager
+
+
+def test_advance_takes_as_many_steps_as_fit():
+    simulation = Simulation(single_particle(), dt=0.25)
+
+    assert simulation.advance(0.6) == 2
+    assert simulation.get_interpolation() == pytest.approx(0.4)
+    # the leftover time is carried over to the next call
+    assert simulation.advance(0.2) == 1
+    assert simulation.steps == 3
+    assert simulation.time == pytest.approx(0.75)
+
+
+def test_physics_time_does_not_depend_on_the_frame_rate():
+    slow = Simulation(single_particle(), dt=0.5)
+    fast = Simulation(single_particle(), dt=0.5)
+
+    for _ in range(10):
+        slow.advance(3.0)
+    for _ in range(60):
+        fast.advance(0.5)
+
+    np.testing.assert_allclose(slow.manager.get_positions(),
+                               fast.manager.get_positions())
+
+
+def test_catching_up_is_capped():
+    simulation = Simulation(single_particle(), dt=0.5, max_catch_up=2.0)
+
+    assert simulation.advance(100.0) == 4
+    # the time that didn't fit is dropped
+    assert simulation.get_interpolation() == 0
+    assert simulation.advance(0.4) == 0
+
+
+def test_positions_are_interpolated_between_steps():
+    simulation = Simulation(single_particle(), dt=1.0)
+
+    # drawn a quarter of the way through the one step taken
+    simulation.advance(1.25)
+    np.testing.assert_allclose(simulation.get_positions(), [[300.5, 300.25]])
+
+    simulation.reset_interpolation()
+    np.testing.assert_allclose(simulation.get_positions(), [[302.0, 301.0]])
+
+
+def test_periodic_positions_are_interpolated_the_short_way():
+    simulation = Simulation(single_particle(pos=(524.0, 300.0),
+                                            vel=(4.0, 0.0),
+                                            boundary='periodic'), dt=1.0)
+
+    simulation.advance(1.5)
+    # the particle wrapped around from 524 to 78, and is drawn halfway,
+    # just past the edge
+    np.testing.assert_allclose(simulation.get_positions(), [[76.0, 300.0]])
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import ParticleArrays
+from Headless import build_manager
+from ParticleManager import ParticleManager
+from SpatialGrid import SpatialGrid
+
+
+def colliding(pos, vel, radii, i, j, periodic=False):
+    i, j = ParticleArrays.find_colliding_pairs(pos, vel, radii, i, j, periodic)
+    return set(zip(i.tolist(), j.tolist()))
+
+
+@pytest.mark.parametrize('periodic', [False, True])
+@pytest.mark.parametrize('n, packing_fraction', [(50, 0.5), (2000, 0.3)])
+def test_grid_finds_every_colliding_pair(n, packing_fraction, periodic):
+    rng = np.random.default_rng(n)
+    manager = build_manager(n, seed=n, packing_fraction=packing_fraction)
+    pos, _, radii, _ = manager.get_arrays()
+    # jostle particles so plenty of them touch
+    pos += rng.normal(0, radii.mean() / 4, size=pos.shape)
+    vel = rng.normal(0, 1, size=pos.shape)
+
+    i, j = ParticleArrays.grid_pairs(pos, radii, periodic=periodic)
+    assert np.all(i < j)
+    assert len(set(zip(i.tolist(), j.tolist()))) == len(i)
+
+    expected = colliding(pos, vel, radii, *ParticleArrays.all_pairs(n),
+                         periodic)
+    assert len(expected) > 0
+    assert colliding(pos, vel, radii, i, j, periodic) == expected
+
+
+def test_candidate_pairs_cover_every_nearby_pair():
+    rng = np.random.default_rng(1)
+    pos = rng.uniform(75, 525, size=(500, 2))
+    grid = SpatialGrid(30.0)
+
+    i, j = grid.candidate_pairs(pos)
+    found = set(zip(i.tolist(), j.tolist()))
+
+    all_i, all_j = ParticleArrays.all_pairs(len(pos))
+    near = np.linalg.norm(pos[all_i] - pos[all_j], axis=1) <= 30.0
+    assert set(zip(all_i[near].tolist(), all_j[near].tolist())) <= found
+
+
+def test_array_engine_is_the_same_with_all_pairs():
+    arrays = build_manager(100, seed=4, packing_fraction=0.3,
+                           temperature=100.0).get_arrays()
+
+    results = []
+    for broad_phase in ('grid', 'all_pairs'):
+        manager = ParticleManager('array', broad_phase, max_particles=100)
+        manager.set_particles(*arrays)
+        for _ in range(50):
+            manager.update_particles()
+        results.append(manager.get_arrays())
+
+    for got, want in zip(*results):
+        assert np.array_equal(got, want)
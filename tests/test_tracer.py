@@ -0,0 +1,24 @@
+import numpy as np
+from DomainDecomposition import DecomposedSimulation
+from Simulation import Simulation
+from Tracer import build_bath, record_tracer
+
+
+def test_decomposed_tracer_matches_and_syncs_once(tmp_path, monkeypatch):
+    expected = build_bath(300, seed=1, boundary='walls')
+    record_tracer(Simulation(expected), tmp_path / 'expected.npy', 20)
+
+    manager = build_bath(300, seed=1, boundary='walls')
+    synced = []
+    set_particles = manager.set_particles
+    monkeypatch.setattr(manager, 'set_particles',
+                        lambda *arrays: synced.append(set_particles(*arrays)))
+
+    with DecomposedSimulation(manager, 2) as simulation:
+        record_tracer(simulation, tmp_path / 'tracer.npy', 20)
+        assert len(synced) == 1
+
+    assert np.array_equal(np.load(tmp_path / 'tracer.npy'),
+                          np.load(tmp_path / 'expected.npy'))
+    for got, want in zip(manager.get_arrays(), expected.get_arrays()):
+        assert np.array_equal(got, want)